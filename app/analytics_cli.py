@@ -0,0 +1,107 @@
+"""Offline queries over the analytics log.
+
+    python app/analytics_cli.py compact
+    python app/analytics_cli.py counts --event crisis_detected --by day
+    python app/analytics_cli.py dist --event message_bot --field length --since 2024-01-01
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from services.analytics import DATA_DIR_NAME, SEGMENTS_DIR_NAME
+from services.analytics_store import (
+    COLUMNAR_DIR_NAME,
+    compact_segments,
+    count_events,
+    field_distribution,
+)
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SEGMENTS_DIR = ROOT_DIR / DATA_DIR_NAME / SEGMENTS_DIR_NAME
+STORE_DIR = SEGMENTS_DIR / COLUMNAR_DIR_NAME
+
+
+def _day(raw: Optional[str]) -> Optional[str]:
+    return raw.replace("-", "") if raw else None
+
+
+def _bucket(day: str, by: str) -> str:
+    if by == "month":
+        return f"{day[:4]}-{day[4:6]}"
+    if by == "day":
+        return f"{day[:4]}-{day[4:6]}-{day[6:]}"
+    return "всего"
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    rebuilt = compact_segments(SEGMENTS_DIR, STORE_DIR)
+    print(f"Пересобрано дней: {len(rebuilt)}")
+    for day in rebuilt:
+        print(f"  {day}")
+    return 0
+
+
+def cmd_counts(args: argparse.Namespace) -> int:
+    counts = count_events(
+        STORE_DIR, event=args.event, since=_day(args.since), until=_day(args.until)
+    )
+    totals: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for day, day_counts in counts.items():
+        for event, count in day_counts.items():
+            totals[_bucket(day, args.by)][event] += count
+    if not totals:
+        print("Нет данных")
+        return 0
+    for bucket in sorted(totals):
+        for event, count in sorted(totals[bucket].items(), key=lambda item: -item[1]):
+            print(f"{bucket}\t{event}\t{count}")
+    return 0
+
+
+def cmd_dist(args: argparse.Namespace) -> int:
+    try:
+        dist = field_distribution(
+            STORE_DIR, args.event, args.field, since=_day(args.since), until=_day(args.until)
+        )
+    except ValueError as exc:
+        print(f"Ошибка: {exc}", file=sys.stderr)
+        return 1
+    if dist is None:
+        print("Нет данных")
+        return 0
+    print(f"count\t{dist.count}")
+    if dist.skipped:
+        print(f"skipped\t{dist.skipped}")
+    for name in ("mean", "min", "p50", "p90", "p99", "max"):
+        print(f"{name}\t{getattr(dist, name):.2f}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Аналитика бота")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("compact", help="собрать колоночные файлы из сегментов")
+
+    counts = commands.add_parser("counts", help="число событий")
+    counts.add_argument("--event")
+    counts.add_argument("--by", choices=("day", "month", "total"), default="day")
+
+    dist = commands.add_parser("dist", help="распределение числового поля")
+    dist.add_argument("--event", required=True)
+    dist.add_argument("--field", required=True)
+
+    for sub in (counts, dist):
+        sub.add_argument("--since", help="YYYY-MM-DD, включительно")
+        sub.add_argument("--until", help="YYYY-MM-DD, включительно")
+
+    args = parser.parse_args(argv)
+    handlers = {"compact": cmd_compact, "counts": cmd_counts, "dist": cmd_dist}
+    return handlers[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,6 @@
 import os
 import random
-import re
-from typing import Optional
-
-import tempfile
-from pathlib import Path
-from uuid import uuid4
+from typing import AsyncIterator, Optional
 
 from aiogram import F, Router
 from aiogram.filters import Command
@@ -42,27 +37,33 @@ from flows.profile import (
 )
 from flows.preferences import handle_focus_callback, prompt_focus
 from flows.support import handle_support_callback, send_support_menu
-from flows.therapy import handle_therapy_message
+from flows.therapy import HISTORY_LIMIT, handle_therapy_message
 from services.analytics import log_event
-from services.crisis import detect_crisis
+from services.crisis import assess_risk
+from services.intents import Intent, classify_intent
 from services.messages import send_message, edit_message, send_message_from_callback
-from services.message_service import add_message
+from services.message_service import add_message, ingest_user_message
 from services.memory import get_memory_store
-from services.stt import stt_is_available, stt_status_message, transcribe_audio
+from services.stt import (
+    SttBusyError,
+    SttTooLongError,
+    max_audio_seconds,
+    stt_is_available,
+    stt_status_message,
+    transcribe_stream,
+)
+from services.metrics import trace
+from services.transcript_cache import get_transcript_cache
 from services.user_service import (
     get_or_create_user,
-    touch_user,
-    is_rate_limited,
     increment_user_message_counter,
-    set_user_awaiting,
-    set_user_text_field,
-    update_distress,
-    update_user_focus,
     delete_user_data,
+    UserPatch,
 )
 
 
 router = Router()
+VOICE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
 START_CHAT_TEXT = "Расскажите, что происходит сейчас и что вас беспокоит."
 GREETING_RESPONSES = (
     "Привет! Если хотите, расскажите, что сейчас важно.",
@@ -75,44 +76,12 @@ GREETING_STATUS_RESPONSES = (
     "Я на связи. Как у вас сегодня?",
     "Я здесь. Что у вас сейчас на душе?",
 )
-GREETING_STEMS = ("привет", "здравств", "добро", "hello", "hi", "hey")
-SMALLTALK_TOKENS = {
-    "как",
-    "дела",
-    "ты",
-    "вы",
-    "самочувствие",
-    "настроение",
-    "поживаешь",
-    "поживаете",
-}
-GREETING_STATUS_PHRASES = (
-    "как дела",
-    "как ты",
-    "как вы",
-    "как поживаешь",
-    "как поживаете",
-)
 CAPABILITIES_RESPONSES = (
     "Могу говорить про стресс, тревогу, выгорание, отношения, самооценку, работу, цели, привычки. Что сейчас ближе?",
     "Можем обсудить работу, отношения, тревогу, усталость, сомнения, самооценку. С чего начнем?",
     "Готов говорить о сложных чувствах, выгорании, мотивации, решениях, отношениях, границах. Какая тема важнее?",
     "Я могу помочь с разбором ситуации, чувств, выбора, конфликтов, усталости и тревоги. Что сейчас актуальнее?",
 )
-TOPIC_INTENT_PATTERNS = (
-    re.compile(
-        r"^(?:давай|давайте)\s+(?:поговорим|обсудим)\s+"
-        r"((?:о|об|про|насчет|на тему)\s+.+)$"
-    ),
-    re.compile(
-        r"^(?:хочу|хотела|хотел|хотел бы|хотела бы|можно|можем|могу)\s+"
-        r"(?:поговорить|обсудить)\s+((?:о|об|про|насчет|на тему)\s+.+)$"
-    ),
-    re.compile(
-        r"^(?:поговорим|обсудим)\s+((?:о|об|про|насчет|на тему)\s+.+)$"
-    ),
-    re.compile(r"^тема\s*[:\-]?\s*(.+)$"),
-)
 TOPIC_FALLBACK_RESPONSES = (
     "Давайте. С чего бы вы хотели начать?",
     "Хорошо, давайте. Что именно важно обсудить?",
@@ -126,7 +95,7 @@ TOPIC_FALLBACK_RESPONSES = (
 @router.message(Command("start"))
 async def cmd_start(message: Message) -> None:
     if message.from_user:
-        get_or_create_user(message.from_user.id, message.from_user.username)
+        await get_or_create_user(message.from_user.id, message.from_user.username)
         get_memory_store().set_chat_ready(message.from_user.id, False)
     await start_onboarding(message)
 
@@ -193,10 +162,11 @@ async def on_settings_data_button(message: Message) -> None:
 @router.message(F.text == MAIN_MENU_CHAT)
 async def on_chat_button(message: Message) -> None:
     if message.from_user:
-        update_user_focus(message.from_user.id, "общее")
-        await set_user_awaiting(message.from_user.id, "awaiting_goal", False)
-        await set_user_awaiting(message.from_user.id, "awaiting_outcome", False)
-        await set_user_awaiting(message.from_user.id, "awaiting_checkin", False)
+        async with UserPatch(message.from_user.id) as patch:
+            patch.set("focus", "общее")
+            patch.set_awaiting("awaiting_goal", False)
+            patch.set_awaiting("awaiting_outcome", False)
+            patch.set_awaiting("awaiting_checkin", False)
         get_memory_store().set_chat_ready(message.from_user.id, True)
     await send_message(message, START_CHAT_TEXT, reply_markup=main_menu_keyboard())
 
@@ -283,7 +253,7 @@ async def on_reset_prompt_callback(callback: CallbackQuery) -> None:
 @router.callback_query(F.data == "reset:do")
 async def on_reset_do_callback(callback: CallbackQuery) -> None:
     if callback.from_user:
-        delete_user_data(callback.from_user.id)
+        await delete_user_data(callback.from_user.id)
         log_event("reset", callback.from_user.id)
     if callback.message:
         await edit_message(callback.message, "Контекст сброшен.")
@@ -335,24 +305,19 @@ async def _handle_user_text(message: Message, text: str, *, skip_intents: bool =
     if text in {MAIN_MENU_HELP, MAIN_MENU_MY_STATE, MAIN_MENU_SETTINGS, MAIN_MENU_CHAT}:
         return
 
-    if not skip_intents and _is_presence_check(text):
+    intent = None if skip_intents else classify_intent(text)
+    if intent is not None and intent.name == "presence":
         await send_message(
             message,
             "Да, я на связи. Можете написать, что вас волнует, или задать вопрос — я отвечу.",
         )
         return
 
-    user = get_or_create_user(user_id, message.from_user.username if message.from_user else None)
+    user = await get_or_create_user(user_id, message.from_user.username if message.from_user else None)
 
-    if is_rate_limited(user, min_interval_seconds=1.2):
-        await send_message(
-            message, "Слишком часто. Подождите пару секунд и попробуйте снова."
-        )
-        return
-    await touch_user(user_id)
-
-    if detect_crisis(text):
-        log_event("crisis_detected", user_id)
+    risk = assess_risk(text)
+    if risk.crisis:
+        log_event("crisis_detected", user_id, level=risk.level)
         await handle_crisis_message(message)
         return
 
@@ -377,8 +342,9 @@ async def _handle_user_text(message: Message, text: str, *, skip_intents: bool =
         return
 
     if user.awaiting_goal:
-        await set_user_text_field(user_id, "session_goal", text)
-        await set_user_awaiting(user_id, "awaiting_goal", False)
+        async with UserPatch(user_id) as patch:
+            patch.set("session_goal", text)
+            patch.set_awaiting("awaiting_goal", False)
         get_memory_store().set_chat_ready(user_id, True)
         add_message(user_id, "user", f"Цель сессии: {text}")
         add_message(user_id, "assistant", START_CHAT_TEXT)
@@ -386,16 +352,17 @@ async def _handle_user_text(message: Message, text: str, *, skip_intents: bool =
         return
 
     if user.awaiting_outcome:
-        await set_user_text_field(user_id, "last_outcome", text)
-        await set_user_awaiting(user_id, "awaiting_outcome", False)
+        async with UserPatch(user_id) as patch:
+            patch.set("last_outcome", text)
+            patch.set_awaiting("awaiting_outcome", False)
         response_text = "Записал. Мы можем продолжить в любое время."
         add_message(user_id, "user", f"Итог: {text}")
         add_message(user_id, "assistant", response_text)
         await send_message(message, response_text)
         return
 
-    if not skip_intents:
-        if _is_capabilities_request(text):
+    if intent is not None:
+        if intent.name == "capabilities":
             response_text = _select_capabilities_reply()
             add_message(user_id, "user", text)
             log_event("message_user", user_id, length=len(text))
@@ -406,20 +373,19 @@ async def _handle_user_text(message: Message, text: str, *, skip_intents: bool =
             await send_message(message, response_text)
             return
 
-        topic = _extract_topic_request(text)
-        if topic:
-            response_text = _select_topic_reply(topic)
+        if intent.name == "topic":
+            response_text = _select_topic_reply(intent.topic)
             add_message(user_id, "user", text)
             log_event("message_user", user_id, length=len(text))
             await increment_user_message_counter(user_id)
             add_message(user_id, "assistant", response_text)
             log_event("message_bot", user_id, length=len(response_text))
-            log_event("topic_intent", user_id, topic=topic)
+            log_event("topic_intent", user_id, topic=intent.topic)
             await send_message(message, response_text)
             return
 
-        if _is_greeting(text):
-            response_text = _select_greeting_reply(text)
+        if intent.name == "greeting":
+            response_text = _select_greeting_reply(intent)
             add_message(user_id, "user", text)
             log_event("message_user", user_id, length=len(text))
             await increment_user_message_counter(user_id)
@@ -428,138 +394,30 @@ async def _handle_user_text(message: Message, text: str, *, skip_intents: bool =
             await send_message(message, response_text)
             return
 
-    is_distress = await update_distress(user_id, user, detect_crisis(text))
-    if is_distress:
+    ingest = await ingest_user_message(
+        user_id,
+        text,
+        history_limit=HISTORY_LIMIT,
+        is_distress=risk.distress,
+    )
+    if ingest.should_offer_support:
         await send_message(message, "Похоже, сейчас непросто. Хотите короткую поддержку?")
         await send_support_menu(message)
         return  # Potentially pause the main therapy flow if we offer support
 
-    await handle_therapy_message(message, text_override=text)
-
-
-def _normalize_intent_text(text: str) -> str:
-    raw = (text or "").strip().lower()
-    if not raw:
-        return ""
-    cleaned = re.sub(r"[^\w\s]", "", raw)
-    return " ".join(cleaned.split())
-
-
-def _is_presence_check(text: str) -> bool:
-    cleaned = _normalize_intent_text(text)
-    if not cleaned:
-        return False
-    if len(cleaned) > 80:
-        return False
-    direct_phrases = (
-        "ты работаешь",
-        "ты тут",
-        "ты здесь",
-        "ты на связи",
-        "ты онлайн",
-        "ты живой",
-        "бот работает",
-        "ты слышишь",
-        "ты отвечаешь",
-    )
-    if any(phrase in cleaned for phrase in direct_phrases):
-        return True
-    if cleaned in {"проверка", "тест", "алло", "ало", "есть кто"}:
-        return True
-    return False
-
-
-def _is_greeting(text: str) -> bool:
-    cleaned = _normalize_intent_text(text)
-    if not cleaned or len(cleaned) > 60:
-        return False
-    tokens = cleaned.split()
-    if not tokens:
-        return False
-    has_greeting = any(token.startswith(GREETING_STEMS) for token in tokens)
-    for token in tokens:
-        if token.startswith(GREETING_STEMS):
-            continue
-        if token in SMALLTALK_TOKENS:
-            continue
-        return False
-    if has_greeting:
-        return True
-    return cleaned in GREETING_STATUS_PHRASES
-
-
-def _select_greeting_reply(text: str) -> str:
-    cleaned = _normalize_intent_text(text)
-    if any(phrase in cleaned for phrase in GREETING_STATUS_PHRASES):
-        return random.choice(GREETING_STATUS_RESPONSES)
-    return random.choice(GREETING_RESPONSES)
+    await handle_therapy_message(message, text_override=text, ingest=ingest)
 
 
-def _is_capabilities_request(text: str) -> bool:
-    cleaned = _normalize_intent_text(text)
-    if not cleaned or len(cleaned) > 160:
-        return False
-    if any(
-        phrase in cleaned
-        for phrase in (
-            "какие темы",
-            "на какие темы",
-            "темы для разговора",
-            "темы для беседы",
-            "о чем можем поговорить",
-            "о чем можно поговорить",
-            "о чем вы можете поговорить",
-            "о чем ты можешь поговорить",
-        )
-    ):
-        return True
-    if "на тему" in cleaned and any(
-        phrase in cleaned
-        for phrase in (
-            "можешь поговорить",
-            "можете поговорить",
-            "можем поговорить",
-            "можно поговорить",
-            "можешь обсудить",
-            "можете обсудить",
-            "можем обсудить",
-            "можно обсудить",
-        )
-    ):
-        return True
-    if any(
-        phrase in cleaned
-        for phrase in (
-            "что ты можешь",
-            "что вы можете",
-            "что ты умеешь",
-            "что вы умеете",
-        )
-    ) and any(word in cleaned for word in ("поговорить", "обсудить", "помочь")):
-        return True
-    return False
+def _select_greeting_reply(intent: Intent) -> str:
+    if "small_talk" in intent.flags:
+        return random.choice(GREETING_STATUS_RESPONSES)
+    return random.choice(GREETING_RESPONSES)
 
 
 def _select_capabilities_reply() -> str:
     return random.choice(CAPABILITIES_RESPONSES)
 
 
-def _extract_topic_request(text: str) -> Optional[str]:
-    cleaned = _normalize_intent_text(text)
-    if not cleaned or len(cleaned) > 180:
-        return None
-    for pattern in TOPIC_INTENT_PATTERNS:
-        match = pattern.match(cleaned)
-        if match:
-            topic = (match.group(1) or "").strip()
-            topic = topic.strip(" .!?\"'“”«»")
-            if topic:
-                if len(topic) > 120:
-                    topic = topic[:120].rstrip()
-                return topic
-    return None
-
-
 def _select_topic_reply(topic: Optional[str]) -> str:
     if topic:
         options = (
@@ -574,30 +432,58 @@ def _select_topic_reply(topic: Optional[str]) -> str:
 
 @router.message(F.text)
 async def on_text_message(message: Message) -> None:
-    await _handle_user_text(message, message.text or "", skip_intents=False)
+    async with trace("message.text"):
+        await _handle_user_text(message, message.text or "", skip_intents=False)
+
+
+async def _stream_voice(message: Message) -> AsyncIterator[bytes]:
+    """Yields the voice file as it downloads from Telegram."""
+    bot = message.bot
+    file = await bot.get_file(message.voice.file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    async for chunk in bot.session.stream_content(
+        url=url, chunk_size=VOICE_DOWNLOAD_CHUNK_SIZE, raise_for_status=True
+    ):
+        yield chunk
 
 
 @router.message(F.voice)
 async def on_voice_message(message: Message) -> None:
     if message.voice is None:
         return
+    async with trace("message.voice"):
+        await _handle_voice_message(message)
+
+
+async def _handle_voice_message(message: Message) -> None:
     if not stt_is_available():
         await send_message(
             message,
             "Голосовые пока не подключены. Нужны ffmpeg и модель Vosk (VOSK_MODEL_PATH).",
         )
         return
-    tmp_dir = Path(tempfile.gettempdir()) / "psiholog_voice"
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    tmp_path = tmp_dir / f"voice_{uuid4().hex}.ogg"
+    cache = get_transcript_cache()
+    voice = message.voice
+    text = await cache.get(voice.file_unique_id, voice.duration)
     try:
-        await message.bot.download(message.voice, destination=tmp_path)
-        text = await transcribe_audio(tmp_path, language="ru")
-    finally:
-        try:
-            tmp_path.unlink()
-        except OSError:
-            pass
+        if text is None:
+            text = await transcribe_stream(_stream_voice(message))
+            if text:
+                cache.put(voice.file_unique_id, voice.duration, text)
+    except SttBusyError:
+        await send_message(
+            message,
+            "Сейчас много голосовых сообщений, я не успеваю их расшифровать. "
+            "Попробуйте через минуту или напишите текстом.",
+        )
+        return
+    except SttTooLongError:
+        await send_message(
+            message,
+            f"Голосовое слишком длинное: я расшифровываю до {max_audio_seconds()} с. "
+            "Разделите его на части или напишите текстом.",
+        )
+        return
     if not text:
         await send_message(
             message,
@@ -0,0 +1,66 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject, Update, User
+
+from bot.keyboards import (
+    MAIN_MENU_CHAT,
+    MAIN_MENU_HELP,
+    MAIN_MENU_MY_STATE,
+    MAIN_MENU_SETTINGS,
+)
+from services.messages import send_message
+from services.rate_limiter import get_rate_limiter
+from services.user_locks import get_user_locks
+from services.user_service import mark_active
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+RATE_LIMIT_TEXT = "Слишком часто. Подождите пару секунд и попробуйте снова."
+MENU_BUTTONS = frozenset({MAIN_MENU_HELP, MAIN_MENU_MY_STATE, MAIN_MENU_SETTINGS, MAIN_MENU_CHAT})
+
+
+def _is_limited_message(message: Message) -> bool:
+    """Free text and voice are limited; commands and menu buttons are not."""
+    if message.voice is not None:
+        return True
+    text = (message.text or "").strip()
+    return bool(text) and not text.startswith("/") and text not in MENU_BUTTONS
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Drops message floods before any database or LLM work.
+
+    A flood gets a single warning; the rejected messages are not handled.
+    Accepted messages update last_message_at, which is written to the
+    database lazily in batches.
+    """
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        message = event.message if isinstance(event, Update) else None
+        user: Optional[User] = data.get("event_from_user")
+        if message is None or user is None or not _is_limited_message(message):
+            return await handler(event, data)
+        limiter = get_rate_limiter()
+        if not limiter.allow(user.id):
+            if limiter.take_warning(user.id):
+                await send_message(message, RATE_LIMIT_TEXT)
+            return None
+        mark_active(user.id)
+        return await handler(event, data)
+
+
+class UserSerialMiddleware(BaseMiddleware):
+    """Handles updates of one user strictly one after another.
+
+    Handlers read and then write per-user state (awaiting flags, distress
+    streak, message counters); without this two quick messages from the same
+    user could interleave and lose a write. Other users are not affected.
+    """
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        async with get_user_locks().hold(user.id):
+            return await handler(event, data)
@@ -121,7 +121,7 @@ async def handle_checkin_message(message: Message) -> None:
     store = get_memory_store()
     if message.from_user:
         user_id = message.from_user.id
-        add_checkin(user_id, mood=mood, anxiety=anxiety, energy=energy)
+        await add_checkin(user_id, mood=mood, anxiety=anxiety, energy=energy)
         await set_user_awaiting(user_id, "awaiting_checkin", False)
         store.clear_pending_checkin(user_id)
         log_event(
@@ -178,7 +178,7 @@ async def handle_checkin_callback(callback: CallbackQuery) -> None:
         mood = int(memory.pending_checkin_values.get("mood", 0))
         anxiety = int(memory.pending_checkin_values.get("anxiety", 0))
         energy = int(memory.pending_checkin_values.get("energy", 0))
-        add_checkin(user_id, mood=mood, anxiety=anxiety, energy=energy)
+        await add_checkin(user_id, mood=mood, anxiety=anxiety, energy=energy)
         await set_user_awaiting(user_id, "awaiting_checkin", False)
         store.clear_pending_checkin(user_id)
         log_event(
@@ -37,7 +37,7 @@ async def export_chat(message: Message, *, user_id: Optional[int] = None) -> Non
         await send_message(message, "Не получилось сформировать экспорт.")
         return
 
-    messages = get_all_messages(resolved_user_id)
+    messages = await get_all_messages(resolved_user_id)
     if not messages:
         await send_message(message, "Пока нет данных для экспорта.")
         return
@@ -35,7 +35,7 @@ async def handle_focus_callback(callback: CallbackQuery) -> None:
         await callback.answer()
         return
     
-    update_user_focus(callback.from_user.id, FOCUS_LABELS[focus])
+    await update_user_focus(callback.from_user.id, FOCUS_LABELS[focus])
     get_memory_store().set_chat_ready(callback.from_user.id, True)
     await send_message_from_callback(
         callback,
@@ -5,7 +5,7 @@ from aiogram.types import CallbackQuery, Message
 from bot.keyboards import about_skip_keyboard, gender_keyboard, main_menu_keyboard
 from services.messages import send_message, send_message_from_callback
 from services.memory import get_memory_store
-from services.user_service import set_user_awaiting, set_user_text_field
+from services.user_service import UserPatch
 
 GENDER_QUESTION = "🟢⚪️⚪️⚪️ Выберите пол:"
 NAME_QUESTION = "🟢⚪️⚪️⚪️ Как тебя зовут?"
@@ -25,14 +25,9 @@ async def start_profile(message: Message) -> None:
     if message.from_user is None:
         await send_message(message, GENDER_QUESTION, reply_markup=gender_keyboard())
         return
-    user_id = message.from_user.id
-    await set_user_awaiting(user_id, "awaiting_checkin", False)
-    await set_user_awaiting(user_id, "awaiting_goal", False)
-    await set_user_awaiting(user_id, "awaiting_outcome", False)
-    await set_user_awaiting(user_id, "awaiting_gender", True)
-    await set_user_awaiting(user_id, "awaiting_name", False)
-    await set_user_awaiting(user_id, "awaiting_age", False)
-    await set_user_awaiting(user_id, "awaiting_about", False)
+    async with UserPatch(message.from_user.id) as patch:
+        patch.clear_awaiting()
+        patch.set_awaiting("awaiting_gender", True)
     await send_message(message, GENDER_QUESTION, reply_markup=gender_keyboard())
 
 
@@ -42,9 +37,10 @@ async def handle_gender_callback(callback: CallbackQuery, gender: str) -> None:
         return
     user_id = callback.from_user.id
     gender_label = "мужчина" if gender == "male" else "женщина"
-    await set_user_text_field(user_id, "gender", gender_label)
-    await set_user_awaiting(user_id, "awaiting_gender", False)
-    await set_user_awaiting(user_id, "awaiting_name", True)
+    async with UserPatch(user_id) as patch:
+        patch.set("gender", gender_label)
+        patch.set_awaiting("awaiting_gender", False)
+        patch.set_awaiting("awaiting_name", True)
     await send_message_from_callback(callback, NAME_QUESTION)
     await callback.answer()
 
@@ -57,9 +53,10 @@ async def handle_name_message(message: Message, text: str) -> None:
         await send_message(message, NAME_QUESTION)
         return
     user_id = message.from_user.id
-    await set_user_text_field(user_id, "display_name", name)
-    await set_user_awaiting(user_id, "awaiting_name", False)
-    await set_user_awaiting(user_id, "awaiting_age", True)
+    async with UserPatch(user_id) as patch:
+        patch.set("display_name", name)
+        patch.set_awaiting("awaiting_name", False)
+        patch.set_awaiting("awaiting_age", True)
     await send_message(message, AGE_QUESTION)
 
 
@@ -76,9 +73,10 @@ async def handle_age_message(message: Message, text: str) -> None:
         await send_message(message, "Похоже, возраст некорректный. Напиши число от 8 до 120.")
         return
     user_id = message.from_user.id
-    await set_user_text_field(user_id, "age", age)
-    await set_user_awaiting(user_id, "awaiting_age", False)
-    await set_user_awaiting(user_id, "awaiting_about", True)
+    async with UserPatch(user_id) as patch:
+        patch.set("age", age)
+        patch.set_awaiting("awaiting_age", False)
+        patch.set_awaiting("awaiting_about", True)
     await send_message(
         message,
         ABOUT_QUESTION,
@@ -90,8 +88,9 @@ async def handle_about_message(message: Message, text: str) -> None:
     if message.from_user is None:
         return
     user_id = message.from_user.id
-    await set_user_text_field(user_id, "about", text.strip())
-    await set_user_awaiting(user_id, "awaiting_about", False)
+    async with UserPatch(user_id) as patch:
+        patch.set("about", text.strip())
+        patch.set_awaiting("awaiting_about", False)
     get_memory_store().set_chat_ready(user_id, True)
     await send_message(message, FINAL_TEXT, reply_markup=main_menu_keyboard())
 
@@ -101,7 +100,7 @@ async def handle_about_skip(callback: CallbackQuery) -> None:
         await callback.answer()
         return
     user_id = callback.from_user.id
-    await set_user_awaiting(user_id, "awaiting_about", False)
+    await UserPatch(user_id).set_awaiting("awaiting_about", False).flush()
     get_memory_store().set_chat_ready(user_id, True)
     await send_message_from_callback(callback, FINAL_TEXT, reply_markup=main_menu_keyboard())
     await callback.answer()
@@ -2,16 +2,21 @@ from aiogram.types import CallbackQuery, Message
 
 from bot.keyboards import support_menu_keyboard
 from services.emoji import decorate_text
-from services.llm import generate_response
 from services.messages import send_message, send_message_from_callback
 from services.message_service import add_message
-from services.prompts import SUPPORT_SYSTEM_PROMPT, build_support_prompt
+from services.support_pool import get_support_pool
 
 SUPPORT_INTRO = (
     "Вот несколько коротких способов помочь себе прямо сейчас. "
     "Выберите вариант ниже."
 )
 
+SUPPORT_OPTIONS = {
+    "support:breath": ("breath", "дыхание 4-6"),
+    "support:ground": ("ground", "упражнение 5-4-3-2-1"),
+    "support:compassion": ("compassion", "добрые слова себе"),
+}
+
 
 def _record_support_history(user_id: int, label: str, response_text: str) -> None:
     add_message(user_id, "user", f"Запрос поддержки: {label}.")
@@ -27,40 +32,14 @@ async def handle_support_callback(callback: CallbackQuery) -> None:
     if callback.message is None:
         await callback.answer()
         return
-    if data == "support:breath":
-        text = await generate_response(
-            prompt=build_support_prompt("breath"),
-            system_prompt=SUPPORT_SYSTEM_PROMPT,
-            temperature=0.7,
-            max_completion_tokens=180,
-        )
-        if callback.from_user:
-            text = decorate_text(callback.from_user.id, text, kind="support:breath")
-        await send_message_from_callback(callback, text)
-        if callback.from_user:
-            _record_support_history(callback.from_user.id, "дыхание 4-6", text)
-    elif data == "support:ground":
-        text = await generate_response(
-            prompt=build_support_prompt("ground"),
-            system_prompt=SUPPORT_SYSTEM_PROMPT,
-            temperature=0.7,
-            max_completion_tokens=180,
-        )
-        if callback.from_user:
-            text = decorate_text(callback.from_user.id, text, kind="support:ground")
-        await send_message_from_callback(callback, text)
-        if callback.from_user:
-            _record_support_history(callback.from_user.id, "упражнение 5-4-3-2-1", text)
-    elif data == "support:compassion":
-        text = await generate_response(
-            prompt=build_support_prompt("compassion"),
-            system_prompt=SUPPORT_SYSTEM_PROMPT,
-            temperature=0.9,
-            max_completion_tokens=180,
-        )
+    option = SUPPORT_OPTIONS.get(data)
+    if option is not None:
+        kind, label = option
+        user_id = callback.from_user.id if callback.from_user else 0
+        text = get_support_pool().take(kind, user_id)
         if callback.from_user:
-            text = decorate_text(callback.from_user.id, text, kind="support:compassion")
+            text = decorate_text(user_id, text, kind=data)
         await send_message_from_callback(callback, text)
         if callback.from_user:
-            _record_support_history(callback.from_user.id, "добрые слова себе", text)
+            _record_support_history(user_id, label, text)
     await callback.answer()
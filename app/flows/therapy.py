@@ -4,13 +4,24 @@ from aiogram.types import Message
 
 from bot.keyboards import checkin_start_keyboard
 from services.analytics import log_event
-from services.llm import generate_response, generate_summary
-from services.messages import send_message
-from services.message_service import add_message, get_last_n_messages
+from services.llm import (
+    generate_response,
+    generate_summary,
+    stream_response,
+    streaming_enabled,
+)
+from services.messages import send_message, send_streaming_message
+from services.message_service import (
+    IngestResult,
+    add_message,
+    get_last_n_messages,
+    ingest_user_message,
+)
 from services.emoji import decorate_text, select_emoji
+from services.summary_queue import get_summary_queue
+from services.user_locks import get_user_locks
 from services.user_service import (
-    get_or_create_user,
-    increment_user_message_counter,
+    get_user,
     update_user_summary,
     User,
 )
@@ -18,7 +29,7 @@ from services.prompts import (
     SUMMARY_SYSTEM_PROMPT,
     THERAPY_SYSTEM_PROMPT,
     build_summary_prompt,
-    build_therapy_prompt,
+    fit_therapy_prompt,
 )
 from services.rag import build_context
 
@@ -48,21 +59,23 @@ def _decorate_therapy_response(user_id: int, text: str) -> str:
     return updated
 
 
-async def handle_therapy_message(message: Message, *, text_override: Optional[str] = None) -> None:
+async def handle_therapy_message(
+    message: Message,
+    *,
+    text_override: Optional[str] = None,
+    ingest: Optional[IngestResult] = None,
+) -> None:
     user_id = message.from_user.id if message.from_user else 0
     raw_text = text_override if text_override is not None else message.text
     text = (raw_text or "").strip()
 
-    # Get user state and history from DB
-    user = get_or_create_user(user_id)
-    history = get_last_n_messages(user_id, n=HISTORY_LIMIT)
-
-    # Append user message to history
-    add_message(user_id, "user", text)
+    # Store the message and get user state and history in one round-trip
+    # (the caller may have ingested it already)
+    if ingest is None:
+        ingest = await ingest_user_message(user_id, text, history_limit=HISTORY_LIMIT)
+    user = ingest.user
+    history = ingest.history
     log_event("message_user", user_id, length=len(text))
-    await increment_user_message_counter(user_id)
-    # Manually increment counter on the user object to avoid another DB call
-    user.messages_since_summary += 1
 
     # Convert Message objects to dictionaries for the prompt builder
     history_for_prompt = [
@@ -84,7 +97,7 @@ async def handle_therapy_message(message: Message, *, text_override: Optional[st
         profile_parts.append(f"О себе: {user.about}")
     profile_text = "; ".join(profile_parts)
 
-    prompt = build_therapy_prompt(
+    therapy_prompt = fit_therapy_prompt(
         context=context,
         summary=user.summary,
         history=history_for_prompt,
@@ -94,24 +107,53 @@ async def handle_therapy_message(message: Message, *, text_override: Optional[st
         last_outcome=user.last_outcome,
         profile=profile_text,
     )
-    response = await generate_response(prompt=prompt, system_prompt=THERAPY_SYSTEM_PROMPT)
-    if message.from_user:
-        response = _decorate_therapy_response(message.from_user.id, response)
-    await send_message(message, response)
+    prompt = therapy_prompt.text
+    log_event(
+        "prompt_built",
+        user_id,
+        tokens=therapy_prompt.tokens,
+        budget=therapy_prompt.budget,
+        history_items=therapy_prompt.history_items,
+        history_dropped=therapy_prompt.history_dropped,
+        trimmed=therapy_prompt.trimmed,
+    )
+    if streaming_enabled():
+        _, response = await send_streaming_message(
+            message,
+            stream_response(prompt=prompt, system_prompt=THERAPY_SYSTEM_PROMPT),
+            finalize=lambda text: _decorate_therapy_response(user_id, text),
+        )
+    else:
+        response = await generate_response(prompt=prompt, system_prompt=THERAPY_SYSTEM_PROMPT)
+        if message.from_user:
+            response = _decorate_therapy_response(message.from_user.id, response)
+        await send_message(message, response)
 
     # Append assistant message to history
     add_message(user_id, "assistant", response)
     log_event("message_bot", user_id, length=len(response))
 
-    await _maybe_update_summary(user_id, user)
+    _maybe_update_summary(user_id, user)
     # await _maybe_prompt_checkin(message, user) # TODO: Migrate check-in logic
 
 
-async def _maybe_update_summary(user_id: int, user: User) -> None:
+def _maybe_update_summary(user_id: int, user: User) -> None:
+    if user.messages_since_summary < SUMMARY_EVERY_N_MESSAGES:
+        return
+    get_summary_queue().enqueue(user_id)
+
+
+async def summarize_user(user_id: int) -> None:
+    """Summary queue job: folds the recent history into the user's summary."""
+    # Read-only: a job queued before /reset must not bring the user back.
+    user = await get_user(user_id)
+    if user is None:
+        return
     if user.messages_since_summary < SUMMARY_EVERY_N_MESSAGES:
+        # Already summarized (e.g. a job replayed after a restart).
         return
 
-    history = get_last_n_messages(user_id, n=HISTORY_LIMIT)
+    history = await get_last_n_messages(user_id, n=HISTORY_LIMIT)
     history_for_prompt = [
         {"role": msg.role, "content": msg.content} for msg in history
     ]
@@ -124,8 +166,16 @@ async def _maybe_update_summary(user_id: int, user: User) -> None:
         prompt=prompt,
         system_prompt=SUMMARY_SYSTEM_PROMPT,
     )
-    if summary:
-        await update_user_summary(user_id, summary)
+    if not summary:
+        return
+    # Handlers hold this lock while they ingest, so the counter read here is
+    # current; messages that arrived during generation stay counted.
+    async with get_user_locks().hold(user_id):
+        current = await get_user(user_id)
+        if current is None:
+            return
+        remaining = max(current.messages_since_summary - user.messages_since_summary, 0)
+        await update_user_summary(user_id, summary, messages_since_summary=remaining)
 
 
 # TODO: Migrate check-in logic from MemoryStore to user_service
@@ -1,15 +1,28 @@
 import asyncio
+import logging
 
 from aiogram import Bot, Dispatcher
 
 from config import load_settings
-from utils.logger import setup_logging
-from services.db import get_db_client
+from utils.logger import LOG_FORMAT, setup_logging, stop_logging
+from services.analytics import get_analytics_sink
+from services.db import get_db_client, shutdown_db_executor
+from services.llm_scheduler import get_llm_scheduler
+from services.message_service import start_message_journal, stop_message_journal
+from services.metrics import start_metrics, stop_metrics
+from services.stt import shutdown_stt_pool, warm_up_stt
+from services.summary_queue import get_summary_queue
+from services.support_pool import get_support_pool
+from services.transcript_cache import get_transcript_cache
+from services.user_service import start_activity_flusher, stop_activity_flusher
+from flows.therapy import summarize_user
 from bot.handlers import router
+from bot.middlewares import RateLimitMiddleware, UserSerialMiddleware
 
 
 async def main() -> None:
-    setup_logging()
+    # Plain stderr until the STT workers exist: the queue listener is a thread.
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
     settings = load_settings()
     if not settings.bot_token:
         raise RuntimeError("BOT_TOKEN is not set")
@@ -20,10 +33,37 @@ async def main() -> None:
 
     bot = Bot(token=settings.bot_token)
     dp = Dispatcher()
+    dp.update.outer_middleware(RateLimitMiddleware())
+    dp.update.outer_middleware(UserSerialMiddleware())
     dp.include_router(router)
 
+    # Before anything starts helper threads: STT workers are forked from here.
+    await warm_up_stt()
+    setup_logging()
     get_db_client()
-    await dp.start_polling(bot)
+    analytics_sink = get_analytics_sink()
+    await analytics_sink.start()
+    await start_message_journal()
+    await start_activity_flusher()
+    get_llm_scheduler()  # so its queue state is in metrics snapshots from the start
+    await start_metrics()
+    support_pool = get_support_pool()
+    support_pool.warm_up()
+    summary_queue = get_summary_queue()
+    await summary_queue.start(summarize_user)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await summary_queue.stop()
+        await support_pool.stop()
+        await stop_metrics()
+        await stop_activity_flusher()
+        await stop_message_journal()
+        shutdown_stt_pool()
+        get_transcript_cache().close()
+        await analytics_sink.stop()
+        shutdown_db_executor()
+        stop_logging()
 
 
 
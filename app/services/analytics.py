@@ -1,11 +1,20 @@
+import asyncio
 import json
+import logging
+import os
 import time
+from collections import deque
+from datetime import datetime, timezone
 from hashlib import sha256
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Deque, Dict, List, Optional
 
 DATA_DIR_NAME = "data"
 ANALYTICS_FILE_NAME = "analytics.jsonl"
+SEGMENTS_DIR_NAME = "analytics"
+DEFAULT_FLUSH_SECONDS = 1.0
+DEFAULT_MAX_BUFFERED_EVENTS = 10000
+DEFAULT_MAX_SEGMENT_BYTES = 50 * 1024 * 1024
 
 
 def _hash_user_id(user_id: Optional[int]) -> Optional[str]:
@@ -15,16 +24,184 @@ def _hash_user_id(user_id: Optional[int]) -> Optional[str]:
     return digest[:12]
 
 
+def _utc_day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class AnalyticsSink:
+    """Buffered writer for `analytics.jsonl`.
+
+    Events are queued in a bounded ring (the oldest are dropped if the
+    writer falls behind) and written in batches through one open handle
+    from a background task. The live file is rotated into
+    `data/analytics/analytics-<day>-<seq>.jsonl` when it grows past the
+    size limit or a new UTC day starts. Until `start` is called events are
+    written straight away, so scripts and tests need no setup.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+        max_buffered_events: int = DEFAULT_MAX_BUFFERED_EVENTS,
+        max_segment_bytes: int = DEFAULT_MAX_SEGMENT_BYTES,
+        clock=time.time,
+    ) -> None:
+        self._path = path
+        self._segments_dir = path.parent / SEGMENTS_DIR_NAME
+        self._flush_seconds = flush_seconds
+        self._max_segment_bytes = max_segment_bytes
+        self._clock = clock
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=max_buffered_events)
+        self._dropped = 0
+        self._file = None
+        self._file_day: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._stopping = False
+
+    @property
+    def buffered_count(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def dropped_count(self) -> int:
+        return self._dropped
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        if self._task is None:
+            self._write_batch([record])
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped += 1
+        self._buffer.append(record)
+
+    def _open_file(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if self._path.exists() and self._path.stat().st_size > 0:
+            day = _utc_day(self._path.stat().st_mtime)
+            if day != _utc_day(self._clock()):
+                self._rotate_closed(day)
+        self._file = self._path.open("a", encoding="utf-8")
+        self._file_day = _utc_day(self._clock())
+
+    def _rotate_closed(self, day: str) -> None:
+        self._segments_dir.mkdir(parents=True, exist_ok=True)
+        seq = len(list(self._segments_dir.glob(f"analytics-{day}-*.jsonl")))
+        target = self._segments_dir / f"analytics-{day}-{seq:04d}.jsonl"
+        while target.exists():
+            seq += 1
+            target = self._segments_dir / f"analytics-{day}-{seq:04d}.jsonl"
+        os.replace(self._path, target)
+
+    def _maybe_rotate(self) -> None:
+        assert self._file is not None and self._file_day is not None
+        today = _utc_day(self._clock())
+        if today == self._file_day and self._file.tell() < self._max_segment_bytes:
+            return
+        if self._file.tell() == 0:
+            self._file_day = today
+            return
+        self._file.close()
+        self._file = None
+        self._rotate_closed(self._file_day)
+        self._open_file()
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            self._open_file()
+        self._maybe_rotate()
+        assert self._file is not None
+        self._file.write(
+            "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        )
+        self._file.flush()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        records = list(self._buffer)
+        self._buffer.clear()
+        return records
+
+    async def flush(self) -> None:
+        records = self._drain()
+        if records:
+            loop = asyncio.get_running_loop()
+            self._writing = loop.run_in_executor(None, self._write_batch, records)
+            # Shielded so that cancelling the flush task never abandons a
+            # half-done write; stop() waits for it instead.
+            await asyncio.shield(self._writing)
+        if self._dropped:
+            logging.getLogger(__name__).warning(
+                "Analytics buffer overflowed, %s events dropped", self._dropped
+            )
+            self._dropped = 0
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            await asyncio.sleep(self._flush_seconds)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception("Analytics flush failed")
+
+    async def start(self) -> None:
+        self._stopping = False
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await asyncio.gather(self._writing, return_exceptions=True)
+            self._writing = None
+        try:
+            records = self._drain()
+            if records:
+                self._write_batch(records)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_sink: Optional[AnalyticsSink] = None
+
+
+def get_analytics_sink() -> AnalyticsSink:
+    global _sink
+    if _sink is None:
+        root_dir = Path(__file__).resolve().parents[2]
+        raw_flush = os.getenv("ANALYTICS_FLUSH_SECONDS", "").strip()
+        try:
+            flush_seconds = float(raw_flush) if raw_flush else DEFAULT_FLUSH_SECONDS
+        except ValueError:
+            flush_seconds = DEFAULT_FLUSH_SECONDS
+        raw_max_bytes = os.getenv("ANALYTICS_MAX_SEGMENT_BYTES", "").strip()
+        _sink = AnalyticsSink(
+            root_dir / DATA_DIR_NAME / ANALYTICS_FILE_NAME,
+            flush_seconds=flush_seconds,
+            max_segment_bytes=(
+                int(raw_max_bytes) if raw_max_bytes.isdigit() else DEFAULT_MAX_SEGMENT_BYTES
+            ),
+        )
+    return _sink
+
+
 def log_event(event: str, user_id: Optional[int] = None, **payload: Any) -> None:
-    root_dir = Path(__file__).resolve().parents[2]
-    data_dir = root_dir / DATA_DIR_NAME
-    data_dir.mkdir(parents=True, exist_ok=True)
-    path = data_dir / ANALYTICS_FILE_NAME
     record: Dict[str, Any] = {
         "ts": time.time(),
         "event": event,
         "user": _hash_user_id(user_id),
     }
     record.update(payload)
-    with path.open("a", encoding="utf-8") as fh:
-        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+    get_analytics_sink().emit(record)
@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+MAGIC = b"ACOL1\n"
+HEADER_LEN = struct.Struct("<I")
+COLUMNAR_DIR_NAME = "columnar"
+DAY_FILE_SUFFIX = ".acol"
+BASE_FIELDS = ("ts", "event", "user")
+MISSING_CODE = -1
+
+# Column type -> array typecode.
+TYPECODES = {"f64": "d", "u16": "H", "i32": "i", "dict": "i"}
+
+_SEGMENT_RE = re.compile(r"^analytics-(\d{8})-\d+\.jsonl$")
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, raw: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(raw)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not (
+        isinstance(value, float) and math.isnan(value)
+    )
+
+
+class _Dictionary:
+    """Assigns dense integer codes to strings in first-seen order."""
+
+    def __init__(self) -> None:
+        self.values: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+
+def _read_records(paths: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict) and isinstance(record.get("event"), str):
+                    yield record
+
+
+def build_day_file(day: str, sources: List[Path], out_path: Path) -> int:
+    """Writes one day of events as a columnar file; returns the row count.
+
+    Event names and user hashes are dictionary-encoded. Each payload field
+    becomes a float64 column (NaN when missing) if all its values are
+    numbers, otherwise a dictionary-encoded string column. The header also
+    carries per-event rollups, so counts never touch the columns.
+    """
+    records = list(_read_records(sources))
+    events = _Dictionary()
+    users = _Dictionary()
+    ts_col = array("d")
+    event_col = array("H")
+    user_col = array("i")
+    payload_values: Dict[str, List[Any]] = {}
+    for row, record in enumerate(records):
+        ts_col.append(float(record.get("ts") or 0.0))
+        event_col.append(events.code(record["event"]))
+        user = record.get("user")
+        user_col.append(users.code(user) if isinstance(user, str) else MISSING_CODE)
+        for key, value in record.items():
+            if key in BASE_FIELDS or value is None:
+                continue
+            column = payload_values.setdefault(key, [None] * len(records))
+            column[row] = value
+
+    columns: Dict[str, Dict[str, Any]] = {}
+    blobs: List[bytes] = []
+    offset = 0
+
+    def add_column(name: str, col_type: str, data: array, **extra: Any) -> None:
+        nonlocal offset
+        blob = _to_bytes(data)
+        columns[name] = {"type": col_type, "offset": offset, "length": len(blob), **extra}
+        blobs.append(blob)
+        offset += len(blob)
+
+    add_column("ts", "f64", ts_col)
+    add_column("event", "u16", event_col)
+    add_column("user", "i32", user_col)
+
+    rollup: Dict[str, Dict[str, Any]] = {
+        name: {"count": 0, "users": set(), "fields": {}} for name in events.values
+    }
+    for row in range(len(records)):
+        entry = rollup[events.values[event_col[row]]]
+        entry["count"] += 1
+        if user_col[row] != MISSING_CODE:
+            entry["users"].add(user_col[row])
+
+    for key in sorted(payload_values):
+        values = payload_values[key]
+        if all(value is None or _is_number(value) for value in values):
+            numeric = array("d", (math.nan if v is None else float(v) for v in values))
+            add_column(f"payload.{key}", "f64", numeric)
+            for row, value in enumerate(values):
+                if value is None:
+                    continue
+                fields = rollup[events.values[event_col[row]]]["fields"]
+                stats = fields.setdefault(
+                    key, {"count": 0, "sum": 0.0, "min": math.inf, "max": -math.inf}
+                )
+                stats["count"] += 1
+                stats["sum"] += float(value)
+                stats["min"] = min(stats["min"], float(value))
+                stats["max"] = max(stats["max"], float(value))
+        else:
+            strings = _Dictionary()
+            codes = array(
+                "i", (MISSING_CODE if v is None else strings.code(str(v)) for v in values)
+            )
+            add_column(f"payload.{key}", "dict", codes, values=strings.values)
+
+    for entry in rollup.values():
+        entry["users"] = len(entry["users"])
+    header = {
+        "day": day,
+        "rows": len(records),
+        "sources": sorted(path.name for path in sources),
+        "events": events.values,
+        "users": users.values,
+        "columns": columns,
+        "rollup": rollup,
+    }
+    header_raw = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_suffix(".tmp")
+    with tmp_path.open("wb") as fh:
+        fh.write(MAGIC)
+        fh.write(HEADER_LEN.pack(len(header_raw)))
+        fh.write(header_raw)
+        for blob in blobs:
+            fh.write(blob)
+    os.replace(tmp_path, out_path)
+    return len(records)
+
+
+class DayFile:
+    """Read access to one columnar day file; columns are loaded on demand."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as fh:
+            if fh.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an analytics columnar file")
+            (header_len,) = HEADER_LEN.unpack(fh.read(HEADER_LEN.size))
+            self.header: Dict[str, Any] = json.loads(fh.read(header_len).decode("utf-8"))
+        self._body_start = len(MAGIC) + HEADER_LEN.size + header_len
+
+    @property
+    def day(self) -> str:
+        return self.header["day"]
+
+    @property
+    def rollup(self) -> Dict[str, Dict[str, Any]]:
+        return self.header["rollup"]
+
+    def has_column(self, name: str) -> bool:
+        return name in self.header["columns"]
+
+    def column(self, name: str) -> array:
+        meta = self.header["columns"][name]
+        with self.path.open("rb") as fh:
+            fh.seek(self._body_start + meta["offset"])
+            raw = fh.read(meta["length"])
+        return _from_bytes(TYPECODES[meta["type"]], raw)
+
+    def event_code(self, event: str) -> Optional[int]:
+        try:
+            return self.header["events"].index(event)
+        except ValueError:
+            return None
+
+
+def _segments_by_day(segments_dir: Path) -> Dict[str, List[Path]]:
+    grouped: Dict[str, List[Path]] = {}
+    for path in sorted(segments_dir.glob("analytics-*.jsonl")):
+        match = _SEGMENT_RE.match(path.name)
+        if match:
+            grouped.setdefault(match.group(1), []).append(path)
+    return grouped
+
+
+def compact_segments(segments_dir: Path, out_dir: Optional[Path] = None) -> List[str]:
+    """Builds day files for rotated segments; returns the days rebuilt.
+
+    A day is rebuilt only when its set of source segments changed, so the
+    job is cheap to run repeatedly. Segments are left in place.
+    """
+    if out_dir is None:
+        out_dir = segments_dir / COLUMNAR_DIR_NAME
+    rebuilt: List[str] = []
+    for day, sources in _segments_by_day(segments_dir).items():
+        out_path = out_dir / f"{day}{DAY_FILE_SUFFIX}"
+        if out_path.exists():
+            try:
+                current = DayFile(out_path).header.get("sources")
+            except (OSError, ValueError):
+                current = None
+            if current == sorted(path.name for path in sources):
+                continue
+        build_day_file(day, sources, out_path)
+        rebuilt.append(day)
+    return rebuilt
+
+
+def iter_day_files(
+    store_dir: Path, since: Optional[str] = None, until: Optional[str] = None
+) -> Iterator[DayFile]:
+    """Day files in date order; `since`/`until` are inclusive YYYYMMDD days."""
+    for path in sorted(store_dir.glob(f"*{DAY_FILE_SUFFIX}")):
+        day = path.stem
+        if since is not None and day < since:
+            continue
+        if until is not None and day > until:
+            continue
+        yield DayFile(path)
+
+
+def count_events(
+    store_dir: Path,
+    *,
+    event: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Event counts per day, read from the rollups only."""
+    counts: Dict[str, Dict[str, int]] = {}
+    for day_file in iter_day_files(store_dir, since, until):
+        day_counts = {
+            name: entry["count"]
+            for name, entry in day_file.rollup.items()
+            if event is None or name == event
+        }
+        if day_counts:
+            counts[day_file.day] = day_counts
+    return counts
+
+
+@dataclass
+class Distribution:
+    count: int
+    mean: float
+    min: float
+    p50: float
+    p90: float
+    p99: float
+    max: float
+    # Values of the field that were not numbers (e.g. a stray string).
+    skipped: int = 0
+
+
+def _as_number(value: str) -> Optional[float]:
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return math.nan
+    pos = (len(sorted_values) - 1) * q
+    low = math.floor(pos)
+    high = math.ceil(pos)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def field_distribution(
+    store_dir: Path,
+    event: str,
+    field: str,
+    *,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Optional[Distribution]:
+    """Distribution of a numeric payload field for one event.
+
+    A day where the field also held strings is stored dictionary-encoded;
+    its numeric-looking values still count and the rest are skipped. Raises
+    ValueError if the field never held a number.
+    """
+    values: List[float] = []
+    skipped = 0
+    column_name = f"payload.{field}"
+    for day_file in iter_day_files(store_dir, since, until):
+        code = day_file.event_code(event)
+        if code is None or not day_file.has_column(column_name):
+            continue
+        meta = day_file.header["columns"][column_name]
+        events = day_file.column("event")
+        column = day_file.column(column_name)
+        if meta["type"] == "f64":
+            values.extend(
+                value
+                for event_code, value in zip(events, column)
+                if event_code == code and not math.isnan(value)
+            )
+            continue
+        strings = meta.get("values") or []
+        for event_code, value_code in zip(events, column):
+            if event_code != code or value_code == MISSING_CODE:
+                continue
+            number = _as_number(strings[value_code])
+            if number is None:
+                skipped += 1
+            else:
+                values.append(number)
+    if not values:
+        if skipped:
+            raise ValueError(f"{field} is not numeric")
+        return None
+    values.sort()
+    return Distribution(
+        count=len(values),
+        mean=sum(values) / len(values),
+        min=values[0],
+        p50=_quantile(values, 0.5),
+        p90=_quantile(values, 0.9),
+        p99=_quantile(values, 0.99),
+        max=values[-1],
+        skipped=skipped,
+    )
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Any, Dict
 
-from services.db import get_db_client, disable_db
+from services.db import get_db_client, disable_db, run_db
 from services.datetime_utils import parse_db_datetime
 
 
@@ -24,7 +24,7 @@ class Checkin:
         return Checkin(**data)
 
 
-def add_checkin(user_id: int, mood: int, anxiety: int, energy: int) -> Checkin:
+async def add_checkin(user_id: int, mood: int, anxiety: int, energy: int) -> Checkin:
     client = get_db_client()
     try:
         builder = client.table("checkins").insert(
@@ -39,7 +39,7 @@ def add_checkin(user_id: int, mood: int, anxiety: int, energy: int) -> Checkin:
             builder = builder.select("*")
         except AttributeError:
             pass
-        response = builder.execute()
+        response = await run_db(builder.execute)
     except Exception as e:
         disable_db(e)
         raise
@@ -1,4 +1,9 @@
 import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Deque, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 HIGH_RISK_PATTERNS = [
     r"поконч(ить|у) с собой",
@@ -40,24 +45,6 @@ INTENSIFIERS = [
 ]
 
 
-def _matches_any(patterns: list[str], text: str) -> bool:
-    return any(re.search(pattern, text) for pattern in patterns)
-
-
-def detect_crisis(text: str) -> bool:
-    lowered = text.lower()
-    if _matches_any(HIGH_RISK_PATTERNS, lowered):
-        return True
-
-    score = 0
-    if _matches_any(MEDIUM_RISK_PATTERNS, lowered):
-        score += 1
-    if _matches_any(INTENSIFIERS, lowered):
-        score += 1
-
-    return score >= 2
-
-
 DISTRESS_PATTERNS = [
     r"очень плохо",
     r"мне плохо",
@@ -78,6 +65,198 @@ DISTRESS_PATTERNS = [
 ]
 
 
-def detect_distress(text: str) -> bool:
+GROUP_HIGH = "high"
+GROUP_MEDIUM = "medium"
+GROUP_INTENSIFIER = "intensifier"
+GROUP_DISTRESS = "distress"
+
+# Groups that only mean something next to another group's hit, and are not
+# searched for otherwise (an intensifier alone does not raise the level).
+GROUP_REQUIRES = {GROUP_INTENSIFIER: GROUP_MEDIUM}
+
+RISK_NONE = "none"
+RISK_LOW = "low"
+RISK_MEDIUM = "medium"
+RISK_HIGH = "high"
+
+
+@dataclass(frozen=True)
+class RiskMatch:
+    group: str
+    pattern: str
+    span: Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class RiskAssessment:
+    """Everything the crisis patterns found in one message.
+
+    `level` is "high" for a high-risk phrase, "medium" for a medium-risk
+    phrase together with an intensifier, "low" for any other hit and
+    "none" otherwise. Spans index the lowercased text, which for Russian and
+    English has the same positions as the original.
+    """
+
+    level: str
+    groups: FrozenSet[str]
+    matches: Tuple[RiskMatch, ...]
+
+    @property
+    def crisis(self) -> bool:
+        return self.level in (RISK_HIGH, RISK_MEDIUM)
+
+    @property
+    def distress(self) -> bool:
+        return GROUP_DISTRESS in self.groups
+
+
+NO_RISK = RiskAssessment(level=RISK_NONE, groups=frozenset(), matches=())
+
+
+class CrisisMatcher:
+    """Matches several named pattern groups and reports every hit.
+
+    Each pattern is compiled on its own and tried with `search`, which lets
+    `re` skip ahead to its literal prefix; one alternation of all patterns
+    cannot, and is several times slower on long clean text. Only a pattern
+    that hits is scanned again for its further matches, so groups whose
+    patterns overlap (e.g. "устал жить" and "устал") are all reported.
+    Groups listed in GROUP_REQUIRES are searched only after a hit of the
+    group they depend on, which must come earlier in `groups`.
+    """
+
+    def __init__(self, groups: Dict[str, Sequence[str]]) -> None:
+        self.groups = {group: list(patterns) for group, patterns in groups.items()}
+        self._compiled: List[Tuple[str, str, "re.Pattern[str]"]] = [
+            (group, pattern, re.compile(pattern))
+            for group, patterns in self.groups.items()
+            for pattern in patterns
+        ]
+        self._by_group: Dict[str, List["re.Pattern[str]"]] = {}
+        for group, _, regex in self._compiled:
+            self._by_group.setdefault(group, []).append(regex)
+
+    def matches_group(self, group: str, lowered: str) -> bool:
+        """Whether any pattern of `group` occurs in already lowercased text."""
+        return any(regex.search(lowered) for regex in self._by_group.get(group, ()))
+
+    def scan(self, text: str) -> Tuple[RiskMatch, ...]:
+        lowered = text.lower()
+        matches: List[RiskMatch] = []
+        hit_groups: Set[str] = set()
+        for group, pattern, regex in self._compiled:
+            required = GROUP_REQUIRES.get(group)
+            if required is not None and required not in hit_groups:
+                continue
+            first = regex.search(lowered)
+            if first is None:
+                continue
+            hit_groups.add(group)
+            matches.append(RiskMatch(group=group, pattern=pattern, span=first.span()))
+            for match in regex.finditer(lowered, first.end()):
+                matches.append(RiskMatch(group=group, pattern=pattern, span=match.span()))
+        matches.sort(key=lambda item: item.span)
+        return tuple(matches)
+
+    def assess(self, text: str) -> RiskAssessment:
+        matches = self.scan(text)
+        if not matches:
+            return NO_RISK
+        groups = frozenset(match.group for match in matches)
+        if GROUP_HIGH in groups:
+            level = RISK_HIGH
+        elif GROUP_MEDIUM in groups and GROUP_INTENSIFIER in groups:
+            level = RISK_MEDIUM
+        else:
+            level = RISK_LOW
+        return RiskAssessment(level=level, groups=groups, matches=matches)
+
+
+RISK_GROUPS: Dict[str, List[str]] = {
+    GROUP_HIGH: HIGH_RISK_PATTERNS,
+    GROUP_MEDIUM: MEDIUM_RISK_PATTERNS,
+    GROUP_INTENSIFIER: INTENSIFIERS,
+    GROUP_DISTRESS: DISTRESS_PATTERNS,
+}
+
+DEFAULT_SCORE_CHUNK_SIZE = 1000
+# Chunks submitted ahead per worker; bounds memory on long streams.
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+_matcher = CrisisMatcher(RISK_GROUPS)
+_worker_matcher: Optional[CrisisMatcher] = None
+
+
+def assess_risk(text: str) -> RiskAssessment:
+    return _matcher.assess(text)
+
+
+def detect_crisis(text: str) -> bool:
+    """Same verdict as assess_risk(text).crisis, stopping at the first hit."""
     lowered = text.lower()
-    return _matches_any(DISTRESS_PATTERNS, lowered)
+    if _matcher.matches_group(GROUP_HIGH, lowered):
+        return True
+    return _matcher.matches_group(GROUP_MEDIUM, lowered) and _matcher.matches_group(
+        GROUP_INTENSIFIER, lowered
+    )
+
+
+def detect_distress(text: str) -> bool:
+    """Same verdict as assess_risk(text).distress, stopping at the first hit."""
+    return _matcher.matches_group(GROUP_DISTRESS, text.lower())
+
+
+def _init_score_worker(groups: Dict[str, List[str]]) -> None:
+    global _worker_matcher
+    _worker_matcher = CrisisMatcher(groups)
+
+
+def _score_chunk(texts: List[str]) -> List[RiskAssessment]:
+    assert _worker_matcher is not None
+    return [_worker_matcher.assess(text) for text in texts]
+
+
+def _chunks(texts: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def score_texts(
+    texts: Iterable[str],
+    *,
+    matcher: Optional[CrisisMatcher] = None,
+    chunk_size: int = DEFAULT_SCORE_CHUNK_SIZE,
+    processes: int = 0,
+) -> Iterator[RiskAssessment]:
+    """Assesses many texts, yielding results in input order.
+
+    The input is consumed lazily in chunks, so arbitrarily long streams
+    (e.g. a paged export of `messages`) run in bounded memory. With
+    `processes` > 0 chunks are scored in a process pool, keeping only a
+    couple of chunks per worker in flight.
+    """
+    matcher = matcher or _matcher
+    chunk_size = max(chunk_size, 1)
+    if processes <= 0:
+        for chunk in _chunks(texts, chunk_size):
+            for text in chunk:
+                yield matcher.assess(text)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_score_worker,
+        initargs=(matcher.groups,),
+    ) as pool:
+        pending: Deque["Future[List[RiskAssessment]]"] = deque()
+        max_in_flight = processes * CHUNKS_IN_FLIGHT_PER_WORKER
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(pool.submit(_score_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
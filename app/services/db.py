@@ -1,14 +1,22 @@
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Optional
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
 
 from supabase import Client, create_client
 
 from config import load_settings
 
+DEFAULT_DB_MAX_WORKERS = 8
+
+T = TypeVar("T")
+
 _db_client: Optional[Client] = None
 _db_error: Optional[Exception] = None
+_db_executor: Optional[ThreadPoolExecutor] = None
 
 
 def get_db_client() -> Client:
@@ -42,3 +50,33 @@ def disable_db(exc: Exception) -> None:
     _db_client = None
     _db_error = exc
     logging.getLogger(__name__).warning("Supabase disabled after error: %s", exc)
+
+
+def _get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        raw_workers = os.getenv("DB_MAX_WORKERS", "").strip()
+        max_workers = int(raw_workers) if raw_workers.isdigit() else DEFAULT_DB_MAX_WORKERS
+        _db_executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers),
+            thread_name_prefix="supabase",
+        )
+    return _db_executor
+
+
+async def run_db(query: Callable[..., T], *args: Any) -> T:
+    """Runs a blocking Supabase call on the bounded DB executor.
+
+    The sync client keeps one pooled HTTP connection set, so the executor
+    size caps how many requests are in flight at once while the event loop
+    keeps serving other updates.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_db_executor(), query, *args)
+
+
+def shutdown_db_executor() -> None:
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+PHRASES_PATH = Path(__file__).resolve().parents[1] / "assets" / "intents" / "phrases.json"
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+
+
+def normalize_intent_text(text: str) -> str:
+    """Lowercases, drops punctuation and collapses whitespace."""
+    raw = (text or "").strip().lower()
+    if not raw:
+        return ""
+    return " ".join(_PUNCTUATION_RE.sub("", raw).split())
+
+
+@dataclass(frozen=True)
+class Intent:
+    name: str
+    topic: Optional[str] = None
+    flags: FrozenSet[str] = frozenset()
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Regex for a set of phrases, factored by common prefix.
+
+    Optional tails are greedy, so at any position the longest phrase
+    wins; shorter phrases at the same position are its prefixes.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+@dataclass
+class _IntentRule:
+    name: str
+    max_length: int
+    any_of: List[FrozenSet[str]] = field(default_factory=list)
+    exact: FrozenSet[str] = frozenset()
+    topic_re: Optional[re.Pattern] = None
+    topic_patterns: List[re.Pattern] = field(default_factory=list)
+    topic_strip: str = ""
+    max_topic_length: int = 0
+    stems: Tuple[str, ...] = ()
+    words: FrozenSet[str] = frozenset()
+    flags: Dict[str, str] = field(default_factory=dict)
+
+
+class IntentEngine:
+    """Classifies a message into one of the intents in a phrase file.
+
+    The text is normalized once. Every phrase group used by a rule is
+    compiled into a single prefix-factored regex that is scanned with a
+    lookahead at each position, so one pass finds all groups present,
+    overlapping matches included. Intents are tried in file order and the
+    first that matches wins; each only applies up to its `max_length`.
+    """
+
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        groups: Dict[str, List[str]] = spec["groups"]
+        self._rules: List[_IntentRule] = []
+        scanned: Set[str] = set()
+        for raw in spec["intents"]:
+            rule = _IntentRule(name=raw["name"], max_length=int(raw["max_length"]))
+            rule.any_of = [frozenset(names) for names in raw.get("any_of", [])]
+            rule.exact = frozenset(
+                phrase for name in raw.get("exact", []) for phrase in groups[name]
+            )
+            if raw.get("patterns"):
+                compiled = [re.compile(pattern) for pattern in raw["patterns"]]
+                for pattern in compiled:
+                    if pattern.groups != 1:
+                        raise ValueError(
+                            f"{rule.name}: topic pattern needs one group: {pattern.pattern}"
+                        )
+                rule.topic_re = re.compile("|".join(f"(?:{p.pattern})" for p in compiled))
+                rule.topic_patterns = compiled
+                rule.topic_strip = raw.get("strip", "")
+                rule.max_topic_length = int(raw.get("max_topic_length", 0))
+            tokens = raw.get("tokens") or {}
+            rule.stems = tuple(tokens.get("stems", ()))
+            rule.words = frozenset(tokens.get("words", ()))
+            rule.flags = dict(raw.get("flags", {}))
+            for names in rule.any_of:
+                scanned.update(names)
+            scanned.update(rule.flags.values())
+            self._rules.append(rule)
+
+        # Each phrase reports its own groups plus those of every phrase
+        # that is a prefix of it, since the scan only returns the longest.
+        phrase_groups: Dict[str, Set[str]] = {}
+        for name in scanned:
+            for phrase in groups[name]:
+                phrase_groups.setdefault(phrase, set()).add(name)
+        self._labels: Dict[str, FrozenSet[str]] = {}
+        for phrase in phrase_groups:
+            labels: Set[str] = set()
+            for other, names in phrase_groups.items():
+                if phrase.startswith(other):
+                    labels |= names
+            self._labels[phrase] = frozenset(labels)
+        self._scan_re = (
+            re.compile(f"(?=({_trie_pattern(phrase_groups)}))") if phrase_groups else None
+        )
+        self._scan_limit = max(
+            (
+                rule.max_length
+                for rule in self._rules
+                if rule.any_of or rule.flags
+            ),
+            default=0,
+        )
+        self._max_length = max((rule.max_length for rule in self._rules), default=0)
+
+    def _scan(self, cleaned: str) -> FrozenSet[str]:
+        if self._scan_re is None or len(cleaned) > self._scan_limit:
+            return frozenset()
+        found: Set[str] = set()
+        for match in self._scan_re.finditer(cleaned):
+            found |= self._labels[match.group(1)]
+        return frozenset(found)
+
+    @staticmethod
+    def _clean_topic(rule: _IntentRule, match: re.Match) -> str:
+        topic = next((group for group in match.groups() if group is not None), "")
+        topic = topic.strip().strip(rule.topic_strip)
+        if rule.max_topic_length and len(topic) > rule.max_topic_length:
+            topic = topic[: rule.max_topic_length].rstrip()
+        return topic
+
+    def _topic(self, rule: _IntentRule, cleaned: str) -> Optional[str]:
+        """The combined pattern finds the first match; when its topic strips
+        to nothing, the patterns are tried one by one like they used to be.
+        """
+        assert rule.topic_re is not None
+        match = rule.topic_re.match(cleaned)
+        if not match:
+            return None
+        topic = self._clean_topic(rule, match)
+        if topic:
+            return topic
+        for pattern in rule.topic_patterns:
+            match = pattern.match(cleaned)
+            topic = self._clean_topic(rule, match) if match else ""
+            if topic:
+                return topic
+        return None
+
+    @staticmethod
+    def _tokens_match(rule: _IntentRule, cleaned: str) -> bool:
+        has_stem = False
+        for token in cleaned.split():
+            if token.startswith(rule.stems):
+                has_stem = True
+            elif token not in rule.words:
+                return False
+        return has_stem
+
+    def classify(self, text: str) -> Optional[Intent]:
+        cleaned = normalize_intent_text(text)
+        if not cleaned or len(cleaned) > self._max_length:
+            return None
+        found: Optional[FrozenSet[str]] = None
+        for rule in self._rules:
+            if len(cleaned) > rule.max_length:
+                continue
+            if rule.any_of or rule.flags:
+                if found is None:
+                    found = self._scan(cleaned)
+            topic: Optional[str] = None
+            matched = cleaned in rule.exact
+            if not matched and rule.any_of:
+                matched = any(names <= found for names in rule.any_of)  # type: ignore[operator]
+            if not matched and rule.topic_re is not None:
+                topic = self._topic(rule, cleaned)
+                matched = topic is not None
+            if not matched and rule.stems:
+                matched = self._tokens_match(rule, cleaned)
+            if matched:
+                flags = frozenset(
+                    flag for flag, group in rule.flags.items() if group in found  # type: ignore[operator]
+                )
+                return Intent(rule.name, topic=topic, flags=flags)
+        return None
+
+
+def load_intent_engine(path: Path = PHRASES_PATH) -> IntentEngine:
+    with path.open("r", encoding="utf-8") as fh:
+        return IntentEngine(json.load(fh))
+
+
+_engine: Optional[IntentEngine] = None
+
+
+def get_intent_engine() -> IntentEngine:
+    global _engine
+    if _engine is None:
+        _engine = load_intent_engine()
+    return _engine
+
+
+def classify_intent(text: str) -> Optional[Intent]:
+    return get_intent_engine().classify(text)
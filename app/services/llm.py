@@ -2,14 +2,20 @@ import asyncio
 import logging
 import os
 import random
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from groq import AsyncGroq
+from groq import AsyncGroq, RateLimitError
+
+from services.llm_scheduler import Priority, get_llm_scheduler
+from services.metrics import get_metrics
+from services.tokens import estimate_tokens
 
 DEFAULT_GROQ_MODEL = "llama-3.3-70b-versatile"
 REQUEST_TIMEOUT_SECONDS = 25
 MAX_RETRIES = 2
 RETRY_BACKOFF_BASE = 1.5
+TECHNICAL_ERROR_TEXT = "Извините, произошла техническая ошибка. Попробуйте позже."
+EMPTY_RESPONSE_TEXT = "Я рядом. Можете рассказать подробнее?"
 
 _client: Optional[AsyncGroq] = None
 
@@ -24,6 +30,27 @@ def _get_client() -> AsyncGroq:
     return _client
 
 
+def _estimate_tokens(messages: list[dict[str, str]], max_completion_tokens: int) -> int:
+    prompt_tokens = sum(estimate_tokens(item.get("content", "")) for item in messages)
+    return prompt_tokens + max_completion_tokens
+
+
+def _chunk_total_tokens(chunk) -> Optional[int]:
+    """Usage from a stream chunk; Groq sends it on the last one in `x_groq`."""
+    usage = getattr(chunk, "usage", None) or getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def _retry_after_seconds(exc: Exception) -> Optional[float]:
+    if not isinstance(exc, RateLimitError):
+        return None
+    raw = exc.response.headers.get("retry-after") if exc.response is not None else None
+    try:
+        return float(raw) if raw else RETRY_BACKOFF_BASE
+    except ValueError:
+        return RETRY_BACKOFF_BASE
+
+
 async def _request_chat(
     *,
     model: str,
@@ -45,24 +72,40 @@ async def _request_with_retries(
     messages: list[dict[str, str]],
     temperature: float,
     max_completion_tokens: int,
+    priority: Priority,
 ):
+    scheduler = get_llm_scheduler()
+    estimated_tokens = _estimate_tokens(messages, max_completion_tokens)
+    metrics = get_metrics()
     for attempt in range(MAX_RETRIES + 1):
         try:
-            return await asyncio.wait_for(
-                _request_chat(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_completion_tokens=max_completion_tokens,
-                ),
-                timeout=REQUEST_TIMEOUT_SECONDS,
-            )
-        except Exception:
+            queued_at = metrics.now()
+            async with scheduler.slot(priority, estimated_tokens):
+                metrics.observe_since("llm.queue", queued_at)
+                with metrics.span("llm.request"):
+                    response = await asyncio.wait_for(
+                        _request_chat(
+                            model=model,
+                            messages=messages,
+                            temperature=temperature,
+                            max_completion_tokens=max_completion_tokens,
+                        ),
+                        timeout=REQUEST_TIMEOUT_SECONDS,
+                    )
+            usage = getattr(response, "usage", None)
+            scheduler.settle(estimated_tokens, getattr(usage, "total_tokens", None))
+            return response
+        except Exception as exc:
             logging.exception("Groq API error (attempt %s)", attempt + 1)
+            retry_after = _retry_after_seconds(exc)
+            if retry_after is not None:
+                # Rate limited: hold every queued request, not just this one.
+                scheduler.pause(retry_after)
             if attempt >= MAX_RETRIES:
                 raise
-            backoff = RETRY_BACKOFF_BASE ** attempt + random.random()
-            await asyncio.sleep(backoff)
+            if retry_after is None:
+                backoff = RETRY_BACKOFF_BASE ** attempt + random.random()
+                await asyncio.sleep(backoff)
 
 
 async def generate_text(
@@ -72,6 +115,7 @@ async def generate_text(
     temperature: float,
     max_completion_tokens: int,
     fallback: Optional[str],
+    priority: Priority = Priority.THERAPY,
 ) -> Optional[str]:
     model = DEFAULT_GROQ_MODEL
     messages = [
@@ -84,6 +128,7 @@ async def generate_text(
             messages=messages,
             temperature=temperature,
             max_completion_tokens=max_completion_tokens,
+            priority=priority,
         )
     except Exception:
         logging.exception("Groq API failed after retries")
@@ -101,15 +146,112 @@ async def generate_response(
     system_prompt: str,
     temperature: float = 0.6,
     max_completion_tokens: int = 512,
+    priority: Priority = Priority.THERAPY,
 ) -> str:
     text = await generate_text(
         prompt=prompt,
         system_prompt=system_prompt,
         temperature=temperature,
         max_completion_tokens=max_completion_tokens,
-        fallback="Извините, произошла техническая ошибка. Попробуйте позже.",
+        fallback=TECHNICAL_ERROR_TEXT,
+        priority=priority,
     )
-    return text or "Я рядом. Можете рассказать подробнее?"
+    return text or EMPTY_RESPONSE_TEXT
+
+
+def streaming_enabled() -> bool:
+    return os.getenv("LLM_STREAMING", "1").strip() != "0"
+
+
+async def stream_response(
+    *,
+    prompt: str,
+    system_prompt: str,
+    temperature: float = 0.6,
+    max_completion_tokens: int = 512,
+    priority: Priority = Priority.THERAPY,
+) -> AsyncIterator[str]:
+    """Yields the completion as text deltas while Groq generates it.
+
+    Failures before the first delta are retried like generate_response; a
+    failure mid-stream keeps what was already produced. Falls back to the
+    same texts as generate_response when nothing usable arrives. Each
+    attempt settles the tokens/min bucket when it ends, with the usage
+    from the final chunk or, without one, the prompt estimate plus the
+    tokens streamed so far.
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+    scheduler = get_llm_scheduler()
+    estimated_tokens = _estimate_tokens(messages, max_completion_tokens)
+    prompt_tokens = estimated_tokens - max_completion_tokens
+    metrics = get_metrics()
+    for attempt in range(MAX_RETRIES + 1):
+        produced = False
+        try:
+            queued_at = metrics.now()
+            async with scheduler.slot(priority, estimated_tokens):
+                metrics.observe_since("llm.queue", queued_at)
+                requested_at = metrics.now()
+                used_tokens: Optional[int] = None
+                output_tokens = 0
+                try:
+                    stream = await asyncio.wait_for(
+                        _get_client().chat.completions.create(
+                            model=DEFAULT_GROQ_MODEL,
+                            messages=messages,
+                            temperature=temperature,
+                            max_completion_tokens=max_completion_tokens,
+                            stream=True,
+                        ),
+                        timeout=REQUEST_TIMEOUT_SECONDS,
+                    )
+                    chunks = stream.__aiter__()
+                    while True:
+                        # Bound each wait separately so the caller's own awaits
+                        # between deltas never count against the request timeout.
+                        try:
+                            chunk = await asyncio.wait_for(
+                                chunks.__anext__(), timeout=REQUEST_TIMEOUT_SECONDS
+                            )
+                        except StopAsyncIteration:
+                            break
+                        used_tokens = _chunk_total_tokens(chunk) or used_tokens
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not produced:
+                                metrics.observe_since("llm.first_token", requested_at)
+                            produced = True
+                            output_tokens += estimate_tokens(delta)
+                            yield delta
+                finally:
+                    # Also runs when the caller closes the generator early.
+                    scheduler.settle(
+                        estimated_tokens,
+                        used_tokens if used_tokens is not None else prompt_tokens + output_tokens,
+                    )
+            if produced:
+                metrics.observe_since("llm.stream", requested_at)
+                return
+            break
+        except Exception as exc:
+            logging.exception("Groq streaming error (attempt %s)", attempt + 1)
+            retry_after = _retry_after_seconds(exc)
+            if retry_after is not None:
+                scheduler.pause(retry_after)
+            if produced:
+                return
+            if attempt >= MAX_RETRIES:
+                yield TECHNICAL_ERROR_TEXT
+                return
+            if retry_after is None:
+                backoff = RETRY_BACKOFF_BASE ** attempt + random.random()
+                await asyncio.sleep(backoff)
+    yield EMPTY_RESPONSE_TEXT
 
 
 async def generate_summary(
@@ -124,4 +266,5 @@ async def generate_summary(
         temperature=0.3,
         max_completion_tokens=max_completion_tokens,
         fallback=None,
+        priority=Priority.BACKGROUND,
     )
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from services.metrics import get_metrics
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 12000
+
+
+class Priority(IntEnum):
+    THERAPY = 0
+    BACKGROUND = 1
+
+
+class TokenBucket:
+    """Refills continuously up to one minute's worth of budget.
+
+    A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self._rate = per_minute / 60.0
+        self._capacity = float(per_minute)
+        self._level = float(per_minute)
+        self._clock = clock
+        self._updated_at = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._rate > 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._level = min(self._capacity, self._level + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self._capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) / self._rate
+
+    def consume(self, amount: float) -> None:
+        if not self.enabled:
+            return
+        self._refill()
+        self._level -= min(amount, self._capacity)
+
+    def refund(self, amount: float) -> None:
+        if not self.enabled:
+            return
+        self._refill()
+        self._level = min(self._capacity, self._level + amount)
+
+
+@dataclass
+class WaitStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+
+@dataclass(order=True)
+class _Ticket:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+    tokens: int = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class LLMScheduler:
+    """Admission control in front of the Groq client.
+
+    Requests wait in a priority queue and are released while there is a free
+    concurrency slot and both the requests/min and tokens/min buckets allow
+    them. A 429 pauses dispatch for the advertised retry-after instead of
+    letting every caller retry at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_concurrency = max(1, max_concurrency)
+        self._requests = TokenBucket(requests_per_minute, clock)
+        self._tokens = TokenBucket(tokens_per_minute, clock)
+        self._clock = clock
+        self._queue: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits: Dict[Priority, WaitStats] = {p: WaitStats() for p in Priority}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queue_depth(self, priority: Optional[Priority] = None) -> int:
+        return sum(
+            1
+            for ticket in self._queue
+            if not ticket.future.done() and (priority is None or ticket.priority == priority)
+        )
+
+    def snapshot(self) -> Dict[str, object]:
+        return {
+            "in_flight": self._in_flight,
+            "paused_for": max(0.0, self._paused_until - self._clock()),
+            "queue_depth": {p.name.lower(): self.queue_depth(p) for p in Priority},
+            "wait_seconds": {
+                p.name.lower(): {
+                    "count": stats.count,
+                    "total": round(stats.total_seconds, 3),
+                    "max": round(stats.max_seconds, 3),
+                }
+                for p, stats in self._waits.items()
+            },
+        }
+
+    def pause(self, seconds: float) -> None:
+        """Holds back all dispatch, e.g. after a 429 with retry-after."""
+        self._paused_until = max(self._paused_until, self._clock() + max(seconds, 0.0))
+        self._pump()
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """Corrects the tokens/min bucket once real usage is known."""
+        if actual_tokens is None:
+            return
+        diff = actual_tokens - estimated_tokens
+        if diff > 0:
+            self._tokens.consume(diff)
+        elif diff < 0:
+            self._tokens.refund(-diff)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._pump()
+
+    def _pump(self) -> None:
+        while self._queue and self._in_flight < self._max_concurrency:
+            ticket = self._queue[0]
+            if ticket.future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = self._clock()
+            wait = max(
+                self._paused_until - now,
+                self._requests.wait_time(1),
+                self._tokens.wait_time(ticket.tokens),
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._queue)
+            self._requests.consume(1)
+            self._tokens.consume(ticket.tokens)
+            self._in_flight += 1
+            self._waits[Priority(ticket.priority)].add(now - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._pump()
+
+    async def acquire(self, priority: Priority, tokens: int) -> None:
+        loop = asyncio.get_running_loop()
+        ticket = _Ticket(
+            priority=int(priority),
+            seq=next(self._seq),
+            future=loop.create_future(),
+            tokens=max(tokens, 0),
+            enqueued_at=self._clock(),
+        )
+        heapq.heappush(self._queue, ticket)
+        self._pump()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # The slot was granted just before the caller went away.
+                self._release()
+            else:
+                ticket.future.cancel()
+                self._pump()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority, tokens: int) -> AsyncIterator[None]:
+        await self.acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def _env_number(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(
+            max_concurrency=int(_env_number("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            requests_per_minute=_env_number("GROQ_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE),
+            tokens_per_minute=_env_number("GROQ_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE),
+        )
+        get_metrics().add_source("llm_scheduler", _scheduler.snapshot)
+    return _scheduler
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_FLUSH_INTERVAL_MS = 250
+DEFAULT_MAX_BATCH_ROWS = 50
+FAILURE_BACKOFF_SECONDS = 2.0
+DEFAULT_MAX_ROW_ATTEMPTS = 5
+# Failures of one row closer together than this count as one attempt, so
+# a short outage with many reads does not use up a row's attempts.
+ROW_ATTEMPT_SPACING_SECONDS = 30.0
+DATA_DIR_NAME = "data"
+JOURNAL_FILE_NAME = "message_journal.jsonl"
+DEAD_LETTER_FILE_NAME = "message_journal.dead.jsonl"
+
+Row = Dict[str, Any]
+RowWriter = Callable[[List[Row]], Awaitable[None]]
+
+
+class MessageJournal:
+    """Write-behind buffer for `messages` rows.
+
+    Rows are queued in memory (and appended to a local JSONL file when a path
+    is given), then written in multi-row batches every flush interval or as
+    soon as a full batch is queued. The file is append-only: it is fsynced
+    once per flush and truncated once the queue drains, or rewritten when
+    it has grown well past the queue. Whatever is in it on startup is
+    replayed; rows carry client-generated ids, so replaying rows that were
+    already written is idempotent. All file work runs on one helper thread,
+    in submission order, never on the event loop.
+
+    A row the database keeps rejecting is moved to a dead-letter file after
+    `max_row_attempts` attempts, so it cannot block the rows (and reads) of
+    its user for good.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        *,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+        max_batch_rows: int = DEFAULT_MAX_BATCH_ROWS,
+        max_row_attempts: int = DEFAULT_MAX_ROW_ATTEMPTS,
+        dead_letter_path: Optional[Path] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._path = path
+        self._dead_letter_path = dead_letter_path
+        if path is not None and dead_letter_path is None:
+            self._dead_letter_path = path.with_name(DEAD_LETTER_FILE_NAME)
+        self._flush_interval = max(flush_interval_ms, 1) / 1000
+        self._max_batch = max(max_batch_rows, 1)
+        self._max_row_attempts = max(max_row_attempts, 1)
+        self._clock = clock
+        self._pending: List[Row] = []
+        # Row id -> (attempts, time of the last counted attempt).
+        self._failures: Dict[str, Tuple[int, float]] = {}
+        self._writer: Optional[RowWriter] = None
+        self._file = None
+        self._file_rows = 0
+        self._io: Optional[ThreadPoolExecutor] = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def has_pending(self, user_id: int) -> bool:
+        return any(row.get("user_id") == user_id for row in self._pending)
+
+    def append(self, row: Row) -> None:
+        self._pending.append(row)
+        if self._io is not None:
+            self._file_rows += 1
+            self._io.submit(self._write_lines, [row])
+        if len(self._pending) >= self._max_batch:
+            self._wakeup.set()
+
+    def discard_user(self, user_id: int) -> None:
+        """Drops queued rows of a user whose data is being deleted."""
+        self._pending = [row for row in self._pending if row.get("user_id") != user_id]
+        self._compact()
+
+    def _replay(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        seen = set()
+        with self._path.open("r", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write.
+                    continue
+                if isinstance(row, dict) and row.get("id") not in seen:
+                    seen.add(row.get("id"))
+                    self._pending.append(row)
+        if self._pending:
+            logging.getLogger(__name__).info(
+                "Replaying %s journaled messages", len(self._pending)
+            )
+
+    # --- file work, run on the helper thread ---
+
+    def _open_file(self) -> None:
+        assert self._path is not None
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._path.open("a", encoding="utf-8")
+
+    def _write_lines(self, rows: List[Row]) -> None:
+        if self._file is None:
+            return
+        self._file.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+    def _rewrite_file(self, rows: List[Row]) -> None:
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.truncate()
+        self._write_lines(rows)
+        self._file.flush()
+
+    def _sync_file(self) -> None:
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _append_dead_letters(self, rows: List[Row]) -> None:
+        if self._dead_letter_path is None:
+            return
+        self._dead_letter_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._dead_letter_path.open("a", encoding="utf-8") as fh:
+            fh.write("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+    # --- event loop side ---
+
+    async def _run_io(self, func: Callable[..., None], *args: Any) -> None:
+        if self._io is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._io, func, *args)
+
+    def _compact(self) -> None:
+        """Shrinks the file to the rows still queued; queued after appends."""
+        if self._io is None:
+            return
+        self._file_rows = len(self._pending)
+        self._io.submit(self._rewrite_file, list(self._pending))
+
+    async def flush(self) -> None:
+        """Writes every queued row, one batch at a time."""
+        if self._writer is None:
+            return
+        async with self._lock:
+            await self._run_io(self._sync_file)
+            try:
+                while self._pending:
+                    batch = self._pending[: self._max_batch]
+                    try:
+                        await self._writer(batch)
+                        done = {row["id"] for row in batch}
+                    except Exception as exc:
+                        if len(batch) == 1:
+                            self._record_failures(batch, exc)
+                            raise
+                        done = await self._write_rows_one_by_one(batch)
+                    for row_id in done:
+                        self._failures.pop(row_id, None)
+                    self._pending = [row for row in self._pending if row["id"] not in done]
+            finally:
+                if not self._pending or self._file_rows > 2 * len(self._pending) + self._max_batch:
+                    self._compact()
+
+    def _record_failures(self, rows: List[Row], exc: Exception) -> None:
+        """Counts a failed attempt per row; gives up on rows out of attempts."""
+        now = self._clock()
+        dead: List[Row] = []
+        for row in rows:
+            attempts, last_at = self._failures.get(row["id"], (0, float("-inf")))
+            if now - last_at >= ROW_ATTEMPT_SPACING_SECONDS:
+                attempts, last_at = attempts + 1, now
+            self._failures[row["id"]] = (attempts, last_at)
+            if attempts >= self._max_row_attempts:
+                dead.append(row)
+        if dead:
+            self._dead_letter(dead, exc)
+
+    def _dead_letter(self, rows: List[Row], exc: Exception) -> None:
+        ids = {row["id"] for row in rows}
+        for row in rows:
+            self._failures.pop(row["id"], None)
+            logging.getLogger(__name__).error(
+                "Moving journaled message %s for user %s to the dead-letter file: %s",
+                row.get("id"),
+                row.get("user_id"),
+                exc,
+            )
+        self._pending = [row for row in self._pending if row["id"] not in ids]
+        if self._io is not None:
+            self._io.submit(self._append_dead_letters, list(rows))
+        self._compact()
+
+    async def _write_rows_one_by_one(self, batch: List[Row]) -> set:
+        """Isolates rows the database rejects so they cannot block the queue.
+
+        If every row fails the database is most likely unreachable, so the
+        batch is kept for the next attempt and each row is charged one
+        attempt. Rows rejected while others went through are dead-lettered
+        at once.
+        """
+        assert self._writer is not None
+        written: set = set()
+        rejected: List[Row] = []
+        last_error: Optional[Exception] = None
+        for row in batch:
+            try:
+                await self._writer([row])
+                written.add(row["id"])
+            except Exception as exc:
+                rejected.append(row)
+                last_error = exc
+        if not written and last_error is not None:
+            self._record_failures(rejected, last_error)
+            raise last_error
+        if rejected:
+            assert last_error is not None
+            self._dead_letter(rejected, last_error)
+        return written
+
+    async def flush_user(self, user_id: int) -> None:
+        """Makes a user's queued rows visible to reads before they happen."""
+        if self.has_pending(user_id):
+            await self.flush()
+
+    async def _run(self) -> None:
+        # The stop flag backs up task cancellation, which wait_for may swallow
+        # when the wakeup event fires at the same moment.
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._stopping or not self._pending:
+                continue
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logging.exception(
+                    "Message journal flush failed, %s rows pending", len(self._pending)
+                )
+                await asyncio.sleep(FAILURE_BACKOFF_SECONDS)
+
+    async def start(self, writer: RowWriter) -> None:
+        self._writer = writer
+        self._stopping = False
+        if self._path is not None and self._io is None:
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._io, self._replay)
+            await self._run_io(self._open_file)
+            self._compact()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if self._pending:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logging.exception(
+                "Final message journal flush failed, %s rows kept on disk", len(self._pending)
+            )
+        if self._io is not None:
+            await self._run_io(self._sync_file)
+            await self._run_io(self._close_file)
+            self._io.shutdown(wait=True)
+            self._io = None
+
+
+_journal: Optional[MessageJournal] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw.isdigit() else default
+
+
+def get_message_journal() -> MessageJournal:
+    global _journal
+    if _journal is None:
+        path: Optional[Path] = None
+        if os.getenv("MESSAGE_JOURNAL_PERSIST", "1").strip() != "0":
+            root_dir = Path(__file__).resolve().parents[2]
+            path = root_dir / DATA_DIR_NAME / JOURNAL_FILE_NAME
+        _journal = MessageJournal(
+            path,
+            flush_interval_ms=_env_int("MESSAGE_JOURNAL_FLUSH_MS", DEFAULT_FLUSH_INTERVAL_MS),
+            max_batch_rows=_env_int("MESSAGE_JOURNAL_BATCH", DEFAULT_MAX_BATCH_ROWS),
+            max_row_attempts=_env_int("MESSAGE_JOURNAL_MAX_ATTEMPTS", DEFAULT_MAX_ROW_ATTEMPTS),
+        )
+    return _journal
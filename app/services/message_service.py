@@ -1,10 +1,23 @@
 from __future__ import annotations
-from dataclasses import dataclass
+import logging
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from uuid import uuid4
 
-from services.db import get_db_client, disable_db
+from postgrest.types import ReturnMethod
+
+from services.db import get_db_client, disable_db, run_db
 from services.datetime_utils import parse_db_datetime
+from services.message_journal import get_message_journal
+from services.metrics import timed
+from services.user_cache import get_user_cache
+from services.user_service import (
+    User,
+    get_or_create_user,
+    increment_user_message_counter,
+    update_distress,
+)
 
 MAX_MESSAGE_CHARS = 1200
 
@@ -25,49 +38,87 @@ class Message:
         return Message(**data)
 
 
-def add_message(user_id: int, role: str, content: str) -> Message:
-    """Adds a new message to the database for a given user."""
+@dataclass
+class IngestResult:
+    user: User
+    history: List[Message] = field(default_factory=list)
+    should_offer_support: bool = False
+
+
+def _clean_content(content: str) -> str:
     cleaned_content = (content or "").strip()
     if len(cleaned_content) > MAX_MESSAGE_CHARS:
         cleaned_content = cleaned_content[:MAX_MESSAGE_CHARS].rstrip() + "..."
+    return cleaned_content
+
+
+def add_message(user_id: int, role: str, content: str) -> None:
+    """Queues a message for the given user on the write-behind journal."""
+    get_message_journal().append(
+        {
+            "id": str(uuid4()),
+            "user_id": user_id,
+            "role": role,
+            "content": _clean_content(content),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+    )
+
+
+async def _write_message_rows(rows: List[Dict[str, Any]]) -> None:
+    """Inserts a journal batch; rows already stored are skipped by id.
 
+    Errors are left to the journal, which retries or isolates bad rows, so
+    they do not disable the client here.
+    """
     client = get_db_client()
+    await run_db(
+        client.table("messages")
+        .upsert(
+            rows,
+            returning=ReturnMethod.minimal,
+            on_conflict="id",
+            ignore_duplicates=True,
+        )
+        .execute
+    )
+
 
+async def _flush_journal_for(user_id: int) -> None:
+    """Writes the user's queued rows before a read; failures are only logged.
+
+    The journal keeps and retries rows it could not write, so a read goes
+    ahead without them rather than failing the user's message.
+    """
     try:
-        builder = client.table("messages").insert(
-            {
-                "user_id": user_id,
-                "role": role,
-                "content": cleaned_content,
-            }
-        )
-        try:
-            builder = builder.select("*")
-        except AttributeError:
-            pass
-        response = builder.execute()
+        await get_message_journal().flush_user(user_id)
     except Exception as e:
-        disable_db(e)
-        raise
+        logging.getLogger(__name__).warning(
+            "Journal flush before read failed, history may miss queued rows: %s", e
+        )
 
-    data = getattr(response, "data", None) if response is not None else None
-    if not data:
-        raise RuntimeError("Supabase insert did not return message data")
 
-    return Message.from_db(data[0])
+async def start_message_journal() -> None:
+    await get_message_journal().start(_write_message_rows)
+
 
+async def stop_message_journal() -> None:
+    await get_message_journal().stop()
 
-def get_last_n_messages(user_id: int, n: int) -> List[Message]:
+
+@timed("db.history")
+async def get_last_n_messages(user_id: int, n: int) -> List[Message]:
     """Retrieves the last N messages for a given user, ordered by creation time."""
+    await _flush_journal_for(user_id)
     client = get_db_client()
     try:
-        response = (
+        response = await run_db(
             client.table("messages")
             .select("*")
             .eq("user_id", user_id)
             .order("created_at", desc=True)
             .limit(n)
-            .execute()
+            .execute
         )
     except Exception as e:
         disable_db(e)
@@ -82,20 +133,21 @@ def get_last_n_messages(user_id: int, n: int) -> List[Message]:
     return [Message.from_db(item) for item in reversed(data)]
 
 
-def get_all_messages(user_id: int, batch_size: int = 500) -> List[Message]:
+async def get_all_messages(user_id: int, batch_size: int = 500) -> List[Message]:
     """Retrieves all messages for a given user, ordered by creation time."""
+    await _flush_journal_for(user_id)
     client = get_db_client()
     all_items: List[Message] = []
     offset = 0
     while True:
         try:
-            response = (
+            response = await run_db(
                 client.table("messages")
                 .select("*")
                 .eq("user_id", user_id)
                 .order("created_at", desc=False)
                 .range(offset, offset + batch_size)
-                .execute()
+                .execute
             )
         except Exception as e:
             disable_db(e)
@@ -109,3 +161,87 @@ def get_all_messages(user_id: int, batch_size: int = 500) -> List[Message]:
             break
         offset += batch_size
     return all_items
+
+
+def _ingest_payload(response: Any) -> Dict[str, Any]:
+    """Unwraps the single `result` row returned by the ingest RPC."""
+    data = getattr(response, "data", None) if response is not None else None
+    if isinstance(data, list):
+        data = data[0] if data else None
+    if isinstance(data, dict) and "result" in data:
+        data = data["result"]
+    if not data or not data.get("user"):
+        raise RuntimeError("Supabase ingest did not return user data")
+    return data
+
+
+async def _ingest_separately(
+    user_id: int,
+    content: str,
+    *,
+    history_limit: int,
+    is_distress: Optional[bool],
+) -> IngestResult:
+    """The per-step writes the RPC replaces, for when the RPC call fails."""
+    user = await get_or_create_user(user_id)
+    history = await get_last_n_messages(user_id, history_limit)
+    add_message(user_id, "user", content)
+    await increment_user_message_counter(user_id)
+    should_offer = False
+    if is_distress is not None:
+        should_offer = await update_distress(user_id, user, is_distress)
+    return IngestResult(
+        user=get_user_cache().get(user_id) or user,
+        history=history,
+        should_offer_support=should_offer,
+    )
+
+
+@timed("db.ingest")
+async def ingest_user_message(
+    user_id: int,
+    content: str,
+    *,
+    history_limit: int,
+    is_distress: Optional[bool] = None,
+) -> IngestResult:
+    """Stores a user message and updates counters/distress in one RPC.
+
+    Returns the updated user row and the history that preceded the message.
+    Passing is_distress=None leaves the distress streak untouched. If the
+    RPC fails (for example, the function is missing from the database),
+    the same steps run as separate queries.
+    """
+    await _flush_journal_for(user_id)
+    client = get_db_client()
+    try:
+        response = await run_db(
+            client.rpc(
+                "ingest_user_message",
+                {
+                    "user_id_param": user_id,
+                    "content_param": _clean_content(content),
+                    "history_limit_param": history_limit,
+                    "is_distress_param": is_distress,
+                    # Same clock as the journalled assistant replies.
+                    "created_at_param": datetime.now(timezone.utc).isoformat(),
+                },
+            ).execute
+        )
+        data = _ingest_payload(response)
+    except Exception as e:
+        get_user_cache().invalidate(user_id)
+        logging.getLogger(__name__).warning(
+            "Ingest RPC failed, falling back to separate queries: %s", e
+        )
+        return await _ingest_separately(
+            user_id, content, history_limit=history_limit, is_distress=is_distress
+        )
+
+    user = User.from_db(data["user"])
+    get_user_cache().put(user_id, user)
+    return IngestResult(
+        user=user,
+        history=[Message.from_db(item) for item in data.get("history") or []],
+        should_offer_support=bool(data.get("should_offer_support")),
+    )
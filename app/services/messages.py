@@ -1,9 +1,19 @@
+import asyncio
+import logging
+import time
 from pathlib import Path
-from typing import Any, Optional, Union
+from typing import Any, AsyncIterator, Callable, Optional, Tuple, Union
 
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import CallbackQuery, Message, FSInputFile
 
 from services.memory import get_memory_store
+from services.metrics import get_metrics, span, timed
+
+STREAM_PLACEHOLDER = "…"
+# Telegram throttles edits of one chat to roughly one per second.
+STREAM_EDIT_INTERVAL_SECONDS = 1.2
+STREAM_MIN_NEW_CHARS = 24
 
 
 def _record_message(user_id: Optional[int], message_id: int) -> None:
@@ -13,6 +23,7 @@ def _record_message(user_id: Optional[int], message_id: int) -> None:
     store.add_bot_message_id(user_id, message_id)
 
 
+@timed("tg.send")
 async def send_message(
     message: Message, text: str, *, track: bool = True, **kwargs: Any
 ) -> Message:
@@ -108,3 +119,91 @@ async def edit_message(
     message: Message, text: str, **kwargs: Any
 ) -> Message:
     return await message.edit_text(text, **kwargs)
+
+
+async def _try_edit(message: Message, text: str) -> bool:
+    try:
+        with span("tg.edit"):
+            await message.edit_text(text)
+        return True
+    except TelegramRetryAfter as exc:
+        logging.getLogger(__name__).debug("Edit throttled for %ss", exc.retry_after)
+        return False
+    except TelegramBadRequest as exc:
+        # "message is not modified" and similar races are harmless here.
+        logging.getLogger(__name__).debug("Edit rejected: %s", exc)
+        return False
+    except TelegramAPIError as exc:
+        # Network errors included: the next edit or the final one retries.
+        logging.getLogger(__name__).warning("Edit failed: %s", exc)
+        return False
+
+
+async def _final_edit(message: Message, text: str) -> bool:
+    """Applies the final text, waiting out one RetryAfter."""
+    error: Optional[TelegramAPIError] = None
+    for attempt in range(2):
+        try:
+            with span("tg.edit"):
+                await message.edit_text(text)
+            return True
+        except TelegramRetryAfter as exc:
+            error = exc
+            if attempt:
+                break
+            await asyncio.sleep(exc.retry_after)
+        except TelegramAPIError as exc:
+            error = exc
+            break
+    logging.getLogger(__name__).warning("Final streaming edit failed: %s", error)
+    return False
+
+
+async def send_streaming_message(
+    message: Message,
+    chunks: AsyncIterator[str],
+    *,
+    finalize: Optional[Callable[[str], str]] = None,
+    track: bool = True,
+    clock: Callable[[], float] = time.monotonic,
+) -> Tuple[Message, str]:
+    """Sends a placeholder and edits it as text chunks arrive.
+
+    The first text replaces the placeholder at once; later edits are
+    throttled to Telegram's edit rate. The final text (passed through
+    `finalize`, if given) is always delivered, as a new message if the
+    placeholder can no longer be edited. `chunks` is closed on return or
+    error. `clock` times the edit throttle. Returns the sent message and
+    the final text.
+    """
+    metrics = get_metrics()
+    started = metrics.now()
+    text = ""
+    try:
+        sent = await send_message(message, STREAM_PLACEHOLDER, track=track)
+        shown = STREAM_PLACEHOLDER
+        last_edit_at = 0.0
+        async for chunk in chunks:
+            text += chunk
+            candidate = text.strip()
+            if not candidate:
+                continue
+            if clock() - last_edit_at < STREAM_EDIT_INTERVAL_SECONDS:
+                continue
+            if shown != STREAM_PLACEHOLDER and len(candidate) - len(shown) < STREAM_MIN_NEW_CHARS:
+                continue
+            if await _try_edit(sent, candidate):
+                shown = candidate
+            last_edit_at = clock()
+    finally:
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    final_text = text.strip()
+    if finalize is not None:
+        final_text = finalize(final_text)
+    if final_text and final_text != shown and not await _final_edit(sent, final_text):
+        sent = await send_message(message, final_text, track=track)
+    metrics.observe_since("tg.stream_total", started)
+    return sent, final_text
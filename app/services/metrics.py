@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DEFAULT_SLOW_SECONDS = 5.0
+DATA_DIR_NAME = "data"
+SNAPSHOT_FILE_NAME = "metrics.json"
+METRIC_PREFIX = "bot_stage_seconds"
+
+T = TypeVar("T")
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; the last slot counts overflows."""
+
+    __slots__ = ("buckets", "counts", "sum", "count", "errors")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate interpolated inside the bucket holding the q-th value."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= target:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class _Trace:
+    __slots__ = ("name", "stages")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stages: List[Tuple[str, float]] = []
+
+
+_current_trace: ContextVar[Optional[_Trace]] = ContextVar("metrics_trace", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+    async def __aenter__(self) -> "_NoopSpan":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("_metrics", "_stage", "_started", "_trace", "_token")
+
+    def __init__(self, metrics: "Metrics", stage: str, trace: Optional[_Trace]) -> None:
+        self._metrics = metrics
+        self._stage = stage
+        self._trace = trace
+        self._token = None
+        self._started = 0.0
+
+    def __enter__(self) -> "_Span":
+        if self._trace is not None:
+            self._token = _current_trace.set(self._trace)
+        self._started = self._metrics.clock()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        elapsed = self._metrics.clock() - self._started
+        failed = exc_type is not None and not issubclass(exc_type, asyncio.CancelledError)
+        self._metrics.observe(self._stage, elapsed, failed=failed)
+        if self._token is not None:
+            _current_trace.reset(self._token)
+            self._metrics._finish_trace(self._trace, elapsed)
+        return False
+
+    async def __aenter__(self) -> "_Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+
+class Metrics:
+    """Per-stage latency histograms for the message pipeline.
+
+    Stages are timed with `span` (a sync or async context manager) or the
+    `timed` decorator. A `trace` wraps one incoming update: stages that run
+    inside it are also collected for that update, and updates slower than
+    `slow_seconds` are logged with their breakdown. When disabled every
+    call returns a shared no-op object, so instrumentation stays in place
+    at the cost of one attribute check.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+        slow_seconds: float = DEFAULT_SLOW_SECONDS,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.enabled = enabled
+        self.clock = clock
+        self._buckets = buckets
+        self._slow_seconds = slow_seconds
+        self._histograms: Dict[str, Histogram] = {}
+        self._sources: Dict[str, Callable[[], Any]] = {}
+
+    def add_source(self, name: str, source: Callable[[], Any]) -> None:
+        """Adds another component's state to every snapshot under `name`."""
+        self._sources[name] = source
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = Histogram(self._buckets)
+        return histogram
+
+    def observe(self, stage: str, seconds: float, *, failed: bool = False) -> None:
+        if not self.enabled:
+            return
+        histogram = self.histogram(stage)
+        histogram.observe(seconds)
+        if failed:
+            histogram.errors += 1
+        trace = _current_trace.get()
+        if trace is not None and trace.name != stage:
+            trace.stages.append((stage, seconds))
+
+    def now(self) -> float:
+        return self.clock() if self.enabled else 0.0
+
+    def observe_since(self, stage: str, started: float) -> None:
+        """Records time since a `now()` reading, for spans that cross blocks."""
+        if self.enabled:
+            self.observe(stage, self.clock() - started)
+
+    def span(self, stage: str):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, None)
+
+    def trace(self, name: str):
+        """Like `span`, but also the root of the per-update breakdown."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        if _current_trace.get() is not None:
+            return _Span(self, name, None)
+        return _Span(self, name, _Trace(name))
+
+    def _finish_trace(self, trace: Optional[_Trace], elapsed: float) -> None:
+        if trace is None or elapsed < self._slow_seconds:
+            return
+        breakdown = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in trace.stages)
+        logging.getLogger(__name__).info(
+            "Slow %s: %.2fs (%s)", trace.name, elapsed, breakdown or "no stages"
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        stages: Dict[str, Any] = {}
+        for stage, histogram in sorted(self._histograms.items()):
+            stages[stage] = {
+                "count": histogram.count,
+                "errors": histogram.errors,
+                "sum": round(histogram.sum, 6),
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+            }
+        payload: Dict[str, Any] = {"ts": time.time(), "stages": stages}
+        for name, source in self._sources.items():
+            payload[name] = source()
+        return payload
+
+    def render_prometheus(self) -> str:
+        lines = [
+            f"# HELP {METRIC_PREFIX} Time spent in each message pipeline stage.",
+            f"# TYPE {METRIC_PREFIX} histogram",
+        ]
+        errors: List[str] = []
+        for stage, histogram in sorted(self._histograms.items()):
+            label = stage.replace("\\", "\\\\").replace('"', '\\"')
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{METRIC_PREFIX}_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_PREFIX}_bucket{{stage="{label}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{METRIC_PREFIX}_sum{{stage="{label}"}} {histogram.sum:.6f}')
+            lines.append(f'{METRIC_PREFIX}_count{{stage="{label}"}} {histogram.count}')
+            errors.append(f'bot_stage_errors_total{{stage="{label}"}} {histogram.errors}')
+        if errors:
+            lines.append("# HELP bot_stage_errors_total Stages that ended with an exception.")
+            lines.append("# TYPE bot_stage_errors_total counter")
+            lines.extend(errors)
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[Metrics] = None
+_snapshot_task: Optional[asyncio.Task] = None
+_server_runner = None
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "").strip()
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        enabled = (
+            os.getenv("METRICS_ENABLED", "").strip() == "1"
+            or bool(os.getenv("METRICS_PORT", "").strip())
+            or bool(os.getenv("METRICS_SNAPSHOT_SECONDS", "").strip())
+        )
+        _metrics = Metrics(
+            enabled=enabled,
+            slow_seconds=_env_float("METRICS_SLOW_SECONDS", DEFAULT_SLOW_SECONDS),
+        )
+    return _metrics
+
+
+def span(stage: str):
+    return get_metrics().span(stage)
+
+
+def trace(name: str):
+    return get_metrics().trace(name)
+
+
+def timed(stage: str) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Decorator timing every call of a coroutine function as `stage`."""
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            metrics = get_metrics()
+            if not metrics.enabled:
+                return await func(*args, **kwargs)
+            with metrics.span(stage):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _write_snapshot(path: Path, payload: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+async def _run_snapshots(path: Path, interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, _write_snapshot, path, get_metrics().snapshot())
+        except Exception:
+            logging.exception("Metrics snapshot failed")
+
+
+async def _start_server(port: int) -> None:
+    global _server_runner
+    from aiohttp import web
+
+    async def prometheus(_: web.Request) -> web.Response:
+        return web.Response(
+            text=get_metrics().render_prometheus(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def snapshot(_: web.Request) -> web.Response:
+        return web.json_response(get_metrics().snapshot())
+
+    app = web.Application()
+    app.router.add_get("/metrics", prometheus)
+    app.router.add_get("/metrics.json", snapshot)
+    _server_runner = web.AppRunner(app, access_log=None)
+    await _server_runner.setup()
+    host = os.getenv("METRICS_HOST", "127.0.0.1").strip() or "127.0.0.1"
+    await web.TCPSite(_server_runner, host, port).start()
+    logging.getLogger(__name__).info("Metrics endpoint on http://%s:%s/metrics", host, port)
+
+
+async def start_metrics() -> None:
+    """Starts the HTTP endpoint and/or JSON snapshots configured by env."""
+    global _snapshot_task
+    if not get_metrics().enabled:
+        return
+    raw_port = os.getenv("METRICS_PORT", "").strip()
+    if raw_port.isdigit() and _server_runner is None:
+        try:
+            await _start_server(int(raw_port))
+        except Exception:
+            logging.exception("Metrics endpoint could not be started")
+    interval = _env_float("METRICS_SNAPSHOT_SECONDS", 0.0)
+    if interval > 0 and _snapshot_task is None:
+        root_dir = Path(__file__).resolve().parents[2]
+        path = root_dir / DATA_DIR_NAME / SNAPSHOT_FILE_NAME
+        _snapshot_task = asyncio.create_task(_run_snapshots(path, interval))
+
+
+async def stop_metrics() -> None:
+    global _snapshot_task, _server_runner
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        try:
+            await _snapshot_task
+        except asyncio.CancelledError:
+            pass
+        _snapshot_task = None
+    if _server_runner is not None:
+        await _server_runner.cleanup()
+        _server_runner = None
@@ -1,6 +1,10 @@
-from typing import Iterable
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
 
 from services.memory import ChatMessage, MAX_HISTORY_ITEM_CHARS
+from services.tokens import estimate_tokens, fit_to_tokens
 
 THERAPY_SYSTEM_PROMPT = (
     "Вы — психологический помощник, работающий по доказательным методам (КПТ, ACT, DBT). "
@@ -42,26 +46,254 @@ SUPPORT_SYSTEM_PROMPT = (
 
 SUMMARY_HISTORY_LIMIT = 12
 
+DEFAULT_PROMPT_TOKEN_BUDGET = 1800
+SUMMARY_MAX_TOKENS = 300
+PROFILE_MAX_TOKENS = 200
+CONTEXT_MAX_TOKENS = 300
+USER_TEXT_MAX_TOKENS_SHARE = 0.5
+# The newest turns are kept ahead of the summary and profile.
+PINNED_HISTORY_ITEMS = 2
+HISTORY_HEADER = "Недавний диалог:"
+ANSWER_MARKER = "Ответ:"
+HISTORY_HEADER_TOKENS = estimate_tokens(HISTORY_HEADER)
+ANSWER_MARKER_TOKENS = estimate_tokens(ANSWER_MARKER)
+
+
+@dataclass
+class TherapyPrompt:
+    text: str
+    tokens: int
+    budget: int
+    history_items: int
+    history_dropped: int
+    trimmed: bool
+
+
+def prompt_token_budget() -> int:
+    raw = os.getenv("PROMPT_TOKEN_BUDGET", "").strip()
+    return int(raw) if raw.isdigit() else DEFAULT_PROMPT_TOKEN_BUDGET
+
+
+def _history_fields(item: ChatMessage) -> Tuple[str, str]:
+    if isinstance(item, dict):
+        return str(item.get("role", "")), str(item.get("content", ""))
+    if hasattr(item, "role") and hasattr(item, "content"):
+        return str(getattr(item, "role") or ""), str(getattr(item, "content") or "")
+    return "", ""
+
+
+@lru_cache(maxsize=4096)
+def _history_line(raw_role: str, raw_content: str) -> Tuple[str, int]:
+    """Formats one history item and counts its tokens.
+
+    History shifts by one or two messages per turn, so caching per message
+    means only the new lines are formatted and counted each time.
+    """
+    role = "Пользователь" if raw_role == "user" else "Ассистент"
+    content = raw_content.strip()
+    if len(content) > MAX_HISTORY_ITEM_CHARS:
+        content = content[:MAX_HISTORY_ITEM_CHARS].rstrip() + "..."
+    line = f"{role}: {content}"
+    return line, estimate_tokens(line)
+
 
 def _format_history(history: Iterable[ChatMessage]) -> str:
-    lines: list[str] = []
-    for item in history:
-        raw_role = ""
-        raw_content = ""
-        if hasattr(item, "role") and hasattr(item, "content"):
-            raw_role = str(getattr(item, "role") or "")
-            raw_content = str(getattr(item, "content") or "")
-        elif isinstance(item, dict):
-            raw_role = str(item.get("role", ""))
-            raw_content = str(item.get("content", ""))
-        role = "Пользователь" if raw_role == "user" else "Ассистент"
-        content = raw_content.strip()
-        if len(content) > MAX_HISTORY_ITEM_CHARS:
-            content = content[:MAX_HISTORY_ITEM_CHARS].rstrip() + "..."
-        lines.append(f"{role}: {content}")
+    return "\n".join(_history_line(*_history_fields(item))[0] for item in history)
+
+
+@lru_cache(maxsize=1024)
+def _fit_line(line: str, max_tokens: int) -> Tuple[str, int]:
+    """fit_to_tokens for the summary, profile and session lines.
+
+    These stay the same from one turn to the next, so they are counted once
+    rather than on every message.
+    """
+    return fit_to_tokens(line, max_tokens)
+
+
+@dataclass
+class _PromptParts:
+    session_lines: List[str]
+    sections: List[Tuple[str, int]]  # (line, cap): summary, profile, context
+    history_lines: List[Tuple[str, int]]
+    user_line: str
+    user_cap: int
+
+    def fits_by_length(self, budget: int) -> bool:
+        """Whether nothing can need trimming: a token is never shorter than a character."""
+        if len(self.user_line) > self.user_cap:
+            return False
+        total = len(ANSWER_MARKER) + len(self.user_line)
+        for line, cap in self.sections:
+            if len(line) > cap:
+                return False
+            total += len(line)
+        total += sum(map(len, self.session_lines))
+        if self.history_lines:
+            total += len(HISTORY_HEADER)
+            for line, _ in self.history_lines:
+                total += len(line)
+        return total <= budget
+
+    def untrimmed_text(self) -> str:
+        (summary_line, _), (profile_line, _), (context_line, _) = self.sections
+        history_lines = [line for line, _ in self.history_lines]
+        return _join_prompt(self, summary_line, profile_line, context_line, history_lines, self.user_line)
+
+
+def _prompt_parts(
+    *,
+    context: str,
+    summary: str,
+    history: Iterable[ChatMessage],
+    user_text: str,
+    focus: str,
+    session_goal: str,
+    last_outcome: str,
+    profile: str,
+    budget: int,
+) -> _PromptParts:
+    session_lines: List[str] = []
+    if focus and focus != "общее":
+        session_lines.append(f"Тема: {focus}")
+    if session_goal:
+        session_lines.append(f"Цель на сегодня: {session_goal}")
+    if last_outcome:
+        session_lines.append(f"Предыдущий итог: {last_outcome}")
+    return _PromptParts(
+        session_lines=session_lines,
+        sections=[
+            (f"Краткое резюме: {summary}" if summary else "", SUMMARY_MAX_TOKENS),
+            (f"Профиль: {profile}" if profile else "", PROFILE_MAX_TOKENS),
+            (f"Контекст: {context}" if context else "", CONTEXT_MAX_TOKENS),
+        ],
+        history_lines=[_history_line(*_history_fields(item)) for item in history],
+        user_line=f"Сообщение пользователя: {user_text}",
+        user_cap=int(budget * USER_TEXT_MAX_TOKENS_SHARE),
+    )
+
+
+def _join_prompt(
+    parts: _PromptParts,
+    summary_line: str,
+    profile_line: str,
+    context_line: str,
+    history_lines: List[str],
+    user_line: str,
+) -> str:
+    lines = [line for line in (context_line, summary_line, profile_line) if line]
+    lines.extend(parts.session_lines)
+    if history_lines:
+        lines.append(HISTORY_HEADER)
+        lines.extend(history_lines)
+    lines.append(user_line)
+    lines.append(ANSWER_MARKER)
     return "\n".join(lines)
 
 
+def _fit_parts(parts: _PromptParts, budget: int) -> TherapyPrompt:
+    history_lines = parts.history_lines
+    # Everything but the user's message is counted once per distinct string.
+    used = ANSWER_MARKER_TOKENS + sum(_fit_line(line, budget)[1] for line in parts.session_lines)
+    if history_lines:
+        used += HISTORY_HEADER_TOKENS
+
+    if parts.fits_by_length(budget):
+        used += estimate_tokens(parts.user_line)
+        used += sum(_fit_line(line, cap)[1] for line, cap in parts.sections if line)
+        used += sum(tokens for _, tokens in history_lines)
+        return TherapyPrompt(
+            text=parts.untrimmed_text(),
+            tokens=used,
+            budget=budget,
+            history_items=len(history_lines),
+            history_dropped=0,
+            trimmed=False,
+        )
+
+    user_line, user_tokens = fit_to_tokens(parts.user_line, parts.user_cap)
+    trimmed = user_line != parts.user_line
+    used += user_tokens
+    kept: List[Tuple[str, int]] = []
+
+    def keep_history(limit: Optional[int]) -> None:
+        nonlocal used
+        for line, tokens in reversed(history_lines[: len(history_lines) - len(kept)]):
+            if limit is not None and len(kept) >= limit:
+                return
+            if used + tokens > budget:
+                return
+            kept.append((line, tokens))
+            used += tokens
+
+    def fit_section(line: str, cap: int) -> str:
+        nonlocal used, trimmed
+        if not line:
+            return ""
+        fitted, tokens = _fit_line(line, min(cap, budget - used))
+        trimmed = trimmed or fitted != line
+        used += tokens
+        return fitted
+
+    keep_history(PINNED_HISTORY_ITEMS)
+    summary_line, profile_line, context_line = [fit_section(line, cap) for line, cap in parts.sections]
+    keep_history(None)
+    dropped = len(history_lines) - len(kept)
+    trimmed = trimmed or dropped > 0
+    if not kept and history_lines:
+        used -= HISTORY_HEADER_TOKENS
+    return TherapyPrompt(
+        text=_join_prompt(
+            parts,
+            summary_line,
+            profile_line,
+            context_line,
+            [line for line, _ in reversed(kept)],
+            user_line,
+        ),
+        tokens=used,
+        budget=budget,
+        history_items=len(kept),
+        history_dropped=dropped,
+        trimmed=trimmed,
+    )
+
+
+def fit_therapy_prompt(
+    *,
+    context: str,
+    summary: str,
+    history: Iterable[ChatMessage],
+    user_text: str,
+    focus: str,
+    session_goal: str,
+    last_outcome: str,
+    profile: str = "",
+    budget: Optional[int] = None,
+) -> TherapyPrompt:
+    """Builds the therapy prompt so that it fits into a token budget.
+
+    The short session fields and the user message are always kept. The rest
+    of the budget goes, in order, to the newest turns, the summary, the
+    profile, the RAG context and finally older history; long sections are
+    cut at a word boundary and the oldest turns are dropped first.
+    """
+    if budget is None:
+        budget = prompt_token_budget()
+    parts = _prompt_parts(
+        context=context,
+        summary=summary,
+        history=history,
+        user_text=user_text,
+        focus=focus,
+        session_goal=session_goal,
+        last_outcome=last_outcome,
+        profile=profile,
+        budget=budget,
+    )
+    return _fit_parts(parts, budget)
+
+
 def build_therapy_prompt(
     *,
     context: str,
@@ -73,26 +305,22 @@ def build_therapy_prompt(
     last_outcome: str,
     profile: str = "",
 ) -> str:
-    parts: list[str] = []
-    if context:
-        parts.append(f"Контекст: {context}")
-    if summary:
-        parts.append(f"Краткое резюме: {summary}")
-    if profile:
-        parts.append(f"Профиль: {profile}")
-    if focus and focus != "общее":
-        parts.append(f"Тема: {focus}")
-    if session_goal:
-        parts.append(f"Цель на сегодня: {session_goal}")
-    if last_outcome:
-        parts.append(f"Предыдущий итог: {last_outcome}")
-    history_text = _format_history(history)
-    if history_text:
-        parts.append("Недавний диалог:")
-        parts.append(history_text)
-    parts.append(f"Сообщение пользователя: {user_text}")
-    parts.append("Ответ:")
-    return "\n".join(parts)
+    """The fit_therapy_prompt text; skips token counting when nothing can need trimming."""
+    budget = prompt_token_budget()
+    parts = _prompt_parts(
+        context=context,
+        summary=summary,
+        history=history,
+        user_text=user_text,
+        focus=focus,
+        session_goal=session_goal,
+        last_outcome=last_outcome,
+        profile=profile,
+        budget=budget,
+    )
+    if parts.fits_by_length(budget):
+        return parts.untrimmed_text()
+    return _fit_parts(parts, budget).text
 
 
 def build_summary_prompt(
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+DEFAULT_INTERVAL_SECONDS = 1.2
+DEFAULT_BURST = 3
+DEFAULT_MAX_USERS = 50000
+SWEEP_EVERY_CALLS = 1000
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated_at: float
+    warned: bool = False
+
+
+class RateLimiter:
+    """Per-user token bucket kept in process memory.
+
+    Each user may send `burst` messages at once and then one every
+    `interval_seconds`. A bucket that has refilled completely carries no
+    information, so such buckets are swept out periodically; beyond
+    `max_users` the least recently active ones are dropped as well.
+    """
+
+    def __init__(
+        self,
+        *,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        burst: int = DEFAULT_BURST,
+        max_users: int = DEFAULT_MAX_USERS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._rate = 1.0 / max(interval_seconds, 1e-6)
+        self._burst = float(max(burst, 1))
+        self._max_users = max_users
+        self._clock = clock
+        self._buckets: "OrderedDict[int, _Bucket]" = OrderedDict()
+        self._calls = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _refill(self, bucket: _Bucket, now: float) -> None:
+        bucket.tokens = min(self._burst, bucket.tokens + (now - bucket.updated_at) * self._rate)
+        bucket.updated_at = now
+
+    def sweep(self) -> None:
+        now = self._clock()
+        full_after = self._burst / self._rate
+        idle = [
+            user_id
+            for user_id, bucket in self._buckets.items()
+            if now - bucket.updated_at >= full_after
+        ]
+        for user_id in idle:
+            del self._buckets[user_id]
+
+    def allow(self, user_id: int) -> bool:
+        """Takes a token for the user; False means the message is rejected."""
+        now = self._clock()
+        self._calls += 1
+        if self._calls % SWEEP_EVERY_CALLS == 0:
+            self.sweep()
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = _Bucket(tokens=self._burst, updated_at=now)
+            self._buckets[user_id] = bucket
+            while len(self._buckets) > self._max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+            self._refill(bucket, now)
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            bucket.warned = False
+            return True
+        return False
+
+    def take_warning(self, user_id: int) -> bool:
+        """True once per run of rejected messages, so a flood gets one reply."""
+        bucket = self._buckets.get(user_id)
+        if bucket is None or bucket.warned:
+            return False
+        bucket.warned = True
+        return True
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        raw_interval = os.getenv("RATE_LIMIT_INTERVAL_SECONDS", "").strip()
+        try:
+            interval = float(raw_interval) if raw_interval else DEFAULT_INTERVAL_SECONDS
+        except ValueError:
+            interval = DEFAULT_INTERVAL_SECONDS
+        raw_burst = os.getenv("RATE_LIMIT_BURST", "").strip()
+        burst = int(raw_burst) if raw_burst.isdigit() else DEFAULT_BURST
+        _limiter = RateLimiter(interval_seconds=interval, burst=burst)
+    return _limiter
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import multiprocessing
 import os
 import shutil
-import subprocess
-import wave
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
+
+from services.metrics import span
 
 try:
     from vosk import KaldiRecognizer, Model
@@ -15,7 +21,41 @@ except Exception:  # pragma: no cover - optional dependency
     Model = None  # type: ignore
     KaldiRecognizer = None  # type: ignore
 
+DEFAULT_STT_WORKERS = 2
+QUEUE_SLOTS_PER_WORKER = 4
+DEFAULT_JOB_TIMEOUT_SECONDS = 60
+DEFAULT_MAX_AUDIO_SECONDS = 300
+SAMPLE_RATE = 16000
+PCM_BYTES_PER_SECOND = SAMPLE_RATE * 2
+# 4000 frames of 16-bit mono audio per AcceptWaveform call.
+PCM_CHUNK_BYTES = 8000
+PCM_READ_BYTES = 64 * 1024
+FFMPEG_COMMAND = (
+    "ffmpeg",
+    "-loglevel",
+    "error",
+    "-i",
+    "pipe:0",
+    "-ar",
+    str(SAMPLE_RATE),
+    "-ac",
+    "1",
+    "-f",
+    "s16le",
+    "pipe:1",
+)
+DEFAULT_START_METHOD = "fork"
+
+READINESS_DISABLED = "disabled"
+READINESS_LOADING = "loading"
+READINESS_READY = "ready"
+READINESS_FAILED = "failed"
+
+# Loaded in the parent during warm-up (fork) or inside each pool worker.
 _model: Optional["Model"] = None
+_readiness = READINESS_DISABLED
+_pool: Optional[ProcessPoolExecutor] = None
+_jobs_in_flight = 0
 
 
 def _get_model_path() -> Optional[Path]:
@@ -57,12 +97,92 @@ def stt_status_message() -> tuple[bool, str]:
         else:
             parts.append("VOSK_MODEL_PATH не задан. Пример: /path/to/vosk-model-small-ru-0.22")
 
+    if ok and _readiness == READINESS_LOADING:
+        return True, "Голосовые включены, модель распознавания еще загружается. Попробуйте через минуту."
+    if ok and _readiness == READINESS_FAILED:
+        return False, "Голосовые настроены, но модель распознавания не загрузилась. Проверьте логи."
     if ok:
         return True, "Голосовые включены ✅ Отправьте голосовое, я отвечу."
 
     return False, "Проверка голосовых:\n" + "\n".join(f"- {item}" for item in parts)
 
 
+class SttBusyError(RuntimeError):
+    """Raised when the STT job queue is full."""
+
+
+class SttTooLongError(RuntimeError):
+    """Raised when a voice message decodes to more audio than allowed."""
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw.isdigit() and int(raw) > 0 else default
+
+
+def stt_readiness() -> str:
+    return _readiness
+
+
+def _init_worker(model_path: str) -> None:
+    """Process pool initializer.
+
+    Forked workers inherit the model loaded by the parent during warm-up;
+    any other worker loads its own copy once.
+    """
+    global _model
+    if _model is None:
+        _model = Model(model_path)
+
+
+def _worker_ready() -> bool:
+    return _model is not None
+
+
+def _prefetch_model_files(model_path: Path) -> None:
+    """Asks the kernel to read the model files into the page cache.
+
+    Workers that have to load their own copy then read from memory rather
+    than disk.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for file_path in model_path.rglob("*"):
+        if not file_path.is_file():
+            continue
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def _pool_context() -> Optional[multiprocessing.context.BaseContext]:
+    """Start method for new workers.
+
+    Fork is only used while the process has no other threads, i.e. during
+    warm-up. A pool rebuilt later (after a worker died) starts clean
+    interpreters instead, which load their own model copy.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    method = os.getenv("STT_START_METHOD", DEFAULT_START_METHOD).strip()
+    if method not in methods:
+        return None
+    if method == "fork" and threading.active_count() > 1:
+        method = "forkserver" if "forkserver" in methods else "spawn"
+        logging.warning(
+            "STT workers start with %s: the process already runs %s threads",
+            method,
+            threading.active_count(),
+        )
+    return multiprocessing.get_context(method)
+
+
 def _get_model() -> "Model":
     global _model
     if Model is None:
@@ -75,58 +195,205 @@ def _get_model() -> "Model":
     return _model
 
 
-def _convert_to_wav(input_path: Path, output_path: Path) -> bool:
-    cmd = [
-        "ffmpeg",
-        "-y",
-        "-i",
-        str(input_path),
-        "-ar",
-        "16000",
-        "-ac",
-        "1",
-        "-f",
-        "wav",
-        str(output_path),
-    ]
+def _decode_pcm(pcm: bytes) -> Optional[str]:
+    """Runs inside a pool worker."""
+    model = _get_model()
+    rec = KaldiRecognizer(model, SAMPLE_RATE)
+    rec.SetWords(False)
+    for offset in range(0, len(pcm), PCM_CHUNK_BYTES):
+        rec.AcceptWaveform(pcm[offset : offset + PCM_CHUNK_BYTES])
+    result = rec.FinalResult()
+    payload = json.loads(result or "{}")
+    text = payload.get("text", "")
+    return text.strip() if text else None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        model_path = _get_model_path()
+        if model_path is None:
+            raise RuntimeError("VOSK_MODEL_PATH is not set or invalid")
+        _prefetch_model_files(model_path)
+        _pool = ProcessPoolExecutor(
+            max_workers=_env_int("STT_WORKERS", DEFAULT_STT_WORKERS),
+            mp_context=_pool_context(),
+            initializer=_init_worker,
+            initargs=(str(model_path),),
+        )
+    return _pool
+
+
+async def warm_up_stt() -> bool:
+    """Loads the model and starts the STT workers before the bot goes live.
+
+    With the fork start method the model is loaded once here and the
+    workers inherit it, so its memory is shared copy-on-write instead of
+    being duplicated per process. The load runs on the main thread on
+    purpose: forking after helper threads have started is unsafe.
+    """
+    global _readiness
+    if not stt_is_available():
+        _readiness = READINESS_DISABLED
+        logging.info("STT is not configured, voice messages are disabled")
+        return False
+    _readiness = READINESS_LOADING
+    started = time.monotonic()
+    workers = _env_int("STT_WORKERS", DEFAULT_STT_WORKERS)
     try:
-        subprocess.run(
-            cmd,
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
+        context = _pool_context()
+        if context is not None and context.get_start_method() == "fork":
+            _get_model()
+        pool = _get_pool()
+        loop = asyncio.get_running_loop()
+        ready = await asyncio.gather(
+            *(loop.run_in_executor(pool, _worker_ready) for _ in range(workers))
         )
-        return True
     except Exception:
-        logging.exception("FFmpeg conversion failed")
+        _readiness = READINESS_FAILED
+        logging.exception("STT warm-up failed")
+        return False
+    if not all(ready):
+        _readiness = READINESS_FAILED
+        logging.error("STT workers started without a model")
         return False
+    _readiness = READINESS_READY
+    logging.info(
+        "STT ready in %.1fs with %s workers", time.monotonic() - started, workers
+    )
+    return True
 
 
-async def transcribe_audio(path: Path, *, language: Optional[str] = "ru") -> Optional[str]:
-    if not stt_is_available():
-        return None
-    wav_path = path.with_suffix(".wav")
-    if not _convert_to_wav(path, wav_path):
-        return None
+def shutdown_stt_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _max_queued_jobs() -> int:
+    workers = _env_int("STT_WORKERS", DEFAULT_STT_WORKERS)
+    return _env_int("STT_MAX_QUEUE", workers * QUEUE_SLOTS_PER_WORKER)
+
+
+def max_audio_seconds() -> int:
+    return _env_int("STT_MAX_AUDIO_SECONDS", DEFAULT_MAX_AUDIO_SECONDS)
+
+
+def _release_slot(_: object = None) -> None:
+    global _jobs_in_flight
+    _jobs_in_flight -= 1
+
+
+async def _decode_to_pcm(chunks: AsyncIterator[bytes]) -> Optional[bytes]:
+    """Pipes encoded audio through ffmpeg as it arrives.
+
+    Returns raw 16 kHz mono s16le PCM read from ffmpeg's stdout, so neither
+    the download nor the decoded audio touches the disk. Raises
+    SttTooLongError, after killing ffmpeg, once the PCM grows past
+    max_audio_seconds().
+    """
+    max_bytes = max_audio_seconds() * PCM_BYTES_PER_SECOND
     try:
-        model = _get_model()
-        with wave.open(str(wav_path), "rb") as wf:
-            rec = KaldiRecognizer(model, wf.getframerate())
-            rec.SetWords(False)
-            while True:
-                data = wf.readframes(4000)
-                if not data:
-                    break
-                rec.AcceptWaveform(data)
-            result = rec.FinalResult()
-        payload = json.loads(result or "{}")
-        text = payload.get("text", "")
-        return text.strip() if text else None
+        proc = await asyncio.create_subprocess_exec(
+            *FFMPEG_COMMAND,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
     except Exception:
-        logging.exception("Vosk transcription failed")
+        logging.exception("FFmpeg could not be started")
         return None
-    finally:
+    assert proc.stdin is not None and proc.stdout is not None
+
+    async def feed() -> None:
         try:
-            wav_path.unlink()
-        except OSError:
+            async for chunk in chunks:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg exited early; its return code tells what happened.
             pass
+        finally:
+            proc.stdin.close()
+
+    async def read() -> bytes:
+        pcm = bytearray()
+        while True:
+            block = await proc.stdout.read(PCM_READ_BYTES)
+            if not block:
+                return bytes(pcm)
+            pcm += block
+            if len(pcm) > max_bytes:
+                raise SttTooLongError(f"Voice message is longer than {max_audio_seconds()}s")
+
+    feeder = asyncio.ensure_future(feed())
+    try:
+        pcm = await read()
+        await feeder
+        returncode = await proc.wait()
+    except BaseException:
+        feeder.cancel()
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        await asyncio.gather(feeder, return_exceptions=True)
+        raise
+    if returncode != 0:
+        logging.error("FFmpeg decoding failed with code %s", returncode)
+        return None
+    return pcm
+
+
+async def transcribe_stream(chunks: AsyncIterator[bytes]) -> Optional[str]:
+    """Transcribes streamed voice audio in the STT process pool.
+
+    Raises SttBusyError when the queue is full, so the caller can ask the
+    user to retry instead of piling up work, and SttTooLongError for audio
+    longer than max_audio_seconds(). A job that runs past the
+    timeout is abandoned (None is returned) but keeps its queue slot until
+    the worker actually finishes it.
+    """
+    global _jobs_in_flight
+    if not stt_is_available():
+        return None
+    if _jobs_in_flight >= _max_queued_jobs():
+        raise SttBusyError("STT queue is full")
+    _jobs_in_flight += 1
+    slot_handed_off = False
+    timeout = _env_int("STT_JOB_TIMEOUT_SECONDS", DEFAULT_JOB_TIMEOUT_SECONDS)
+    try:
+        try:
+            with span("stt.decode"):
+                pcm = await asyncio.wait_for(_decode_to_pcm(chunks), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error("Voice download/decoding timed out after %ss", timeout)
+            return None
+        except SttTooLongError:
+            raise
+        except Exception:
+            logging.exception("Voice download/decoding failed")
+            return None
+        if not pcm:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_get_pool(), _decode_pcm, pcm)
+        future.add_done_callback(_release_slot)
+        slot_handed_off = True
+        try:
+            with span("stt.recognize"):
+                return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.error("Vosk transcription timed out after %ss", timeout)
+            return None
+        except BrokenProcessPool:
+            # The next job builds a new pool; see _pool_context for how.
+            logging.exception("STT worker died, restarting the pool")
+            shutdown_stt_pool()
+            return None
+        except Exception:
+            logging.exception("Vosk transcription failed")
+            return None
+    finally:
+        if not slot_handed_off:
+            _release_slot()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Set
+
+DEFAULT_WORKERS = 2
+DATA_DIR_NAME = "data"
+QUEUE_FILE_NAME = "summary_queue.json"
+
+SummaryJob = Callable[[int], Awaitable[None]]
+
+
+class SummaryQueue:
+    """Users waiting for a summary refresh, drained by a small worker pool.
+
+    A user is queued at most once, and never summarized by two workers at
+    the same time: a user re-queued while a job is running is picked up again
+    once it finishes. Queued and running ids are saved to a JSON file after
+    changes (one write per burst, off the event loop), so jobs interrupted by
+    a restart run again on startup.
+    """
+
+    def __init__(self, path: Optional[Path] = None, *, workers: int = DEFAULT_WORKERS) -> None:
+        self._path = path
+        self._worker_count = max(workers, 1)
+        self._queue: "asyncio.Queue[int]" = asyncio.Queue()
+        self._queued: Set[int] = set()
+        self._running: Set[int] = set()
+        self._job: Optional[SummaryJob] = None
+        self._workers: List[asyncio.Task] = []
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._queued) + len(self._running)
+
+    def is_pending(self, user_id: int) -> bool:
+        return user_id in self._queued or user_id in self._running
+
+    def enqueue(self, user_id: int) -> None:
+        if user_id in self._queued:
+            return
+        self._queued.add(user_id)
+        if user_id not in self._running:
+            self._queue.put_nowait(user_id)
+        self._save()
+
+    def discard(self, user_id: int) -> None:
+        """Drops a queued job, e.g. after the user's data was deleted.
+
+        A job that is already running is left to finish.
+        """
+        if user_id not in self._queued:
+            return
+        self._queued.discard(user_id)
+        self._save()
+
+    def _load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            with self._path.open("r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not read %s", self._path)
+            return
+        if not isinstance(raw, list):
+            return
+        for user_id in raw:
+            if isinstance(user_id, int):
+                self.enqueue(user_id)
+
+    def _write_file(self, user_ids: List[int]) -> None:
+        assert self._path is not None
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fh:
+            json.dump(user_ids, fh)
+        os.replace(tmp_path, self._path)
+
+    def _snapshot(self) -> List[int]:
+        return sorted(self._queued | self._running)
+
+    def _save(self) -> None:
+        """Schedules a write; changes made meanwhile join the next one."""
+        if self._path is None:
+            return
+        self._dirty = True
+        if self._save_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._dirty = False
+            self._write_file(self._snapshot())
+            return
+        self._save_task = loop.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self._dirty:
+                self._dirty = False
+                await loop.run_in_executor(None, self._write_file, self._snapshot())
+        except Exception:
+            logging.exception("Could not save the summary queue")
+        finally:
+            self._save_task = None
+
+    async def _run_one(self, user_id: int) -> None:
+        assert self._job is not None
+        self._queued.discard(user_id)
+        self._running.add(user_id)
+        try:
+            await self._job(user_id)
+        except asyncio.CancelledError:
+            # Shutting down: keep the job for the next start.
+            self._queued.add(user_id)
+            raise
+        except Exception:
+            logging.exception("Summary job for user %s failed", user_id)
+        finally:
+            self._running.discard(user_id)
+        if user_id in self._queued:
+            # Re-queued while the job was running.
+            self._queue.put_nowait(user_id)
+        self._save()
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            try:
+                if user_id not in self._queued:
+                    continue  # discarded while waiting
+                await self._run_one(user_id)
+            finally:
+                self._queue.task_done()
+
+    async def join(self) -> None:
+        """Waits until the queue is drained (used by tests and shutdown)."""
+        await self._queue.join()
+
+    async def start(self, job: SummaryJob) -> None:
+        self._job = job
+        self._load()
+        while len(self._workers) < self._worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._save()
+        if self._save_task is not None:
+            await self._save_task
+
+
+_queue: Optional[SummaryQueue] = None
+
+
+def get_summary_queue() -> SummaryQueue:
+    global _queue
+    if _queue is None:
+        raw_workers = os.getenv("SUMMARY_WORKERS", "").strip()
+        workers = int(raw_workers) if raw_workers.isdigit() else DEFAULT_WORKERS
+        root_dir = Path(__file__).resolve().parents[2]
+        _queue = SummaryQueue(root_dir / DATA_DIR_NAME / QUEUE_FILE_NAME, workers=workers)
+    return _queue
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import random
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from services.llm import generate_text
+from services.llm_scheduler import Priority
+from services.prompts import SUPPORT_SYSTEM_PROMPT, build_support_prompt
+
+SUPPORT_KIND_TEMPERATURES = {
+    "breath": 0.7,
+    "ground": 0.7,
+    "compassion": 0.9,
+}
+SUPPORT_MAX_COMPLETION_TOKENS = 180
+POOL_TARGET_SIZE = 8
+POOL_MAX_SIZE = 24
+MAX_TRACKED_USERS = 5000
+DATA_DIR_NAME = "data"
+POOL_FILE_NAME = "support_pool.json"
+
+# Served only until the first generated texts arrive.
+FALLBACK_TEXTS = {
+    "breath": (
+        "Давайте немного подышим: вдох на 4 счета, выдох на 6. "
+        "Повторите 6-8 циклов, не торопясь. Если внимание уходит, "
+        "мягко возвращайте его к счету."
+    ),
+    "ground": (
+        "Попробуйте упражнение 5-4-3-2-1: назовите 5 вещей, которые видите, "
+        "4 — которые слышите, 3 — которые ощущаете телом, 2 запаха и 1 вкус. "
+        "Это помогает вернуться в настоящий момент."
+    ),
+    "compassion": (
+        "Вам сейчас непросто, и это нормально — так чувствовать. "
+        "Вы делаете то, что можете, и этого достаточно на сегодня."
+    ),
+}
+
+
+class SupportPool:
+    """Pre-generated support snippets, served without calling the LLM.
+
+    Each kind keeps a rolling pool of texts; every user walks through texts
+    they have not seen yet. The pool is topped up in the background when it
+    runs low or a user has seen everything, and persisted so a restart does
+    not start from an empty pool.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        *,
+        target_size: int = POOL_TARGET_SIZE,
+        max_size: int = POOL_MAX_SIZE,
+    ) -> None:
+        self._path = path
+        self._target_size = target_size
+        self._pools: Dict[str, Deque[str]] = {
+            kind: deque(maxlen=max_size) for kind in SUPPORT_KIND_TEMPERATURES
+        }
+        self._seen: "OrderedDict[Tuple[int, str], Set[str]]" = OrderedDict()
+        self._refilling: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._save_lock = asyncio.Lock()
+
+    def size(self, kind: str) -> int:
+        return len(self._pools.get(kind, ()))
+
+    def _seen_for(self, user_id: int, kind: str) -> Set[str]:
+        key = (user_id, kind)
+        seen = self._seen.get(key)
+        if seen is None:
+            seen = set()
+            self._seen[key] = seen
+            while len(self._seen) > MAX_TRACKED_USERS:
+                self._seen.popitem(last=False)
+        else:
+            self._seen.move_to_end(key)
+        return seen
+
+    def take(self, kind: str, user_id: int) -> str:
+        pool = self._pools.get(kind)
+        if not pool:
+            self.request_refill(kind)
+            return FALLBACK_TEXTS.get(kind, FALLBACK_TEXTS["compassion"])
+        seen = self._seen_for(user_id, kind)
+        unseen = [text for text in pool if text not in seen]
+        if not unseen:
+            # The user has seen every text: start over and ask for fresh ones.
+            seen.clear()
+            unseen = list(pool)
+            self.request_refill(kind)
+        text = random.choice(unseen)
+        seen.add(text)
+        if len(pool) < self._target_size:
+            self.request_refill(kind)
+        return text
+
+    def add(self, kind: str, text: str) -> None:
+        pool = self._pools[kind]
+        if text and text not in pool:
+            pool.append(text)
+
+    async def _generate(self, kind: str) -> Optional[str]:
+        return await generate_text(
+            prompt=build_support_prompt(kind),
+            system_prompt=SUPPORT_SYSTEM_PROMPT,
+            temperature=SUPPORT_KIND_TEMPERATURES[kind],
+            max_completion_tokens=SUPPORT_MAX_COMPLETION_TOKENS,
+            fallback=None,
+            priority=Priority.BACKGROUND,
+        )
+
+    async def refill(self, kind: str, count: Optional[int] = None) -> None:
+        if count is None:
+            count = max(self._target_size - self.size(kind), self._target_size // 2, 1)
+        for _ in range(count):
+            text = await self._generate(kind)
+            if text:
+                self.add(kind, text)
+        await self._save()
+
+    def request_refill(self, kind: str) -> None:
+        if kind not in self._pools or kind in self._refilling:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._refilling.add(kind)
+        task = loop.create_task(self.refill(kind))
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._on_refill_done(kind, done))
+
+    def _on_refill_done(self, kind: str, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._refilling.discard(kind)
+        if not task.cancelled() and task.exception() is not None:
+            logging.getLogger(__name__).error(
+                "Support pool refill for %s failed: %s", kind, task.exception()
+            )
+
+    def warm_up(self) -> None:
+        """Schedules background generation for every kind below target."""
+        for kind in self._pools:
+            if self.size(kind) < self._target_size:
+                self.request_refill(kind)
+
+    def load(self) -> None:
+        if self._path is None or not self._path.exists():
+            return
+        try:
+            with self._path.open("r", encoding="utf-8") as fh:
+                raw = json.load(fh)
+        except Exception:
+            logging.getLogger(__name__).warning("Could not read %s", self._path)
+            return
+        if not isinstance(raw, dict):
+            return
+        for kind, texts in raw.items():
+            if kind in self._pools and isinstance(texts, list):
+                for text in texts:
+                    if isinstance(text, str):
+                        self.add(kind, text)
+
+    def _write_file(self, data: Dict[str, List[str]]) -> None:
+        assert self._path is not None
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        os.replace(tmp_path, self._path)
+
+    async def _save(self) -> None:
+        """Snapshots the pools on the loop and writes them on a thread."""
+        if self._path is None:
+            return
+        data: Dict[str, List[str]] = {kind: list(pool) for kind, pool in self._pools.items()}
+        loop = asyncio.get_running_loop()
+        # Refills of different kinds share one temp file.
+        async with self._save_lock:
+            await loop.run_in_executor(None, self._write_file, data)
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_pool: Optional[SupportPool] = None
+
+
+def get_support_pool() -> SupportPool:
+    global _pool
+    if _pool is None:
+        root_dir = Path(__file__).resolve().parents[2]
+        _pool = SupportPool(root_dir / DATA_DIR_NAME / POOL_FILE_NAME)
+        _pool.load()
+    return _pool
@@ -0,0 +1,55 @@
+import re
+from functools import lru_cache
+from typing import Tuple
+
+# Rough characters-per-token ratios for Llama-family BPE vocabularies:
+# Latin words split into fewer pieces than Cyrillic ones.
+LATIN_CHARS_PER_TOKEN = 4
+OTHER_CHARS_PER_TOKEN = 3
+TRUNCATION_MARK = "..."
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=8192)
+def _word_tokens(word: str) -> int:
+    ratio = LATIN_CHARS_PER_TOKEN if word.isascii() else OTHER_CHARS_PER_TOKEN
+    return max(1, -(-len(word) // ratio))
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of how many tokens the model will count.
+
+    Words are split into chunks of a few characters and every punctuation
+    mark counts as one token; this slightly overestimates real tokenizers,
+    which is the safe side for a budget.
+    """
+    return sum(_word_tokens(piece) for piece in _PIECE_RE.findall(text))
+
+
+TRUNCATION_MARK_TOKENS = estimate_tokens(TRUNCATION_MARK)
+
+
+def fit_to_tokens(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Cuts `text` at a word boundary to fit `max_tokens`; returns it and its tokens.
+
+    One pass over the words, stopping as soon as the budget is exceeded.
+    """
+    limit = max_tokens - TRUNCATION_MARK_TOKENS
+    used = 0
+    cut_at = cut_used = -1
+    for match in _PIECE_RE.finditer(text):
+        tokens = _word_tokens(match.group())
+        if cut_at < 0 and used + tokens > limit:
+            cut_at, cut_used = match.start(), used
+        used += tokens
+        if used > max_tokens:
+            if limit <= 0:
+                return "", 0
+            return text[:cut_at].rstrip() + TRUNCATION_MARK, cut_used + TRUNCATION_MARK_TOKENS
+    return text, used
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` at a word boundary so it fits into `max_tokens`."""
+    return fit_to_tokens(text, max_tokens)[0]
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_DISK_ENTRIES = 20000
+DATA_DIR_NAME = "data"
+DB_FILE_NAME = "transcripts.sqlite3"
+
+Key = Tuple[str, int]
+
+
+class TranscriptCache:
+    """Voice transcripts keyed by Telegram `file_unique_id` and duration.
+
+    An in-memory LRU sits in front of an optional SQLite table, so forwarded
+    or re-sent voice notes are answered without downloading or decoding them
+    again. Only the transcript is stored, never who sent it. SQLite work runs
+    on one helper thread, in submission order, off the event loop.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[Path] = None,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_disk_entries: int = DEFAULT_MAX_DISK_ENTRIES,
+    ) -> None:
+        self._max_entries = max_entries
+        self._max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[Key, str]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._io: Optional[ThreadPoolExecutor] = None
+        if db_path is not None:
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcripts")
+            self._io.submit(self._open_db, db_path)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- SQLite work, run on the helper thread ---
+
+    def _open_db(self, db_path: Path) -> None:
+        try:
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                "file_unique_id TEXT NOT NULL, "
+                "duration INTEGER NOT NULL, "
+                "text TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "PRIMARY KEY (file_unique_id, duration))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS transcripts_created_at ON transcripts (created_at)"
+            )
+            self._db.commit()
+        except sqlite3.Error:
+            logging.exception("Transcript cache database is unavailable, using memory only")
+            self._db = None
+
+    def _load(self, key: Key) -> Optional[str]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT text FROM transcripts WHERE file_unique_id = ? AND duration = ?",
+                key,
+            ).fetchone()
+        except sqlite3.Error:
+            logging.exception("Transcript cache lookup failed")
+            return None
+        return None if row is None else row[0]
+
+    def _store(self, key: Key, text: str) -> None:
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?)",
+                (key[0], key[1], text, time.time()),
+            )
+            self._db.execute(
+                "DELETE FROM transcripts WHERE rowid IN ("
+                "SELECT rowid FROM transcripts ORDER BY created_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self._max_disk_entries,),
+            )
+            self._db.commit()
+        except sqlite3.Error:
+            logging.exception("Transcript cache write failed")
+
+    def _close_db(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    # --- event loop side ---
+
+    def _remember(self, key: Key, text: str) -> None:
+        self._entries[key] = text
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, file_unique_id: str, duration: int) -> Optional[str]:
+        key = (file_unique_id, duration)
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            return text
+        if self._io is None:
+            return None
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self._io, self._load, key)
+        if text is not None:
+            self._remember(key, text)
+        return text
+
+    def put(self, file_unique_id: str, duration: int, text: str) -> None:
+        """Caches in memory at once; the disk write is queued."""
+        key = (file_unique_id, duration)
+        self._remember(key, text)
+        if self._io is not None:
+            self._io.submit(self._store, key, text)
+
+    def close(self) -> None:
+        """Finishes queued writes and closes the database."""
+        if self._io is not None:
+            self._io.submit(self._close_db)
+            self._io.shutdown(wait=True)
+            self._io = None
+
+
+_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _cache
+    if _cache is None:
+        db_path: Optional[Path] = None
+        if os.getenv("TRANSCRIPT_CACHE_PERSIST", "").strip() == "1":
+            root_dir = Path(__file__).resolve().parents[2]
+            db_path = root_dir / DATA_DIR_NAME / DB_FILE_NAME
+        raw_size = os.getenv("TRANSCRIPT_CACHE_SIZE", "").strip()
+        max_entries = int(raw_size) if raw_size.isdigit() else DEFAULT_MAX_ENTRIES
+        _cache = TranscriptCache(db_path, max_entries=max_entries)
+    return _cache
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import copy
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+DEFAULT_TTL_SECONDS = 60.0
+DEFAULT_MAX_ENTRIES = 5000
+
+T = TypeVar("T")
+
+
+class UserCache(Generic[T]):
+    """TTL-bounded LRU of user rows keyed by Telegram id.
+
+    Reads hand out shallow copies so a handler can tweak its snapshot without
+    leaking changes to other tasks; writes go through `update` so the cached
+    row always mirrors what was last sent to the database.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, T]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _live(self, user_id: int) -> Optional[T]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self._clock() - stored_at > self._ttl:
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return value
+
+    def get(self, user_id: int) -> Optional[T]:
+        value = self._live(user_id)
+        return copy.copy(value) if value is not None else None
+
+    def put(self, user_id: int, value: T) -> None:
+        self._entries[user_id] = (self._clock(), copy.copy(value))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def update(self, user_id: int, fields: Dict[str, Any]) -> None:
+        """Applies written fields to the cached row, if there is one."""
+        value = self._live(user_id)
+        if value is None:
+            return
+        for key, field_value in fields.items():
+            setattr(value, key, field_value)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    global _cache
+    if _cache is None:
+        raw_ttl = os.getenv("USER_CACHE_TTL_SECONDS", "").strip()
+        try:
+            ttl = float(raw_ttl) if raw_ttl else DEFAULT_TTL_SECONDS
+        except ValueError:
+            ttl = DEFAULT_TTL_SECONDS
+        _cache = UserCache(ttl_seconds=ttl)
+    return _cache
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional
+
+
+@dataclass
+class _Entry:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+class UserLocks:
+    """One FIFO lock per Telegram user, created on demand.
+
+    Updates of the same user run one at a time in arrival order, while
+    different users never wait on each other. An entry lives only while
+    someone holds or waits for it, so memory follows the number of active
+    users rather than everyone ever seen.
+    """
+
+    def __init__(self) -> None:
+        self._entries: Dict[int, _Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def is_busy(self, user_id: int) -> bool:
+        entry = self._entries.get(user_id)
+        return entry is not None and entry.lock.locked()
+
+    @asynccontextmanager
+    async def hold(self, user_id: int) -> AsyncIterator[None]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            entry = _Entry()
+            self._entries[user_id] = entry
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._entries.pop(user_id, None)
+
+
+_locks: Optional[UserLocks] = None
+
+
+def get_user_locks() -> UserLocks:
+    global _locks
+    if _locks is None:
+        _locks = UserLocks()
+    return _locks
@@ -1,12 +1,43 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Dict, Any
 
 from postgrest import APIResponse
-from services.db import get_db_client, disable_db
+from services.db import get_db_client, disable_db, run_db
 from services.datetime_utils import parse_db_datetime
+from services.message_journal import get_message_journal
+from services.metrics import timed
+from services.summary_queue import get_summary_queue
+from services.user_cache import get_user_cache
+
+_DATETIME_FIELDS = (
+    "created_at",
+    "last_distress_at",
+    "last_support_offer_at",
+    "last_checkin_prompt_at",
+    "last_message_at",
+    "last_summary_at",
+)
+
+ACTIVITY_FLUSH_SECONDS = 10.0
+
+# last_message_at values not yet written to the database.
+_pending_activity: Dict[int, datetime] = {}
+_activity_task: Optional[asyncio.Task] = None
+
+AWAITING_FIELDS = (
+    "awaiting_checkin",
+    "awaiting_goal",
+    "awaiting_outcome",
+    "awaiting_gender",
+    "awaiting_name",
+    "awaiting_age",
+    "awaiting_about",
+)
 
 
 @dataclass
@@ -40,14 +71,7 @@ class User:
     @staticmethod
     def from_db(data: Dict[str, Any]) -> "User":
         """Maps a dictionary from the database to a User dataclass instance."""
-        for key in [
-            "created_at",
-            "last_distress_at",
-            "last_support_offer_at",
-            "last_checkin_prompt_at",
-            "last_message_at",
-            "last_summary_at",
-        ]:
+        for key in _DATETIME_FIELDS:
             if data.get(key):
                 data[key] = parse_db_datetime(data[key])
         return User(**data)
@@ -58,17 +82,26 @@ def _log_db_error(message: str, exc: Exception) -> None:
     disable_db(exc)
 
 
-def get_or_create_user(user_id: int, username: Optional[str] = None) -> User:
+def _cache_write(user_id: int, fields: Dict[str, Any]) -> None:
+    """Mirrors a successful users UPDATE into the cached row."""
+    parsed = {
+        key: parse_db_datetime(value) if key in _DATETIME_FIELDS and value else value
+        for key, value in fields.items()
+    }
+    get_user_cache().update(user_id, parsed)
+
+
+async def _select_user(user_id: int) -> Optional[Dict[str, Any]]:
     client = get_db_client()
 
     # 1. Пытаемся найти пользователя (безопасно)
     try:
-        response = (
+        response = await run_db(
             client.table("users")
             .select("*")
             .eq("id", user_id)
             .limit(1)
-            .execute()
+            .execute
         )
     except Exception as e:
         _log_db_error("Ошибка при запросе к БД", e)
@@ -80,6 +113,33 @@ def get_or_create_user(user_id: int, username: Optional[str] = None) -> User:
     user_data = getattr(response, "data", None)
     if isinstance(user_data, list):
         user_data = user_data[0] if user_data else None
+    if not user_data or "created_at" not in user_data:
+        return None
+    return user_data
+
+
+@timed("db.get_user")
+async def get_user(user_id: int) -> Optional[User]:
+    """Returns the user row, or None if it does not exist; never creates it."""
+    cached = get_user_cache().get(user_id)
+    if cached is not None:
+        return cached
+    user_data = await _select_user(user_id)
+    if user_data is None:
+        return None
+    user = User.from_db(user_data)
+    get_user_cache().put(user_id, user)
+    return user
+
+
+@timed("db.get_user")
+async def get_or_create_user(user_id: int, username: Optional[str] = None) -> User:
+    cached = get_user_cache().get(user_id)
+    if cached is not None:
+        return cached
+
+    client = get_db_client()
+    user_data = await _select_user(user_id)
 
     # 3. Если пользователя нет — создаем его
     if not user_data or "created_at" not in user_data:
@@ -93,7 +153,7 @@ def get_or_create_user(user_id: int, username: Optional[str] = None) -> User:
                 insert_builder = insert_builder.select("*")
             except AttributeError:
                 pass
-            insert_response = insert_builder.execute()
+            insert_response = await run_db(insert_builder.execute)
             user_data = getattr(insert_response, "data", None)
             if isinstance(user_data, list):
                 user_data = user_data[0] if user_data else None
@@ -103,95 +163,208 @@ def get_or_create_user(user_id: int, username: Optional[str] = None) -> User:
 
         if not user_data or "created_at" not in user_data:
             raise RuntimeError("Supabase insert did not return user data")
-        return User.from_db(user_data)
 
-    # 4. Если пользователь есть — возвращаем его
-    return User.from_db(user_data)
+    # 4. Кэшируем и возвращаем пользователя
+    user = User.from_db(user_data)
+    get_user_cache().put(user_id, user)
+    return user
 
 
-async def touch_user(user_id: int) -> Optional[APIResponse]:
-    """Updates the last_message_at timestamp for a user."""
+def mark_active(user_id: int) -> None:
+    """Records that the user just wrote; persisted later by flush_activity."""
+    now = datetime.now(timezone.utc)
+    _pending_activity[user_id] = now
+    _cache_write(user_id, {"last_message_at": now.isoformat()})
+
+
+async def flush_activity() -> None:
+    """Writes each pending user's last_message_at in one bulk update.
+
+    Every row carries that user's own timestamp. The RPC only updates
+    existing rows, so a user deleted by /reset while the batch is in flight
+    is not created again. Failed batches are kept for the next flush.
+    """
+    if not _pending_activity:
+        return
+    batch = dict(_pending_activity)
+    _pending_activity.clear()
+    params = {
+        "user_ids_param": list(batch),
+        "seen_at_param": [seen_at.isoformat() for seen_at in batch.values()],
+    }
     client = get_db_client()
     try:
-        return client.table("users").update(
-            {"last_message_at": datetime.now(timezone.utc).isoformat()}
-        ).eq("id", user_id).execute()
-    except Exception as e:
-        _log_db_error("Ошибка при обновлении пользователя", e)
+        await run_db(client.rpc("touch_users_activity", params).execute)
+    except Exception:
+        for user_id, seen_at in batch.items():
+            _pending_activity.setdefault(user_id, seen_at)
         raise
 
 
-def is_rate_limited(user: User, min_interval_seconds: float) -> bool:
-    if not user.last_message_at:
-        return False
-    return (datetime.now(timezone.utc) - user.last_message_at) < timedelta(seconds=min_interval_seconds)
+async def _run_activity_flusher() -> None:
+    while True:
+        await asyncio.sleep(ACTIVITY_FLUSH_SECONDS)
+        try:
+            await flush_activity()
+        except Exception:
+            logging.exception(
+                "Activity flush failed, %s users pending", len(_pending_activity)
+            )
+
+
+async def start_activity_flusher() -> None:
+    global _activity_task
+    if _activity_task is None:
+        _activity_task = asyncio.create_task(_run_activity_flusher())
+
+
+async def stop_activity_flusher() -> None:
+    global _activity_task
+    if _activity_task is not None:
+        _activity_task.cancel()
+        try:
+            await _activity_task
+        except asyncio.CancelledError:
+            pass
+        _activity_task = None
+    try:
+        await flush_activity()
+    except Exception:
+        logging.exception("Final activity flush failed")
 
 
-def update_user_focus(user_id: int, new_focus: str) -> Optional[APIResponse]:
+async def update_user_focus(user_id: int, new_focus: str) -> Optional[APIResponse]:
     """Updates the focus for a specific user."""
     client = get_db_client()
+    payload = {"focus": new_focus}
     try:
-        return client.table("users").update({"focus": new_focus}).eq("id", user_id).execute()
+        response = await run_db(client.table("users").update(payload).eq("id", user_id).execute)
     except Exception as e:
+        get_user_cache().invalidate(user_id)
         _log_db_error("Ошибка при обновлении темы", e)
         raise
+    _cache_write(user_id, payload)
+    return response
 
 
-async def update_user_summary(user_id: int, summary: str) -> Optional[APIResponse]:
-    """Updates the user's summary, resets the message counter, and updates the timestamp."""
+async def update_user_summary(
+    user_id: int, summary: str, messages_since_summary: int = 0
+) -> Optional[APIResponse]:
+    """Updates the user's summary, sets the message counter, and updates the timestamp."""
     client = get_db_client()
+    payload = {
+        "summary": summary,
+        "messages_since_summary": messages_since_summary,
+        "last_summary_at": datetime.now(timezone.utc).isoformat(),
+    }
     try:
-        return client.table("users").update(
-            {
-                "summary": summary,
-                "messages_since_summary": 0,
-                "last_summary_at": datetime.now(timezone.utc).isoformat(),
-            }
-        ).eq("id", user_id).execute()
+        response = await run_db(client.table("users").update(payload).eq("id", user_id).execute)
     except Exception as e:
+        get_user_cache().invalidate(user_id)
         _log_db_error("Ошибка при обновлении резюме", e)
         raise
+    _cache_write(user_id, payload)
+    return response
 
 
 async def increment_user_message_counter(user_id: int) -> Optional[APIResponse]:
     """Increments the messages_since_summary counter for a user via RPC."""
     client = get_db_client()
     try:
-        return client.rpc("increment_messages_counter", {"user_id_param": user_id}).execute()
+        response = await run_db(
+            client.rpc("increment_messages_counter", {"user_id_param": user_id}).execute
+        )
     except Exception as e:
+        get_user_cache().invalidate(user_id)
         _log_db_error("Ошибка при инкременте счетчика сообщений", e)
         raise
+    cached = get_user_cache().get(user_id)
+    if cached is not None:
+        _cache_write(user_id, {"messages_since_summary": cached.messages_since_summary + 1})
+    return response
 
 
 async def set_user_awaiting(user_id: int, field: str, value: bool) -> Optional[APIResponse]:
     """Sets a boolean 'awaiting' field for a user."""
     client = get_db_client()
     try:
-        return client.table("users").update({field: value}).eq("id", user_id).execute()
+        response = await run_db(client.table("users").update({field: value}).eq("id", user_id).execute)
     except Exception as e:
+        get_user_cache().invalidate(user_id)
         _log_db_error("Ошибка при обновлении статуса ожидания", e)
         raise
+    _cache_write(user_id, {field: value})
+    return response
 
 
-async def set_user_text_field(user_id: int, field: str, value: Any) -> Optional[APIResponse]:
-    """Sets a field value for a user."""
+async def update_user_fields(user_id: int, fields: Dict[str, Any]) -> Optional[APIResponse]:
+    """Writes several user fields in a single UPDATE."""
+    if not fields:
+        return None
     client = get_db_client()
     try:
-        return client.table("users").update({field: value}).eq("id", user_id).execute()
+        response = await run_db(client.table("users").update(fields).eq("id", user_id).execute)
     except Exception as e:
-        _log_db_error("Ошибка при обновлении текстового поля", e)
+        get_user_cache().invalidate(user_id)
+        _log_db_error("Ошибка при обновлении пользователя", e)
         raise
+    _cache_write(user_id, fields)
+    return response
+
+
+class UserPatch:
+    """Collects user field changes during one handler and flushes them at once.
+
+    Used as an async context manager; the accumulated fields are written in a
+    single UPDATE on a clean exit and discarded if the block raises.
+    """
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self._fields: Dict[str, Any] = {}
+
+    def set(self, field: str, value: Any) -> "UserPatch":
+        self._fields[field] = value
+        return self
+
+    def set_awaiting(self, field: str, value: bool) -> "UserPatch":
+        return self.set(field, value)
+
+    def clear_awaiting(self) -> "UserPatch":
+        for field in AWAITING_FIELDS:
+            self._fields[field] = False
+        return self
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        return dict(self._fields)
+
+    async def flush(self) -> Optional[APIResponse]:
+        fields, self._fields = self._fields, {}
+        return await update_user_fields(self.user_id, fields)
+
+    async def __aenter__(self) -> "UserPatch":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.flush()
 
 
-def delete_user_data(user_id: int) -> None:
+async def delete_user_data(user_id: int) -> None:
     """Deletes all data associated with a user."""
     client = get_db_client()
     # This will cascade and delete messages as well
+    get_message_journal().discard_user(user_id)
+    get_summary_queue().discard(user_id)
+    _pending_activity.pop(user_id, None)
     try:
-        client.table("users").delete().eq("id", user_id).execute()
+        await run_db(client.table("users").delete().eq("id", user_id).execute)
     except Exception as e:
         _log_db_error("Ошибка при удалении данных пользователя", e)
         raise
+    finally:
+        get_user_cache().invalidate(user_id)
 
 
 async def update_distress(user_id: int, user: User, is_distress: bool) -> bool:
@@ -202,10 +375,14 @@ async def update_distress(user_id: int, user: User, is_distress: bool) -> bool:
     if not is_distress:
         if user.last_distress_at and (now - user.last_distress_at) > timedelta(hours=12):
             try:
-                client.table("users").update({"distress_streak": 0}).eq("id", user_id).execute()
+                await run_db(
+                    client.table("users").update({"distress_streak": 0}).eq("id", user_id).execute
+                )
             except Exception as e:
+                get_user_cache().invalidate(user_id)
                 _log_db_error("Ошибка при обновлении стресса", e)
                 raise
+            _cache_write(user_id, {"distress_streak": 0})
         return False
 
     new_streak = user.distress_streak + 1
@@ -225,8 +402,10 @@ async def update_distress(user_id: int, user: User, is_distress: bool) -> bool:
         update_payload["last_support_offer_at"] = now.isoformat()
         
     try:
-        client.table("users").update(update_payload).eq("id", user_id).execute()
-        return should_offer
+        await run_db(client.table("users").update(update_payload).eq("id", user_id).execute)
     except Exception as e:
+        get_user_cache().invalidate(user_id)
         _log_db_error("Ошибка при обновлении стресса", e)
         raise
+    _cache_write(user_id, update_payload)
+    return should_offer
@@ -1,20 +1,203 @@
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
 from pathlib import Path
+from typing import List, Optional
+
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 14
+DEFAULT_QUEUE_SIZE = 10000
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message and exc if any."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """Rotates when the file passes `max_bytes` or a new local day starts.
+
+    Archives are gzipped next to the log as `<name>.<YYYYMMDD-HHMMSS>.gz`
+    and only the newest `backup_count` are kept. Rotation and compression
+    run wherever `emit` runs, which with `setup_logging` is the listener
+    thread rather than the event loop.
+    """
+
+    def __init__(
+        self,
+        filename: Path,
+        *,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        backup_count: int = DEFAULT_BACKUP_COUNT,
+        clock=time.time,
+    ) -> None:
+        super().__init__(str(filename), "a", encoding="utf-8", delay=True)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._clock = clock
+        self._day = self._today()
+        if os.path.exists(self.baseFilename):
+            mtime = os.path.getmtime(self.baseFilename)
+            self._day = time.strftime("%Y%m%d", time.localtime(mtime))
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+
+    def _today(self) -> str:
+        return time.strftime("%Y%m%d", time.localtime(self._clock()))
+
+    @staticmethod
+    def _compress(source: str, dest: str) -> None:
+        with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if not os.path.exists(self.baseFilename) or os.path.getsize(self.baseFilename) == 0:
+            self._day = self._today()
+            return False
+        if self._today() != self._day:
+            return True
+        if self.max_bytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        size = self.stream.tell() + len(self.format(record)) + len(self.terminator)
+        return size >= self.max_bytes
+
+    def archives(self) -> List[Path]:
+        base = Path(self.baseFilename)
+        return sorted(base.parent.glob(f"{base.name}.*.gz"))
+
+    def doRollover(self) -> None:
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        base = Path(self.baseFilename)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._clock()))
+        dest = self.rotation_filename(f"{base}.{stamp}")
+        seq = 1
+        while os.path.exists(dest):
+            dest = self.rotation_filename(f"{base}.{stamp}-{seq}")
+            seq += 1
+        self.rotate(str(base), dest)
+        if self.backup_count > 0:
+            for old in self.archives()[: -self.backup_count]:
+                old.unlink(missing_ok=True)
+        self._day = self._today()
+        self.stream = self._open()
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped."""
+
+    def __init__(self, log_queue: "queue.Queue") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render the traceback here, while they are still
+        # valid, but leave the layout to the listener's formatters.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped:
+                notice = logging.makeLogRecord(
+                    {
+                        "name": __name__,
+                        "levelno": logging.WARNING,
+                        "levelname": "WARNING",
+                        "msg": "Log queue overflowed, %s records dropped",
+                        "args": (self.dropped,),
+                    }
+                )
+                self.queue.put_nowait(notice)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw.isdigit() else default
 
 
 def setup_logging() -> None:
+    """Routes all logging through a queue drained by a listener thread.
+
+    Handlers on the event loop only enqueue records; formatting for
+    stderr, file writes, rotation and compression happen in the listener.
+    LOG_JSON=1 writes the file as JSON lines. Call it after the STT pool
+    has forked its workers, since the listener is a thread.
+    """
+    global _listener
+    if _listener is not None:
+        return
     root_dir = Path(__file__).resolve().parents[2]
     log_dir = root_dir / "logs"
     log_dir.mkdir(parents=True, exist_ok=True)
     log_path = log_dir / "bot.log"
 
-    handlers = [
-        logging.StreamHandler(),
-        logging.FileHandler(log_path, encoding="utf-8"),
-    ]
+    text_formatter = logging.Formatter(LOG_FORMAT)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(text_formatter)
+    file_handler = CompressingRotatingFileHandler(
+        log_path,
+        max_bytes=_env_int("LOG_MAX_BYTES", DEFAULT_MAX_BYTES),
+        backup_count=_env_int("LOG_BACKUP_COUNT", DEFAULT_BACKUP_COUNT),
+    )
+    if os.getenv("LOG_JSON", "").strip() == "1":
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(text_formatter)
+
+    log_queue: "queue.Queue" = queue.Queue(_env_int("LOG_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+    _listener = logging.handlers.QueueListener(
+        log_queue, stream_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
 
     logging.basicConfig(
         level=logging.INFO,
-        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        handlers=handlers,
+        handlers=[_DroppingQueueHandler(log_queue)],
+        force=True,
     )
+
+
+def stop_logging() -> None:
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
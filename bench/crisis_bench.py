@@ -0,0 +1,243 @@
+"""Throughput and regression check for the crisis patterns.
+
+Scores a labelled JSONL corpus ({"text": ..., "label": "crisis"|"distress"|"none"})
+with the current patterns and, optionally, a candidate pattern set, then
+reports texts/s, per-label accuracy and every verdict that changed.
+
+It also times detect_crisis + detect_distress and CrisisMatcher.assess
+against the per-pattern `re.search` pair the handler ran before them
+(bench/crisis_legacy.py): on the corpus, on a long message with no match and
+on the same message ending in a distress phrase. It prints the speedup per
+case; --fail-on-slowdown exits 1 if the current code is slower on a gated
+case.
+
+    python bench/crisis_bench.py
+    python bench/crisis_bench.py --dump-patterns /tmp/current.json
+    python bench/crisis_bench.py --candidate /tmp/edited.json --fail-on-regression
+    python bench/crisis_bench.py --fail-on-slowdown
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR / "app"))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+import crisis_legacy  # noqa: E402
+from services.crisis import (  # noqa: E402
+    RISK_GROUPS,
+    CrisisMatcher,
+    RiskAssessment,
+    detect_crisis,
+    detect_distress,
+    score_texts,
+)
+
+DEFAULT_CORPUS = ROOT_DIR / "bench" / "data" / "crisis_corpus.jsonl"
+LABELS = ("crisis", "distress", "none")
+LONG_MESSAGE_CHARS = 1000
+REFERENCE_SAMPLES = 5
+
+
+def verdict(assessment: RiskAssessment) -> str:
+    if assessment.crisis:
+        return "crisis"
+    if assessment.distress:
+        return "distress"
+    return "none"
+
+
+def load_corpus(path: Path) -> List[Tuple[str, Optional[str]]]:
+    rows: List[Tuple[str, Optional[str]]] = []
+    with path.open("r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            rows.append((str(record["text"]), record.get("label")))
+    return rows
+
+
+def load_patterns(path: Optional[Path]) -> Dict[str, List[str]]:
+    if path is None:
+        return RISK_GROUPS
+    with path.open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _repeat(texts: List[str], times: int) -> Iterator[str]:
+    for _ in range(times):
+        yield from texts
+
+
+def run_version(
+    name: str,
+    groups: Dict[str, List[str]],
+    corpus: List[Tuple[str, Optional[str]]],
+    *,
+    repeat: int,
+    processes: int,
+    chunk_size: int,
+) -> List[str]:
+    matcher = CrisisMatcher(groups)
+    texts = [text for text, _ in corpus]
+    verdicts = [verdict(item) for item in score_texts(texts, matcher=matcher)]
+
+    started = time.perf_counter()
+    scored = 0
+    for _ in score_texts(
+        _repeat(texts, repeat), matcher=matcher, chunk_size=chunk_size, processes=processes
+    ):
+        scored += 1
+    elapsed = time.perf_counter() - started
+
+    print(f"== {name}")
+    print(f"throughput\t{scored / elapsed:,.0f} texts/s ({scored} texts, {elapsed:.3f}s)")
+    totals: Counter = Counter()
+    correct: Counter = Counter()
+    for (_, label), got in zip(corpus, verdicts):
+        if label is None:
+            continue
+        totals[label] += 1
+        correct[label] += int(label == got)
+    for label in LABELS:
+        if totals[label]:
+            print(f"{label}\t{correct[label]}/{totals[label]} correct")
+    return verdicts
+
+
+def _long_message(texts: List[str]) -> str:
+    parts: List[str] = []
+    while texts and sum(len(part) + 1 for part in parts) < LONG_MESSAGE_CHARS:
+        parts.extend(texts)
+    return " ".join(parts)[:LONG_MESSAGE_CHARS]
+
+
+def _time_per_text(func: Callable[[str], object], texts: List[str], repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - started) / (repeat * len(texts))
+
+
+def run_reference(corpus: List[Tuple[str, Optional[str]]], *, repeat: int) -> List[str]:
+    """Times the current matcher against the legacy pair; returns slower cases.
+
+    The like-for-like check is detect_crisis + detect_distress, which stop at
+    the first hit just as the legacy pair did. CrisisMatcher.assess reports
+    every hit, so on a long message that only matches at the end it does more
+    work than the legacy pair by design; it is gated on the other cases only.
+    """
+    matcher = CrisisMatcher(RISK_GROUPS)
+    texts = [text for text, _ in corpus]
+    for text in texts:
+        risk = matcher.assess(text)
+        legacy = (crisis_legacy.detect_crisis(text), crisis_legacy.detect_distress(text))
+        if (risk.crisis, risk.distress) != legacy or (detect_crisis(text), detect_distress(text)) != legacy:
+            raise AssertionError(f"verdict differs from crisis_legacy for {text!r}")
+
+    clean = _long_message([text for text in texts if not matcher.scan(text)])
+    # A long story that only turns to distress at the end, so neither side
+    # can stop after the first few characters.
+    distress = next(text for text, label in corpus if label == "distress")
+    # name -> (texts, whether assess is gated too)
+    cases = {
+        "corpus": (texts, True),
+        "long, no match": ([clean], True),
+        "long, matches": ([f"{clean} {distress}"], False),
+    }
+
+    def legacy_pair(text: str) -> object:
+        return crisis_legacy.detect_crisis(text), crisis_legacy.detect_distress(text)
+
+    def current_pair(text: str) -> object:
+        return detect_crisis(text), detect_distress(text)
+
+    print("== reference: per-pattern re.search (bench/crisis_legacy.py) vs current")
+    print("case\tlegacy\tpair\tassess\tpair speedup\tassess speedup")
+    slower: List[str] = []
+    for name, (case_texts, gate_assess) in cases.items():
+        rounds = max(repeat * len(texts) // len(case_texts) // 10 // REFERENCE_SAMPLES, 1)
+        # Interleaved samples, best of each: machine noise hits all sides alike.
+        legacy = pair = assess = float("inf")
+        for _ in range(REFERENCE_SAMPLES):
+            legacy = min(legacy, _time_per_text(legacy_pair, case_texts, rounds))
+            pair = min(pair, _time_per_text(current_pair, case_texts, rounds))
+            assess = min(assess, _time_per_text(matcher.assess, case_texts, rounds))
+        print(
+            f"{name}\t{legacy * 1e6:.1f} µs\t{pair * 1e6:.1f} µs\t{assess * 1e6:.1f} µs"
+            f"\t{legacy / pair:.2f}x\t{legacy / assess:.2f}x"
+            + ("" if gate_assess else " (not gated)")
+        )
+        if pair > legacy:
+            slower.append(f"{name} (pair)")
+        if gate_assess and assess > legacy:
+            slower.append(f"{name} (assess)")
+    return slower
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--baseline", type=Path, help="pattern JSON (default: current patterns)")
+    parser.add_argument("--candidate", type=Path, help="pattern JSON to compare against")
+    parser.add_argument("--repeat", type=int, default=200, help="corpus passes for throughput")
+    parser.add_argument("--processes", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dump-patterns", type=Path, help="write current patterns and exit")
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit 1 if the candidate gets more labelled texts wrong",
+    )
+    parser.add_argument(
+        "--fail-on-slowdown",
+        action="store_true",
+        help="exit 1 if the current matcher is slower than the legacy pair on a gated case",
+    )
+    args = parser.parse_args(argv)
+
+    if args.dump_patterns:
+        with args.dump_patterns.open("w", encoding="utf-8") as fh:
+            json.dump(RISK_GROUPS, fh, ensure_ascii=False, indent=2)
+        return 0
+
+    corpus = load_corpus(args.corpus)
+    options = dict(repeat=args.repeat, processes=args.processes, chunk_size=args.chunk_size)
+    baseline = run_version("baseline", load_patterns(args.baseline), corpus, **options)
+    slower = run_reference(corpus, repeat=args.repeat)
+    if slower and args.fail_on_slowdown:
+        print(f"slower than the legacy pair on: {', '.join(slower)}")
+        return 1
+    if args.candidate is None:
+        return 0
+    candidate = run_version("candidate", load_patterns(args.candidate), corpus, **options)
+
+    changed = [
+        (text, label, old, new)
+        for (text, label), old, new in zip(corpus, baseline, candidate)
+        if old != new
+    ]
+    print(f"== changed verdicts: {len(changed)}")
+    for text, label, old, new in changed:
+        print(f"{old} -> {new}\t(label: {label or '-'})\t{text}")
+
+    def wrong(verdicts: List[str]) -> int:
+        return sum(1 for (_, label), got in zip(corpus, verdicts) if label and label != got)
+
+    if args.fail_on_regression and wrong(candidate) > wrong(baseline):
+        print("candidate gets more labelled texts wrong than baseline")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""The intent matchers as they were in bot/handlers.py before services/intents.
+
+Kept only as the reference for bench/micro_bench.py: it times this chain
+against the compiled engine and checks that both classify the fixtures
+the same way. Not used by the bot.
+"""
+
+import re
+from typing import Optional, Tuple
+
+GREETING_STEMS = ("привет", "здравств", "добро", "hello", "hi", "hey")
+SMALLTALK_TOKENS = {
+    "как",
+    "дела",
+    "ты",
+    "вы",
+    "самочувствие",
+    "настроение",
+    "поживаешь",
+    "поживаете",
+}
+GREETING_STATUS_PHRASES = (
+    "как дела",
+    "как ты",
+    "как вы",
+    "как поживаешь",
+    "как поживаете",
+)
+CAPABILITIES_RESPONSES = (
+    "Могу говорить про стресс, тревогу, выгорание, отношения, самооценку, работу, цели, привычки. Что сейчас ближе?",
+    "Можем обсудить работу, отношения, тревогу, усталость, сомнения, самооценку. С чего начнем?",
+    "Готов говорить о сложных чувствах, выгорании, мотивации, решениях, отношениях, границах. Какая тема важнее?",
+    "Я могу помочь с разбором ситуации, чувств, выбора, конфликтов, усталости и тревоги. Что сейчас актуальнее?",
+)
+TOPIC_INTENT_PATTERNS = (
+    re.compile(
+        r"^(?:давай|давайте)\s+(?:поговорим|обсудим)\s+"
+        r"((?:о|об|про|насчет|на тему)\s+.+)$"
+    ),
+    re.compile(
+        r"^(?:хочу|хотела|хотел|хотел бы|хотела бы|можно|можем|могу)\s+"
+        r"(?:поговорить|обсудить)\s+((?:о|об|про|насчет|на тему)\s+.+)$"
+    ),
+    re.compile(
+        r"^(?:поговорим|обсудим)\s+((?:о|об|про|насчет|на тему)\s+.+)$"
+    ),
+    re.compile(r"^тема\s*[:\-]?\s*(.+)$"),
+)
+
+
+def _normalize_intent_text(text: str) -> str:
+    raw = (text or "").strip().lower()
+    if not raw:
+        return ""
+    cleaned = re.sub(r"[^\w\s]", "", raw)
+    return " ".join(cleaned.split())
+
+
+def _is_presence_check(text: str) -> bool:
+    cleaned = _normalize_intent_text(text)
+    if not cleaned:
+        return False
+    if len(cleaned) > 80:
+        return False
+    direct_phrases = (
+        "ты работаешь",
+        "ты тут",
+        "ты здесь",
+        "ты на связи",
+        "ты онлайн",
+        "ты живой",
+        "бот работает",
+        "ты слышишь",
+        "ты отвечаешь",
+    )
+    if any(phrase in cleaned for phrase in direct_phrases):
+        return True
+    if cleaned in {"проверка", "тест", "алло", "ало", "есть кто"}:
+        return True
+    return False
+
+
+def _is_greeting(text: str) -> bool:
+    cleaned = _normalize_intent_text(text)
+    if not cleaned or len(cleaned) > 60:
+        return False
+    tokens = cleaned.split()
+    if not tokens:
+        return False
+    has_greeting = any(token.startswith(GREETING_STEMS) for token in tokens)
+    for token in tokens:
+        if token.startswith(GREETING_STEMS):
+            continue
+        if token in SMALLTALK_TOKENS:
+            continue
+        return False
+    if has_greeting:
+        return True
+    return cleaned in GREETING_STATUS_PHRASES
+
+
+
+def _is_capabilities_request(text: str) -> bool:
+    cleaned = _normalize_intent_text(text)
+    if not cleaned or len(cleaned) > 160:
+        return False
+    if any(
+        phrase in cleaned
+        for phrase in (
+            "какие темы",
+            "на какие темы",
+            "темы для разговора",
+            "темы для беседы",
+            "о чем можем поговорить",
+            "о чем можно поговорить",
+            "о чем вы можете поговорить",
+            "о чем ты можешь поговорить",
+        )
+    ):
+        return True
+    if "на тему" in cleaned and any(
+        phrase in cleaned
+        for phrase in (
+            "можешь поговорить",
+            "можете поговорить",
+            "можем поговорить",
+            "можно поговорить",
+            "можешь обсудить",
+            "можете обсудить",
+            "можем обсудить",
+            "можно обсудить",
+        )
+    ):
+        return True
+    if any(
+        phrase in cleaned
+        for phrase in (
+            "что ты можешь",
+            "что вы можете",
+            "что ты умеешь",
+            "что вы умеете",
+        )
+    ) and any(word in cleaned for word in ("поговорить", "обсудить", "помочь")):
+        return True
+    return False
+
+
+
+def _extract_topic_request(text: str) -> Optional[str]:
+    cleaned = _normalize_intent_text(text)
+    if not cleaned or len(cleaned) > 180:
+        return None
+    for pattern in TOPIC_INTENT_PATTERNS:
+        match = pattern.match(cleaned)
+        if match:
+            topic = (match.group(1) or "").strip()
+            topic = topic.strip(" .!?\"'“”«»")
+            if topic:
+                if len(topic) > 120:
+                    topic = topic[:120].rstrip()
+                return topic
+    return None
+
+
+def classify_chain(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """Runs the checks in the order _handle_user_text used to."""
+    if _is_presence_check(text):
+        return "presence", None
+    if _is_capabilities_request(text):
+        return "capabilities", None
+    topic = _extract_topic_request(text)
+    if topic:
+        return "topic", topic
+    if _is_greeting(text):
+        return "greeting", None
+    return None, None
@@ -0,0 +1,435 @@
+"""End-to-end load test of the bot's update handling.
+
+Drives the real dispatcher (the router from bot/handlers.py with the same
+middlewares as main.py) with synthetic updates. Telegram, Supabase and
+Groq are replaced by local fakes from bench/load_fakes.py, so nothing
+leaves the machine. Each virtual user replays one flow in a loop; the
+report gives msgs/s and per-flow latency percentiles, measured from
+handing an update to the dispatcher until its handling finished.
+
+A run only counts if every flow handled its updates: when a flow has no
+successful updates, or its share of failed ones is above
+--max-error-ratio (none allowed by default), the errors are printed
+without any throughput numbers and the script exits with status 1.
+
+    python bench/load_bench.py --users 50 --duration 30
+    python bench/load_bench.py --mix therapy=1 --llm-latency 1.5 --output /tmp/load.json
+
+Bot state files (analytics, journal, queues) go to a temporary directory,
+not to data/.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR / "app"))
+
+from load_fakes import (  # noqa: E402
+    FAKE_SUPABASE_KEY,
+    FakeGroq,
+    FakePostgrest,
+    FakeTelegram,
+    serve,
+)
+
+FLOWS = ("therapy", "checkin", "onboarding", "voice")
+DEFAULT_MIX = "therapy=6,checkin=2,onboarding=1,voice=1"
+BOT_TOKEN = "123456:load-test"
+USER_ID_BASE = 10_000_000
+
+THERAPY_TEXTS = (
+    "На работе опять завал, не понимаю, за что хвататься в первую очередь.",
+    "Поругалась с мамой из-за мелочи, и теперь весь день неприятный осадок.",
+    "Не могу нормально уснуть, мысли крутятся про завтрашнюю встречу.",
+    "Кажется, я слишком много на себя беру и не умею отказывать.",
+    "Хочу начать бегать по утрам, но каждый раз откладываю.",
+    "Коллега постоянно перебивает меня на созвонах, и это злит.",
+    "Не знаю, стоит ли менять работу или я просто устал.",
+    "Сегодня был неплохой день, но к вечеру накатила апатия.",
+)
+
+# (kind, payload) steps of one pass through each flow.
+FLOW_STEPS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "checkin": (("text", "/checkin"), ("text", "6/4/5")),
+    "onboarding": (
+        ("text", "/start"),
+        ("callback", "onboard:skip"),
+        ("callback", "consent_yes"),
+        ("callback", "profile:gender:female"),
+        ("text", "Аня"),
+        ("text", "29"),
+        ("text", "Работаю в офисе, последнее время много стресса."),
+    ),
+    "voice": (("voice", ""),),
+}
+
+
+@dataclass
+class FlowStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_mix(raw: str) -> Dict[str, int]:
+    mix: Dict[str, int] = {}
+    for part in raw.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in FLOWS:
+            raise argparse.ArgumentTypeError(f"unknown flow {name!r}, expected one of {FLOWS}")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix has no flows")
+    return mix
+
+
+def assign_flows(users: int, mix: Dict[str, int]) -> List[str]:
+    """Spreads flows over users in proportion to the mix weights."""
+    wheel = [name for name, weight in mix.items() for _ in range(weight)]
+    return [wheel[index % len(wheel)] for index in range(users)]
+
+
+def _configure_env(args: argparse.Namespace, urls: Dict[str, str]) -> None:
+    os.environ.update(
+        {
+            "BOT_TOKEN": BOT_TOKEN,
+            "GROQ_API_KEY": "load-test",
+            "GROQ_BASE_URL": urls["groq"],
+            "SUPABASE_URL": urls["supabase"],
+            "SUPABASE_KEY": FAKE_SUPABASE_KEY,
+            "TRANSCRIPT_CACHE_PERSIST": "0",
+            "METRICS_ENABLED": "1",
+        }
+    )
+    # Limits that would only measure their own configuration; the
+    # concurrency caps (LLM_MAX_CONCURRENCY, DB_MAX_WORKERS) stay as set.
+    os.environ.setdefault("RATE_LIMIT_BURST", "1000000")
+    os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("GROQ_TOKENS_PER_MINUTE", "0")
+    os.environ.setdefault("LLM_STREAMING", "0" if args.no_streaming else "1")
+
+
+def _isolate_state(state_dir: Path) -> None:
+    """Points the bot's file-backed singletons at a scratch directory."""
+    from services import analytics, message_journal, summary_queue, support_pool
+
+    analytics._sink = analytics.AnalyticsSink(state_dir / analytics.ANALYTICS_FILE_NAME)
+    message_journal._journal = message_journal.MessageJournal(
+        state_dir / message_journal.JOURNAL_FILE_NAME
+    )
+    summary_queue._queue = summary_queue.SummaryQueue(state_dir / summary_queue.QUEUE_FILE_NAME)
+    support_pool._pool = support_pool.SupportPool(state_dir / support_pool.POOL_FILE_NAME)
+
+
+class LoadRunner:
+    def __init__(self, bot: Any, dispatcher: Any, *, think_seconds: float) -> None:
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.think_seconds = think_seconds
+        self.stats: Dict[str, FlowStats] = defaultdict(FlowStats)
+        self._update_id = 0
+        self._message_id = 0
+        self._voice_id = 0
+
+    def _next_ids(self) -> Tuple[int, int]:
+        self._update_id += 1
+        self._message_id += 1
+        return self._update_id, self._message_id
+
+    def _build_update(self, user_id: int, kind: str, payload: str) -> Any:
+        from aiogram.types import Update
+
+        update_id, message_id = self._next_ids()
+        user = {"id": user_id, "is_bot": False, "first_name": "Нагрузка"}
+        message: Dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": user,
+        }
+        raw: Dict[str, Any] = {"update_id": update_id}
+        if kind == "text":
+            message["text"] = payload
+            if payload.startswith("/"):
+                command = payload.split()[0]
+                message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+            raw["message"] = message
+        elif kind == "voice":
+            # A fresh file id every time, so the transcript cache never hits.
+            self._voice_id += 1
+            file_id = f"voice-{self._voice_id}"
+            message["voice"] = {"file_id": file_id, "file_unique_id": file_id, "duration": 1}
+            raw["message"] = message
+        elif kind == "callback":
+            message["from"] = {"id": 1, "is_bot": True, "first_name": "LoadTest"}
+            raw["callback_query"] = {
+                "id": str(update_id),
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": payload,
+                "message": message,
+            }
+        else:
+            raise ValueError(f"unknown update kind {kind}")
+        return Update.model_validate(raw, context={"bot": self.bot})
+
+    async def _feed(self, flow: str, user_id: int, kind: str, payload: str) -> None:
+        update = self._build_update(user_id, kind, payload)
+        started = time.perf_counter()
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception as exc:
+            self.stats[flow].errors[type(exc).__name__] += 1
+            return
+        self.stats[flow].latencies.append(time.perf_counter() - started)
+
+    async def run_user(self, index: int, flow: str, deadline: float) -> None:
+        user_id = USER_ID_BASE + index
+        turn = index
+        while time.perf_counter() < deadline:
+            if flow == "therapy":
+                steps: Tuple[Tuple[str, str], ...] = (
+                    ("text", THERAPY_TEXTS[turn % len(THERAPY_TEXTS)]),
+                )
+                turn += 1
+            else:
+                steps = FLOW_STEPS[flow]
+            for kind, payload in steps:
+                if time.perf_counter() >= deadline:
+                    return
+                await self._feed(flow, user_id, kind, payload)
+                if self.think_seconds:
+                    await asyncio.sleep(self.think_seconds)
+
+
+def build_report(
+    stats: Dict[str, FlowStats], elapsed: float, extra: Dict[str, Any]
+) -> Dict[str, Any]:
+    flows: Dict[str, Any] = {}
+    total = 0
+    for name in FLOWS:
+        if name not in stats:
+            continue
+        latencies = sorted(stats[name].latencies)
+        total += len(latencies)
+        flows[name] = {
+            "messages": len(latencies),
+            "errors": dict(stats[name].errors),
+            "msgs_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+        }
+    return {
+        "elapsed_seconds": elapsed,
+        "messages": total,
+        "msgs_per_second": total / elapsed if elapsed else 0.0,
+        "flows": flows,
+        **extra,
+    }
+
+
+def find_failures(report: Dict[str, Any], max_error_ratio: float) -> List[str]:
+    """Flows whose numbers should not be trusted, with the reason."""
+    failures: List[str] = []
+    for name, flow in report["flows"].items():
+        failed = sum(flow["errors"].values())
+        handled = flow["messages"] + failed
+        if not flow["messages"]:
+            failures.append(f"{name}: no successful updates ({failed} failed)")
+        elif failed / handled > max_error_ratio:
+            failures.append(
+                f"{name}: {failed} of {handled} updates failed "
+                f"({failed / handled:.1%} > {max_error_ratio:.1%})"
+            )
+    return failures
+
+
+def print_failures(report: Dict[str, Any], failures: List[str]) -> None:
+    print("== run is not valid, no throughput reported")
+    for failure in failures:
+        print(failure)
+    print("flow\tok\terrors")
+    for name, flow in report["flows"].items():
+        errors = ", ".join(f"{kind}={count}" for kind, count in flow["errors"].items()) or "-"
+        print(f"{name}\t{flow['messages']}\t{errors}")
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(
+        f"== {report['messages']} updates in {report['elapsed_seconds']:.1f}s: "
+        f"{report['msgs_per_second']:.1f} msgs/s"
+    )
+    print("flow\tmsgs\tmsgs/s\tp50 ms\tp95 ms\tp99 ms\terrors")
+    for name, flow in report["flows"].items():
+        errors = ", ".join(f"{kind}={count}" for kind, count in flow["errors"].items()) or "-"
+        print(
+            f"{name}\t{flow['messages']}\t{flow['msgs_per_second']:.1f}\t"
+            f"{flow['p50_ms']:.1f}\t{flow['p95_ms']:.1f}\t{flow['p99_ms']:.1f}\t{errors}"
+        )
+    stages = report.get("stages") or {}
+    if stages:
+        print("== stages (from services.metrics)")
+        print("stage\tcount\tp50 ms\tp95 ms")
+        for name, stage in stages.items():
+            p50 = stage["p50"] * 1000 if stage["p50"] is not None else float("nan")
+            p95 = stage["p95"] * 1000 if stage["p95"] is not None else float("nan")
+            print(f"{name}\t{stage['count']}\t{p50:.1f}\t{p95:.1f}")
+    if report.get("voice_note"):
+        print(f"note: {report['voice_note']}")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    voice_bytes = args.voice_file.read_bytes() if args.voice_file else None
+    telegram = FakeTelegram(latency=args.telegram_latency, voice_bytes=voice_bytes)
+    postgrest = FakePostgrest(latency=args.db_latency)
+    groq = FakeGroq(latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second)
+    runners = []
+    urls: Dict[str, str] = {}
+    for name, fake in (("telegram", telegram), ("supabase", postgrest), ("groq", groq)):
+        runner, urls[name] = await serve(fake.app())
+        runners.append(runner)
+    _configure_env(args, urls)
+
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    from bot.handlers import router
+    from bot.middlewares import RateLimitMiddleware, UserSerialMiddleware
+    from flows.therapy import summarize_user
+    from services.analytics import get_analytics_sink
+    from services.db import get_db_client, shutdown_db_executor
+    from services.message_service import start_message_journal, stop_message_journal
+    from services.metrics import get_metrics
+    from services.stt import shutdown_stt_pool, stt_is_available, warm_up_stt
+    from services.summary_queue import get_summary_queue
+    from services.support_pool import get_support_pool
+    from services.user_service import start_activity_flusher, stop_activity_flusher
+
+    state_dir = Path(tempfile.mkdtemp(prefix="bot-load-"))
+    _isolate_state(state_dir)
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(urls["telegram"]))
+    bot = Bot(token=BOT_TOKEN, session=session)
+    dispatcher = Dispatcher()
+    dispatcher.update.outer_middleware(RateLimitMiddleware())
+    dispatcher.update.outer_middleware(UserSerialMiddleware())
+    dispatcher.include_router(router)
+
+    await warm_up_stt()
+    get_db_client()
+    analytics_sink = get_analytics_sink()
+    await analytics_sink.start()
+    await start_message_journal()
+    await start_activity_flusher()
+    support_pool = get_support_pool()
+    support_pool.warm_up()
+    summary_queue = get_summary_queue()
+    await summary_queue.start(summarize_user)
+
+    mix = args.mix
+    flows = assign_flows(args.users, mix)
+    load = LoadRunner(bot, dispatcher, think_seconds=args.think_ms / 1000)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    try:
+        await asyncio.gather(
+            *(load.run_user(index, flow, deadline) for index, flow in enumerate(flows))
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        await summary_queue.stop()
+        await support_pool.stop()
+        await stop_activity_flusher()
+        await stop_message_journal()
+        shutdown_stt_pool()
+        await analytics_sink.stop()
+        shutdown_db_executor()
+        await bot.session.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    extra: Dict[str, Any] = {
+        "config": {
+            "users": args.users,
+            "duration": args.duration,
+            "mix": mix,
+            "think_ms": args.think_ms,
+            "telegram_latency": args.telegram_latency,
+            "db_latency": args.db_latency,
+            "llm_latency": args.llm_latency,
+            "llm_tokens_per_second": args.llm_tokens_per_second,
+            "streaming": os.environ.get("LLM_STREAMING") != "0",
+        },
+        "stages": get_metrics().snapshot()["stages"],
+        "calls": {
+            "telegram": dict(telegram.calls),
+            "supabase": dict(postgrest.calls),
+            "groq": dict(groq.calls),
+        },
+        "state_dir": str(state_dir),
+    }
+    if "voice" in mix and not stt_is_available():
+        extra["voice_note"] = (
+            "STT is not available (ffmpeg or VOSK_MODEL_PATH missing); "
+            "the voice flow measured only the fallback reply"
+        )
+    return build_report(load.stats, elapsed, extra)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between a user's updates")
+    parser.add_argument("--telegram-latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--db-latency", type=float, default=0.01, help="seconds per PostgREST call")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="seconds to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--no-streaming", action="store_true", help="run with LLM_STREAMING=0")
+    parser.add_argument("--voice-file", type=Path, help="audio served for voice notes (default: 1 s of silence)")
+    parser.add_argument("--output", type=Path, help="also write the report as JSON")
+    parser.add_argument(
+        "--max-error-ratio",
+        type=float,
+        default=0.0,
+        help="failed share of a flow's updates above which the run is invalid",
+    )
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    failures = find_failures(report, args.max_error_ratio)
+    if failures:
+        print_failures(report, failures)
+        return 1
+    print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
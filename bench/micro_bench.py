@@ -0,0 +1,365 @@
+"""Micro-benchmarks for the pure-Python functions run on every message.
+
+Each case calls one function over the Russian fixtures in
+bench/data/micro_fixtures.json and reports the time per call. Timings
+are the median of several repeats; a case is a regression when its
+median is slower than the baseline by more than the threshold.
+
+    python bench/micro_bench.py run
+    python bench/micro_bench.py run --filter crisis
+    python bench/micro_bench.py save
+    python bench/micro_bench.py compare --threshold 0.25
+
+Baselines only mean something on the machine that recorded them: save
+one before a change, then compare after it. The stored baseline was
+recorded on the code before the performance series; cases that did not
+exist yet are missing from it and show up as "new". The crisis.legacy_pair
+case (bench/crisis_legacy.py) is the same code in every run, so it shows
+how far the machine itself has drifted since then.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT_DIR / "app"))
+sys.path.append(str(ROOT_DIR / "bench"))
+
+FIXTURES_PATH = ROOT_DIR / "bench" / "data" / "micro_fixtures.json"
+DEFAULT_BASELINE = ROOT_DIR / "bench" / "baselines" / "micro.json"
+DEFAULT_THRESHOLD = 0.25
+TARGET_REPEAT_SECONDS = 0.2
+
+Fixtures = Dict[str, Any]
+
+
+@dataclass
+class Case:
+    name: str
+    # Builds the work function from the fixtures and returns it with the
+    # number of calls one run of it makes.
+    setup: Callable[[Fixtures], Tuple[Callable[[], Any], int]]
+
+
+CASES: List[Case] = []
+
+
+def case(name: str):
+    def register(setup: Callable[[Fixtures], Tuple[Callable[[], Any], int]]):
+        CASES.append(Case(name, setup))
+        return setup
+
+    return register
+
+
+@case("crisis.legacy_pair")
+def _crisis_legacy(fixtures: Fixtures):
+    from crisis_legacy import detect_crisis, detect_distress
+
+    texts = fixtures["messages"]
+    return lambda: [(detect_crisis(text), detect_distress(text)) for text in texts], len(texts)
+
+
+@case("crisis.detect_crisis")
+def _crisis(fixtures: Fixtures):
+    from services.crisis import detect_crisis
+
+    texts = fixtures["messages"]
+    return lambda: [detect_crisis(text) for text in texts], len(texts)
+
+
+def _crisis_pair(texts: List[str]):
+    from services.crisis import detect_crisis, detect_distress
+
+    return lambda: [(detect_crisis(text), detect_distress(text)) for text in texts], len(texts)
+
+
+# The pair the message handler ran before assess_risk existed; these names
+# are comparable with baselines recorded on the pre-change code.
+@case("crisis.detect_pair")
+def _crisis_detect_pair(fixtures: Fixtures):
+    return _crisis_pair(fixtures["messages"])
+
+
+@case("crisis.detect_pair_long")
+def _crisis_detect_pair_long(fixtures: Fixtures):
+    return _crisis_pair(fixtures["long_messages"])
+
+
+@case("crisis.assess_risk")
+def _assess_risk(fixtures: Fixtures):
+    from crisis_legacy import detect_crisis, detect_distress
+    from services.crisis import assess_risk
+
+    texts = fixtures["messages"] + fixtures["long_messages"]
+    for text in texts:
+        risk = assess_risk(text)
+        got = (risk.crisis, risk.distress)
+        if got != (detect_crisis(text), detect_distress(text)):
+            raise AssertionError(f"risk mismatch for {text!r}: {got}")
+    texts = fixtures["messages"]
+    return lambda: [assess_risk(text) for text in texts], len(texts)
+
+
+@case("crisis.assess_risk_long")
+def _assess_risk_long(fixtures: Fixtures):
+    from services.crisis import assess_risk
+
+    texts = fixtures["long_messages"]
+    return lambda: [assess_risk(text) for text in texts], len(texts)
+
+
+@case("checkin.parse_checkin")
+def _checkin(fixtures: Fixtures):
+    from services.checkin import parse_checkin
+
+    texts = fixtures["checkins"]
+    return lambda: [parse_checkin(text) for text in texts], len(texts)
+
+
+@case("datetime_utils.parse_db_datetime")
+def _datetimes(fixtures: Fixtures):
+    from services.datetime_utils import parse_db_datetime
+
+    values = fixtures["datetimes"]
+    return lambda: [parse_db_datetime(value) for value in values], len(values)
+
+
+@case("prompts.build_therapy_prompt")
+def _prompt(fixtures: Fixtures):
+    from services.prompts import build_therapy_prompt
+
+    history = fixtures["history"]
+    profile = fixtures["profile"]
+    texts = fixtures["messages"]
+
+    def run() -> None:
+        # The window slides over the history like it does between turns.
+        for index, text in enumerate(texts):
+            start = index % 4
+            build_therapy_prompt(
+                context="",
+                summary=profile["summary"],
+                history=history[start : start + 6],
+                user_text=text,
+                focus=profile["focus"],
+                session_goal=profile["session_goal"],
+                last_outcome=profile["last_outcome"],
+                profile=profile["profile"],
+            )
+
+    return run, len(texts)
+
+
+@case("emoji.select_emoji")
+def _select_emoji(fixtures: Fixtures):
+    from services.emoji import select_emoji
+
+    replies = fixtures["replies"]
+    return lambda: [select_emoji(1, text) for text in replies], len(replies)
+
+
+@case("emoji.decorate_text")
+def _decorate_text(fixtures: Fixtures):
+    from services.emoji import decorate_text
+
+    replies = fixtures["replies"]
+    return lambda: [decorate_text(1, text) for text in replies], len(replies)
+
+
+@case("intents.legacy_chain")
+def _intents_legacy(fixtures: Fixtures):
+    from intents_legacy import classify_chain
+
+    texts = fixtures["messages"]
+    return lambda: [classify_chain(text) for text in texts], len(texts)
+
+
+@case("intents.classify")
+def _intents_classify(fixtures: Fixtures):
+    from intents_legacy import classify_chain
+    from services.intents import classify_intent
+
+    texts = fixtures["messages"]
+    for text in texts:
+        intent = classify_intent(text)
+        got = (intent.name, intent.topic) if intent else (None, None)
+        if got != classify_chain(text):
+            raise AssertionError(f"intent mismatch for {text!r}: {got} != {classify_chain(text)}")
+    return lambda: [classify_intent(text) for text in texts], len(texts)
+
+
+def load_fixtures(path: Path = FIXTURES_PATH) -> Fixtures:
+    with path.open("r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _calibrate(func: Callable[[], Any]) -> int:
+    """Loops per repeat so that one repeat takes about TARGET_REPEAT_SECONDS."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= TARGET_REPEAT_SECONDS / 10 or loops >= 1 << 20:
+            return max(1, int(loops * TARGET_REPEAT_SECONDS / max(elapsed, 1e-9)))
+        loops *= 2
+
+
+def measure(func: Callable[[], Any], calls: int, repeat: int) -> Dict[str, Any]:
+    func()  # warm caches and lazy imports
+    loops = _calibrate(func)
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / (loops * calls) * 1e9)
+    return {
+        "median_ns": statistics.median(samples),
+        "min_ns": min(samples),
+        "stdev_ns": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "calls": calls,
+        "loops": loops,
+    }
+
+
+def run_cases(name_filter: Optional[str], repeat: int) -> Dict[str, Any]:
+    random.seed(0)
+    fixtures = load_fixtures()
+    results: Dict[str, Any] = {}
+    skipped: Dict[str, str] = {}
+    for bench_case in CASES:
+        if name_filter and name_filter not in bench_case.name:
+            continue
+        try:
+            func, calls = bench_case.setup(fixtures)
+        except ImportError as exc:
+            skipped[bench_case.name] = str(exc)
+            continue
+        results[bench_case.name] = measure(func, calls, repeat)
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cases": results,
+        "skipped": skipped,
+    }
+
+
+def print_results(report: Dict[str, Any]) -> None:
+    print("case\tmedian\tmin\tstdev")
+    for name, result in report["cases"].items():
+        print(
+            f"{name}\t{_format_ns(result['median_ns'])}\t{_format_ns(result['min_ns'])}\t"
+            f"±{result['stdev_ns'] / result['median_ns'] * 100:.1f}%"
+        )
+    for name, reason in report["skipped"].items():
+        print(f"{name}\tskipped ({reason})")
+
+
+def _format_ns(value: float) -> str:
+    if value >= 1e6:
+        return f"{value / 1e6:.2f} ms"
+    if value >= 1e3:
+        return f"{value / 1e3:.2f} µs"
+    return f"{value:.0f} ns"
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Prints a comparison table; returns the names of regressed cases."""
+    regressions: List[str] = []
+    print("case\tbaseline\tcurrent\tchange")
+    for name, result in current["cases"].items():
+        before = baseline["cases"].get(name)
+        if before is None:
+            print(f"{name}\t-\t{_format_ns(result['median_ns'])}\tnew")
+            continue
+        change = result["median_ns"] / before["median_ns"] - 1
+        verdict = ""
+        if change > threshold:
+            verdict = "\tREGRESSION"
+            regressions.append(name)
+        print(
+            f"{name}\t{_format_ns(before['median_ns'])}\t{_format_ns(result['median_ns'])}\t"
+            f"{change * 100:+.1f}%{verdict}"
+        )
+    for name in sorted(set(baseline["cases"]) - set(current["cases"])):
+        print(f"{name}\t{_format_ns(baseline['cases'][name]['median_ns'])}\t-\tnot run")
+    if baseline.get("python") != current.get("python") or baseline.get("machine") != current.get(
+        "machine"
+    ):
+        print(
+            f"warning: baseline is from Python {baseline.get('python')} on "
+            f"{baseline.get('machine')}, this run is Python {current.get('python')} on "
+            f"{current.get('machine')}"
+        )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="measure and print")
+    save_parser = commands.add_parser("save", help="measure and store as the baseline")
+    compare_parser = commands.add_parser("compare", help="measure and compare with the baseline")
+    for sub in (run_parser, save_parser, compare_parser):
+        sub.add_argument("--filter", help="only cases whose name contains this")
+        sub.add_argument("--repeat", type=int, default=7)
+    for sub in (save_parser, compare_parser):
+        sub.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    run_parser.add_argument("--output", type=Path, help="also write the results as JSON")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed slowdown as a fraction (0.25 = 25%%)",
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "compare" and not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run `save` first")
+        return 2
+    report = run_cases(args.filter, max(args.repeat, 1))
+
+    if args.command == "run":
+        print_results(report)
+        if args.output:
+            args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return 0
+    if args.command == "save":
+        print_results(report)
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        if args.filter and args.baseline.exists():
+            # A filtered run only refreshes its own cases.
+            stored = json.loads(args.baseline.read_text(encoding="utf-8"))
+            stored["cases"].update(report["cases"])
+            report["cases"] = stored["cases"]
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    regressions = compare(baseline, report, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -147,3 +147,106 @@ BEGIN
   WHERE id = user_id_param;
 END;
 $$ LANGUAGE plpgsql;
+
+-- RPC-функция для записи last_message_at сразу нескольким пользователям:
+-- i-й пользователь получает i-е время. Только UPDATE — пользователь,
+-- удаленный через /reset, пока запись была в пути, заново не создается.
+CREATE OR REPLACE FUNCTION touch_users_activity(
+    user_ids_param BIGINT[],
+    seen_at_param TIMESTAMPTZ[]
+)
+RETURNS void AS $$
+BEGIN
+  UPDATE users
+  SET last_message_at = activity.seen_at
+  FROM unnest(user_ids_param, seen_at_param) AS activity(id, seen_at)
+  WHERE users.id = activity.id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- RPC-функция для приема сообщения пользователя за один запрос:
+-- сохраняет сообщение, увеличивает счетчик, обновляет last_message_at и
+-- серию стресса (та же логика, что в update_distress), а затем возвращает
+-- обновленную строку пользователя и историю до этого сообщения.
+-- is_distress_param = NULL означает, что серию стресса трогать не нужно.
+-- Результат — одна строка с колонкой result: PostgREST отдает ее массивом,
+-- а postgrest-py принимает только массив. Тип результата поменялся, поэтому
+-- старую версию нужно удалить: CREATE OR REPLACE его не меняет.
+-- created_at_param — время сообщения по часам бота: ответы ассистента
+-- пишутся через журнал с клиентским created_at, и обе стороны диалога
+-- должны сортироваться по одним часам. NULL — время сервера.
+DROP FUNCTION IF EXISTS ingest_user_message(BIGINT, TEXT, INT, BOOLEAN);
+DROP FUNCTION IF EXISTS ingest_user_message(BIGINT, TEXT, INT, BOOLEAN, TIMESTAMPTZ);
+CREATE OR REPLACE FUNCTION ingest_user_message(
+    user_id_param BIGINT,
+    content_param TEXT,
+    history_limit_param INT DEFAULT 10,
+    is_distress_param BOOLEAN DEFAULT NULL,
+    created_at_param TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE(result JSONB) AS $$
+DECLARE
+  user_row users%ROWTYPE;
+  history_json JSONB;
+  now_ts TIMESTAMPTZ := NOW();
+  new_streak INT;
+  should_offer BOOLEAN := FALSE;
+BEGIN
+  SELECT * INTO user_row FROM users WHERE id = user_id_param FOR UPDATE;
+  IF NOT FOUND THEN
+    INSERT INTO users (id) VALUES (user_id_param) RETURNING * INTO user_row;
+  END IF;
+
+  SELECT COALESCE(jsonb_agg(to_jsonb(recent) ORDER BY recent.created_at), '[]'::jsonb)
+  INTO history_json
+  FROM (
+    SELECT *
+    FROM messages
+    WHERE user_id = user_id_param
+    ORDER BY created_at DESC
+    LIMIT history_limit_param
+  ) AS recent;
+
+  INSERT INTO messages (user_id, role, content, created_at)
+  VALUES (user_id_param, 'user', content_param, COALESCE(created_at_param, now_ts));
+
+  new_streak := COALESCE(user_row.distress_streak, 0);
+  IF is_distress_param IS TRUE THEN
+    new_streak := new_streak + 1;
+    IF user_row.last_distress_at IS NOT NULL
+       AND now_ts - user_row.last_distress_at > INTERVAL '6 hours' THEN
+      new_streak := 1;
+    END IF;
+    should_offer := new_streak >= 3
+      AND (
+        user_row.last_support_offer_at IS NULL
+        OR now_ts - user_row.last_support_offer_at > INTERVAL '12 hours'
+      );
+  ELSIF is_distress_param IS FALSE
+     AND user_row.last_distress_at IS NOT NULL
+     AND now_ts - user_row.last_distress_at > INTERVAL '12 hours' THEN
+    new_streak := 0;
+  END IF;
+
+  UPDATE users
+  SET messages_since_summary = COALESCE(messages_since_summary, 0) + 1,
+      last_message_at = now_ts,
+      distress_streak = new_streak,
+      last_distress_at = CASE
+        WHEN is_distress_param IS TRUE THEN now_ts
+        ELSE last_distress_at
+      END,
+      last_support_offer_at = CASE
+        WHEN should_offer THEN now_ts
+        ELSE last_support_offer_at
+      END
+  WHERE id = user_id_param
+  RETURNING * INTO user_row;
+
+  RETURN QUERY SELECT jsonb_build_object(
+    'user', to_jsonb(user_row),
+    'history', history_json,
+    'should_offer_support', should_offer
+  );
+END;
+$$ LANGUAGE plpgsql;
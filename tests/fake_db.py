@@ -0,0 +1,167 @@
+"""In-memory stand-in for the sync Supabase client used by the services.
+
+Covers the query builder calls the services make (select/insert/update/
+delete/upsert with eq/in_/order/limit) and RPCs registered in `rpcs`.
+Every executed call is recorded in `calls` as "<action> <table>" or
+"rpc <name>". Install it with `install(client)`, which also clears the
+module singletons the services share.
+"""
+
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services import db, message_journal, summary_queue, user_cache  # noqa: E402
+from services.message_journal import MessageJournal  # noqa: E402
+from services.summary_queue import SummaryQueue  # noqa: E402
+from services.user_cache import UserCache  # noqa: E402
+
+
+@dataclass
+class FakeResponse:
+    data: Any
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", table: str, action: str, payload: Any = None) -> None:
+        self.client = client
+        self.table = table
+        self.action = action
+        self.payload = payload
+        self.filters: List[Tuple[str, Callable[[Any], bool]]] = []
+        self.limit_rows: Optional[int] = None
+        self.order_by: Optional[Tuple[str, bool]] = None
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append((column, lambda got: got == value))
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "FakeQuery":
+        allowed = set(values)
+        self.filters.append((column, lambda got: got in allowed))
+        return self
+
+    def select(self, *columns: str) -> "FakeQuery":
+        return self
+
+    def order(self, column: str, *, desc: bool = False) -> "FakeQuery":
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self.limit_rows = count
+        return self
+
+    def _matched(self) -> List[Dict[str, Any]]:
+        rows = self.client.tables.setdefault(self.table, [])
+        return [row for row in rows if all(test(row.get(col)) for col, test in self.filters)]
+
+    def execute(self) -> FakeResponse:
+        self.client.record(f"{self.action} {self.table}")
+        rows = self.client.tables.setdefault(self.table, [])
+        if self.action == "select":
+            found = self._matched()
+            if self.order_by is not None:
+                column, desc = self.order_by
+                found.sort(key=lambda row: row.get(column), reverse=desc)
+            if self.limit_rows is not None:
+                found = found[: self.limit_rows]
+            return FakeResponse([dict(row) for row in found])
+        if self.action == "update":
+            found = self._matched()
+            for row in found:
+                row.update(self.payload)
+            return FakeResponse([dict(row) for row in found])
+        if self.action == "delete":
+            found = self._matched()
+            self.client.tables[self.table] = [row for row in rows if row not in found]
+            return FakeResponse([dict(row) for row in found])
+        if self.action in ("insert", "upsert"):
+            items = self.payload if isinstance(self.payload, list) else [self.payload]
+            written = []
+            for item in items:
+                current = next((row for row in rows if row.get("id") == item.get("id")), None)
+                if current is not None and self.action == "upsert":
+                    current.update(item)
+                    written.append(dict(current))
+                    continue
+                row = {"created_at": "2024-01-01T00:00:00+00:00", **item}
+                rows.append(row)
+                written.append(dict(row))
+            return FakeResponse(written)
+        raise AssertionError(f"unexpected action {self.action}")
+
+
+class FakeTable:
+    def __init__(self, client: "FakeClient", name: str) -> None:
+        self.client = client
+        self.name = name
+
+    def select(self, *columns: str) -> FakeQuery:
+        return FakeQuery(self.client, self.name, "select")
+
+    def insert(self, payload: Any, **kwargs: Any) -> FakeQuery:
+        return FakeQuery(self.client, self.name, "insert", payload)
+
+    def upsert(self, payload: Any, **kwargs: Any) -> FakeQuery:
+        return FakeQuery(self.client, self.name, "upsert", payload)
+
+    def update(self, payload: Dict[str, Any]) -> FakeQuery:
+        return FakeQuery(self.client, self.name, "update", dict(payload))
+
+    def delete(self) -> FakeQuery:
+        return FakeQuery(self.client, self.name, "delete")
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeClient", name: str, params: Dict[str, Any]) -> None:
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> FakeResponse:
+        self.client.record(f"rpc {self.name}")
+        handler = self.client.rpcs.get(self.name)
+        if handler is None:
+            raise RuntimeError(f"function {self.name} does not exist")
+        return FakeResponse(handler(self.params))
+
+
+class FakeClient:
+    """A fake client; `rpcs` maps a function name to a handler of its params."""
+
+    def __init__(self) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"users": [], "messages": []}
+        self.calls: List[str] = []
+        self.rpcs: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, call: str) -> None:
+        with self._lock:
+            self.calls.append(call)
+
+    def table(self, name: str) -> FakeTable:
+        return FakeTable(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        return FakeRpc(self, name, params)
+
+    def user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        return next((row for row in self.tables["users"] if row["id"] == user_id), None)
+
+
+def user_row(user_id: int, **fields: Any) -> Dict[str, Any]:
+    return {"id": user_id, "created_at": "2024-01-01T00:00:00+00:00", **fields}
+
+
+def install(client: FakeClient) -> None:
+    """Makes the services use `client` with a fresh cache, journal and queue."""
+    db._db_client = client
+    db._db_error = None
+    user_cache._cache = UserCache()
+    message_journal._journal = MessageJournal()
+    summary_queue._queue = SummaryQueue()
@@ -0,0 +1,85 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.analytics import AnalyticsSink
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _read_events(path: Path) -> list[str]:
+    return [json.loads(line)["event"] for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestAnalyticsSink(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "analytics.jsonl"
+        # 2024-01-01 12:00 UTC
+        self.clock = FakeClock(1704110400.0)
+
+    async def asyncTearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _sink(self, **kwargs) -> AnalyticsSink:
+        return AnalyticsSink(self.path, flush_seconds=3600, clock=self.clock, **kwargs)
+
+    async def test_writes_directly_before_start(self) -> None:
+        sink = self._sink()
+        sink.emit({"event": "a"})
+        self.assertEqual(_read_events(self.path), ["a"])
+        await sink.stop()
+
+    async def test_buffers_until_flush_and_flushes_on_stop(self) -> None:
+        sink = self._sink()
+        await sink.start()
+        sink.emit({"event": "a"})
+        sink.emit({"event": "b"})
+        self.assertEqual(sink.buffered_count, 2)
+        self.assertFalse(self.path.exists())
+        await sink.flush()
+        self.assertEqual(_read_events(self.path), ["a", "b"])
+        sink.emit({"event": "c"})
+        await sink.stop()
+        self.assertEqual(_read_events(self.path), ["a", "b", "c"])
+
+    async def test_ring_drops_oldest_when_full(self) -> None:
+        sink = self._sink(max_buffered_events=2)
+        await sink.start()
+        for name in ("a", "b", "c"):
+            sink.emit({"event": name})
+        self.assertEqual(sink.dropped_count, 1)
+        await sink.stop()
+        self.assertEqual(_read_events(self.path), ["b", "c"])
+
+    async def test_rotates_by_size_and_day(self) -> None:
+        sink = self._sink(max_segment_bytes=30)
+        await sink.start()
+        sink.emit({"event": "first", "pad": "x" * 20})
+        await sink.flush()
+        sink.emit({"event": "second"})
+        await sink.flush()
+        self.clock.now += 24 * 3600
+        sink.emit({"event": "third"})
+        await sink.stop()
+
+        segments = sorted((self.path.parent / "analytics").glob("*.jsonl"))
+        self.assertEqual(len(segments), 2)
+        self.assertTrue(segments[0].name.startswith("analytics-20240101-"))
+        self.assertEqual(_read_events(segments[0]), ["first"])
+        self.assertEqual(_read_events(segments[1]), ["second"])
+        self.assertEqual(_read_events(self.path), ["third"])
+
+
+if __name__ == "__main__":
+    unittest.main()
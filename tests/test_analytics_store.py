@@ -0,0 +1,103 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.analytics_store import (
+    DayFile,
+    compact_segments,
+    count_events,
+    field_distribution,
+)
+
+
+def _write_segment(path: Path, records: list[dict]) -> None:
+    with path.open("w", encoding="utf-8") as fh:
+        for record in records:
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class TestAnalyticsStore(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.segments = Path(self.tmp.name)
+        self.store = self.segments / "columnar"
+        _write_segment(
+            self.segments / "analytics-20240101-0000.jsonl",
+            [
+                {"ts": 1.0, "event": "message_bot", "user": "u1", "length": 10},
+                {"ts": 2.0, "event": "message_bot", "user": "u2", "length": 30},
+                {"ts": 3.0, "event": "crisis_detected", "user": "u1"},
+                {"ts": 4.0, "event": "topic_intent", "user": "u2", "topic": "сон"},
+            ],
+        )
+        _write_segment(
+            self.segments / "analytics-20240102-0000.jsonl",
+            [
+                {"ts": 5.0, "event": "message_bot", "user": "u1", "length": 20},
+                {"ts": 6.0, "event": "crisis_detected", "user": None},
+                "not a record",
+            ],
+        )
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_counts_come_from_rollups(self) -> None:
+        self.assertEqual(compact_segments(self.segments), ["20240101", "20240102"])
+        counts = count_events(self.store, event="crisis_detected")
+        self.assertEqual(counts, {"20240101": {"crisis_detected": 1}, "20240102": {"crisis_detected": 1}})
+        day = DayFile(self.store / "20240101.acol")
+        self.assertEqual(day.rollup["message_bot"]["users"], 2)
+        self.assertEqual(day.rollup["message_bot"]["fields"]["length"]["sum"], 40.0)
+
+    def test_distribution_and_date_range(self) -> None:
+        compact_segments(self.segments)
+        dist = field_distribution(self.store, "message_bot", "length")
+        self.assertEqual(dist.count, 3)
+        self.assertEqual(dist.p50, 20.0)
+        self.assertEqual(dist.max, 30.0)
+        only_second_day = field_distribution(self.store, "message_bot", "length", since="20240102")
+        self.assertEqual(only_second_day.count, 1)
+        self.assertIsNone(field_distribution(self.store, "reset", "length"))
+
+    def test_string_payload_is_dictionary_encoded(self) -> None:
+        compact_segments(self.segments)
+        day = DayFile(self.store / "20240101.acol")
+        meta = day.header["columns"]["payload.topic"]
+        self.assertEqual(meta["type"], "dict")
+        self.assertEqual(list(day.column("payload.topic")), [-1, -1, -1, 0])
+        self.assertEqual(meta["values"], ["сон"])
+        with self.assertRaises(ValueError):
+            field_distribution(self.store, "topic_intent", "topic")
+
+    def test_distribution_over_mixed_value_types(self) -> None:
+        _write_segment(
+            self.segments / "analytics-20240103-0000.jsonl",
+            [
+                {"ts": 8.0, "event": "message_bot", "user": "u1", "length": 12},
+                {"ts": 9.0, "event": "message_bot", "user": "u2", "length": "40"},
+                {"ts": 10.0, "event": "message_bot", "user": "u3", "length": "длинное"},
+            ],
+        )
+        compact_segments(self.segments)
+        dist = field_distribution(self.store, "message_bot", "length", since="20240103")
+        self.assertEqual((dist.count, dist.min, dist.max, dist.skipped), (2, 12.0, 40.0, 1))
+        self.assertEqual(field_distribution(self.store, "message_bot", "length").count, 5)
+
+    def test_only_changed_days_are_rebuilt(self) -> None:
+        compact_segments(self.segments)
+        self.assertEqual(compact_segments(self.segments), [])
+        _write_segment(
+            self.segments / "analytics-20240102-0001.jsonl",
+            [{"ts": 7.0, "event": "message_bot", "user": "u3", "length": 5}],
+        )
+        self.assertEqual(compact_segments(self.segments), ["20240102"])
+        self.assertEqual(count_events(self.store, event="message_bot")["20240102"], {"message_bot": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,32 @@
+import re
 import sys
 from pathlib import Path
 import unittest
 
 sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
 
-from services.crisis import detect_crisis, detect_distress
+from services.crisis import (
+    DISTRESS_PATTERNS,
+    HIGH_RISK_PATTERNS,
+    INTENSIFIERS,
+    MEDIUM_RISK_PATTERNS,
+    CrisisMatcher,
+    assess_risk,
+    detect_crisis,
+    detect_distress,
+    score_texts,
+)
+
+
+def _legacy_crisis(text: str) -> bool:
+    lowered = text.lower()
+
+    def matches(patterns: list[str]) -> bool:
+        return any(re.search(pattern, lowered) for pattern in patterns)
+
+    if matches(HIGH_RISK_PATTERNS):
+        return True
+    return matches(MEDIUM_RISK_PATTERNS) and matches(INTENSIFIERS)
 
 
 class TestCrisisDetection(unittest.TestCase):
@@ -26,5 +48,73 @@ class TestDistressDetection(unittest.TestCase):
         self.assertFalse(detect_distress("Сегодня хорошая погода."))
 
 
+class TestRiskAssessment(unittest.TestCase):
+    def test_no_match_is_none(self) -> None:
+        risk = assess_risk("Хорошая погода.")
+        self.assertEqual(risk.level, "none")
+        self.assertFalse(risk.crisis)
+        self.assertEqual(risk.matches, ())
+
+    def test_overlapping_groups_are_all_reported(self) -> None:
+        text = "Я устала жить, сегодня нет сил"
+        risk = assess_risk(text)
+        self.assertEqual(risk.level, "medium")
+        self.assertEqual(risk.groups, {"medium", "intensifier", "distress"})
+        spans = {(match.group, text[match.span[0] : match.span[1]]) for match in risk.matches}
+        self.assertIn(("medium", "устала жить"), spans)
+        self.assertIn(("distress", "устала"), spans)
+        self.assertIn(("distress", "нет сил"), spans)
+
+    def test_medium_without_intensifier_is_low(self) -> None:
+        risk = assess_risk("Хочу исчезнуть.")
+        self.assertEqual(risk.level, "low")
+        self.assertFalse(risk.crisis)
+
+    def test_intensifier_alone_is_not_searched(self) -> None:
+        risk = assess_risk("Сегодня очень плохо")
+        self.assertEqual(risk.level, "low")
+        self.assertEqual(risk.groups, {"distress"})
+
+    def test_high_risk_level(self) -> None:
+        risk = assess_risk("Думаю про самоубийство")
+        self.assertEqual(risk.level, "high")
+        self.assertTrue(risk.crisis)
+
+    def test_matches_legacy_per_pattern_search(self) -> None:
+        texts = [
+            "Хочу покончить с собой.",
+            "Нет смысла жить, сейчас все плохо.",
+            "Нет смысла жить.",
+            "Сейчас мне тревожно.",
+            "Я готовлюсь к экзамену сегодня",
+            "надоело жить, есть план",
+            "self-harm again",
+            "Мне грустно, но я держусь.",
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(detect_crisis(text), _legacy_crisis(text))
+                lowered = text.lower()
+                self.assertEqual(
+                    detect_distress(text),
+                    any(re.search(pattern, lowered) for pattern in DISTRESS_PATTERNS),
+                )
+
+
+class TestScoreTexts(unittest.TestCase):
+    TEXTS = ["хочу умереть", "привет", "устал жить сегодня", "мне плохо"] * 3
+
+    def test_streams_in_input_order(self) -> None:
+        levels = [risk.level for risk in score_texts(iter(self.TEXTS), chunk_size=5)]
+        self.assertEqual(levels, [assess_risk(text).level for text in self.TEXTS])
+
+    def test_process_pool_matches_sequential(self) -> None:
+        matcher = CrisisMatcher({"high": ["умереть"], "distress": ["плохо"]})
+        pooled = list(score_texts(self.TEXTS, matcher=matcher, chunk_size=2, processes=2))
+        sequential = list(score_texts(self.TEXTS, matcher=matcher))
+        self.assertEqual(pooled, sequential)
+        self.assertEqual(pooled[0].level, "high")
+
+
 if __name__ == "__main__":
     unittest.main()
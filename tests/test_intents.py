@@ -0,0 +1,98 @@
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.intents import IntentEngine, classify_intent, normalize_intent_text
+
+
+def _name(text: str):
+    intent = classify_intent(text)
+    return intent.name if intent else None
+
+
+class TestIntents(unittest.TestCase):
+    def test_normalize(self) -> None:
+        self.assertEqual(normalize_intent_text("  Ты   ТУТ?! "), "ты тут")
+        self.assertEqual(normalize_intent_text(""), "")
+
+    def test_presence(self) -> None:
+        self.assertEqual(_name("Ты тут?"), "presence")
+        self.assertEqual(_name("эй, бот работает вообще"), "presence")
+        self.assertEqual(_name("Алло"), "presence")
+        self.assertIsNone(_name("тест на тревожность"))
+
+    def test_capabilities(self) -> None:
+        self.assertEqual(_name("На какие темы с тобой можно говорить?"), "capabilities")
+        self.assertEqual(_name("Что ты умеешь? Можешь помочь?"), "capabilities")
+        self.assertEqual(_name("а можно поговорить на тему работы"), "capabilities")
+        self.assertIsNone(_name("что ты можешь"))
+
+    def test_topic(self) -> None:
+        intent = classify_intent("Давай поговорим о работе!")
+        self.assertEqual(intent.name, "topic")
+        self.assertEqual(intent.topic, "о работе")
+        self.assertEqual(classify_intent("Тема: выгорание").topic, "выгорание")
+        long_topic = classify_intent("тема " + "очень " * 25).topic
+        self.assertEqual(len(long_topic), 119)
+
+    def test_greeting(self) -> None:
+        self.assertEqual(classify_intent("Привет!").flags, frozenset())
+        intent = classify_intent("Привет, как дела?")
+        self.assertEqual(intent.name, "greeting")
+        self.assertEqual(intent.flags, frozenset({"small_talk"}))
+        self.assertEqual(classify_intent("Как поживаете").flags, frozenset({"small_talk"}))
+        self.assertIsNone(_name("привет, мне плохо"))
+        self.assertIsNone(_name("как"))
+
+    def test_priority(self) -> None:
+        # Presence is checked before greeting, capabilities before topic.
+        self.assertEqual(_name("привет ты тут"), "presence")
+        self.assertEqual(_name("можем поговорить на тему работы"), "capabilities")
+
+    def test_length_limits(self) -> None:
+        padding = " и ещё" * 20
+        self.assertIsNone(_name("привет" + " как" * 20))
+        self.assertIsNone(_name("ты тут" + padding))
+        self.assertEqual(_name("какие темы" + padding), "capabilities")
+
+    def test_overlapping_phrases(self) -> None:
+        engine = IntentEngine(
+            {
+                "groups": {"long": ["abcd"], "short": ["bc"], "prefix": ["ab"]},
+                "intents": [
+                    {"name": "both", "max_length": 50, "any_of": [["long", "short", "prefix"]]},
+                ],
+            }
+        )
+        self.assertEqual(engine.classify("xabcdx").name, "both")
+        self.assertIsNone(engine.classify("xabdx"))
+
+    def test_empty_topic_falls_back_to_later_patterns(self) -> None:
+        engine = IntentEngine(
+            {
+                "groups": {},
+                "intents": [
+                    {
+                        "name": "topic",
+                        "max_length": 50,
+                        "patterns": ["^тема(.*)$", "^(.+)$"],
+                        "strip": " .",
+                    },
+                ],
+            }
+        )
+        self.assertEqual(engine.classify("тема сон").topic, "сон")
+        # The first pattern leaves nothing after stripping; the second still matches.
+        self.assertEqual(engine.classify("тема").topic, "тема")
+
+    def test_topic_pattern_needs_one_group(self) -> None:
+        with self.assertRaises(ValueError):
+            IntentEngine(
+                {"groups": {}, "intents": [{"name": "t", "max_length": 10, "patterns": ["^a$"]}]}
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.llm_scheduler import LLMScheduler, Priority, TokenBucket
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_waits_for_refill(self) -> None:
+        clock = _Clock()
+        bucket = TokenBucket(60, clock)
+        bucket.consume(60)
+        self.assertAlmostEqual(bucket.wait_time(3), 3.0)
+        clock.now = 3.0
+        self.assertEqual(bucket.wait_time(3), 0.0)
+
+    def test_zero_rate_is_unlimited(self) -> None:
+        bucket = TokenBucket(0)
+        bucket.consume(10_000)
+        self.assertEqual(bucket.wait_time(10_000), 0.0)
+
+
+class TestLLMScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_priority_order_when_saturated(self) -> None:
+        scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def job(name: str, priority: Priority) -> None:
+            async with scheduler.slot(priority, 10):
+                order.append(name)
+                if name == "first":
+                    await release.wait()
+
+        first = asyncio.create_task(job("first", Priority.THERAPY))
+        await asyncio.sleep(0)
+        background = asyncio.create_task(job("summary", Priority.BACKGROUND))
+        therapy = asyncio.create_task(job("reply", Priority.THERAPY))
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.queue_depth(), 2)
+        release.set()
+        await asyncio.gather(first, background, therapy)
+        self.assertEqual(order, ["first", "reply", "summary"])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_cancelled_waiter_leaves_queue(self) -> None:
+        scheduler = LLMScheduler(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+        await scheduler.acquire(Priority.THERAPY, 1)
+        waiter = asyncio.create_task(scheduler.acquire(Priority.BACKGROUND, 1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(scheduler.queue_depth(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import gzip
+import json
+import logging
+import queue
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from utils.logger import CompressingRotatingFileHandler, JsonFormatter, _DroppingQueueHandler
+
+
+def _record(message: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.makeLogRecord(
+        {"name": "test", "levelno": level, "levelname": logging.getLevelName(level), "msg": message}
+    )
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRotatingHandler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "bot.log"
+        self.clock = FakeClock()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _handler(self, **kwargs) -> CompressingRotatingFileHandler:
+        handler = CompressingRotatingFileHandler(self.path, clock=self.clock, **kwargs)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.addCleanup(handler.close)
+        return handler
+
+    def test_rotates_by_size_into_gzip(self) -> None:
+        handler = self._handler(max_bytes=50, backup_count=10)
+        for index in range(6):
+            self.clock.now += 1
+            handler.emit(_record(f"line {index:02d} " + "x" * 10))
+        archives = handler.archives()
+        self.assertGreaterEqual(len(archives), 2)
+        with gzip.open(archives[0], "rt", encoding="utf-8") as fh:
+            self.assertTrue(fh.read().startswith("line 00"))
+        self.assertLess(self.path.stat().st_size, 50)
+
+    def test_keeps_only_backup_count(self) -> None:
+        handler = self._handler(max_bytes=10, backup_count=2)
+        for index in range(6):
+            handler.emit(_record(f"line {index:02d} xxxxxx"))
+        self.assertEqual(len(handler.archives()), 2)
+
+    def test_rotates_on_new_day(self) -> None:
+        handler = self._handler(max_bytes=0)
+        handler.emit(_record("yesterday"))
+        self.clock.now += 86400
+        handler.emit(_record("today"))
+        self.assertEqual(len(handler.archives()), 1)
+        self.assertEqual(self.path.read_text(encoding="utf-8").strip(), "today")
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_fields(self) -> None:
+        record = _record("привет", logging.WARNING)
+        record.exc_text = "Traceback"
+        payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual(payload["level"], "WARNING")
+        self.assertEqual(payload["message"], "привет")
+        self.assertEqual(payload["exc"], "Traceback")
+
+
+class TestQueueHandler(unittest.TestCase):
+    def test_drops_when_full_and_reports(self) -> None:
+        log_queue: queue.Queue = queue.Queue(1)
+        handler = _DroppingQueueHandler(log_queue)
+        handler.emit(_record("first"))
+        handler.emit(_record("second"))
+        self.assertEqual(handler.dropped, 1)
+        log_queue.get_nowait()
+        handler.emit(_record("third"))
+        self.assertIn("dropped", log_queue.get_nowait().getMessage())
+        self.assertEqual(handler.dropped, 1)
+
+    def test_prepare_renders_traceback(self) -> None:
+        handler = _DroppingQueueHandler(queue.Queue())
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.makeLogRecord(
+                {"msg": "failed %s", "args": (1,), "exc_info": sys.exc_info()}
+            )
+        prepared = handler.prepare(record)
+        self.assertEqual(prepared.msg, "failed 1")
+        self.assertIsNone(prepared.exc_info)
+        self.assertIn("ValueError: boom", prepared.exc_text)
+
+
+if __name__ == "__main__":
+    unittest.main()
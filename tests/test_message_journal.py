@@ -0,0 +1,118 @@
+import json
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.message_journal import MessageJournal
+
+
+def _row(row_id: str, user_id: int = 1) -> dict:
+    return {"id": row_id, "user_id": user_id, "role": "user", "content": row_id}
+
+
+class TestMessageJournal(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.batches: list[list[dict]] = []
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "journal.jsonl"
+
+    async def asyncTearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def _writer(self, rows: list[dict]) -> None:
+        self.batches.append(list(rows))
+
+    async def test_flush_writes_in_batches(self) -> None:
+        journal = MessageJournal(self.path, max_batch_rows=2, flush_interval_ms=60_000)
+        await journal.start(self._writer)
+        for idx in range(5):
+            journal.append(_row(str(idx)))
+        await journal.flush()
+        await journal.stop()
+        self.assertEqual([len(batch) for batch in self.batches], [2, 2, 1])
+        self.assertEqual(self.path.read_text(encoding="utf-8"), "")
+
+    async def test_replays_unflushed_rows(self) -> None:
+        journal = MessageJournal(self.path, flush_interval_ms=60_000)
+
+        async def failing_writer(rows: list[dict]) -> None:
+            raise ConnectionError("offline")
+
+        await journal.start(failing_writer)
+        journal.append(_row("a"))
+        journal.append(_row("b"))
+        await journal.stop()
+
+        restarted = MessageJournal(self.path, flush_interval_ms=60_000)
+        await restarted.start(self._writer)
+        await restarted.flush()
+        await restarted.stop()
+        self.assertEqual([row["id"] for row in self.batches[0]], ["a", "b"])
+
+    async def test_rejected_row_does_not_block_queue(self) -> None:
+        journal = MessageJournal(flush_interval_ms=60_000)
+
+        async def picky_writer(rows: list[dict]) -> None:
+            if any(row["user_id"] == 2 for row in rows):
+                raise ValueError("foreign key violation")
+            self.batches.append(list(rows))
+
+        await journal.start(picky_writer)
+        journal.append(_row("a"))
+        journal.append(_row("b", user_id=2))
+        await journal.flush()
+        await journal.stop()
+        self.assertEqual(journal.pending_count, 0)
+        self.assertEqual([row["id"] for row in self.batches[0]], ["a"])
+
+    async def test_poison_row_moves_to_dead_letter_file(self) -> None:
+        clock = [0.0]
+        journal = MessageJournal(
+            self.path,
+            flush_interval_ms=60_000,
+            max_row_attempts=3,
+            clock=lambda: clock[0],
+        )
+
+        async def rejecting_writer(rows: list[dict]) -> None:
+            raise ValueError("check constraint violation")
+
+        await journal.start(rejecting_writer)
+        journal.append(_row("bad"))
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                await journal.flush()
+            # Retries within the spacing window are not extra attempts.
+            with self.assertRaises(ValueError):
+                await journal.flush()
+            clock[0] += 60.0
+        self.assertTrue(journal.has_pending(1))
+        with self.assertRaises(ValueError), self.assertLogs("services.message_journal", "ERROR"):
+            await journal.flush()
+        self.assertFalse(journal.has_pending(1))
+        await journal.flush()
+        await journal.stop()
+        dead_path = self.path.with_name("message_journal.dead.jsonl")
+        dead = [json.loads(line) for line in dead_path.read_text(encoding="utf-8").splitlines()]
+        self.assertEqual([row["id"] for row in dead], ["bad"])
+        self.assertEqual(self.path.read_text(encoding="utf-8"), "")
+
+    async def test_appends_reach_file_before_flush(self) -> None:
+        journal = MessageJournal(self.path, flush_interval_ms=60_000)
+        await journal.start(self._writer)
+        journal.append(_row("a"))
+        journal.append(_row("b"))
+        await journal._run_io(journal._sync_file)
+        lines = self.path.read_text(encoding="utf-8").splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], ["a", "b"])
+        journal.discard_user(1)
+        await journal.stop()
+        self.assertEqual(self.path.read_text(encoding="utf-8"), "")
+        self.assertEqual(self.batches, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
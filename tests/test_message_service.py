@@ -0,0 +1,122 @@
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from fake_db import FakeClient, FakeResponse, install, user_row
+from services import message_service, user_service
+from services.message_journal import get_message_journal
+from services.message_service import _ingest_payload, ingest_user_message
+from services.user_cache import get_user_cache
+
+
+async def _run_inline(query, *args):
+    """Stub for run_db: runs the query on the loop instead of the executor."""
+    return query(*args)
+
+
+def _message_row(row_id: str, content: str, created_at: str) -> dict:
+    return {"id": row_id, "user_id": 1, "role": "user", "content": content, "created_at": created_at}
+
+
+class TestIngestUserMessage(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.saved_run_db = (message_service.run_db, user_service.run_db)
+        message_service.run_db = user_service.run_db = _run_inline
+        self.client = FakeClient()
+        self.client.tables["users"] = [user_row(1, messages_since_summary=2)]
+        self.client.tables["messages"] = [
+            _message_row("m1", "раньше", "2024-01-01T10:00:00+00:00"),
+        ]
+        install(self.client)
+
+    async def asyncTearDown(self) -> None:
+        message_service.run_db, user_service.run_db = self.saved_run_db
+
+    async def test_unwraps_result_row(self) -> None:
+        def ingest(params: dict) -> list:
+            self.assertEqual(params["user_id_param"], 1)
+            self.assertEqual(params["history_limit_param"], 5)
+            result = {
+                "user": user_row(1, messages_since_summary=3, distress_streak=3),
+                "history": list(self.client.tables["messages"]),
+                "should_offer_support": True,
+            }
+            return [{"result": result}]
+
+        self.client.rpcs["ingest_user_message"] = ingest
+        result = await ingest_user_message(1, "  новое  ", history_limit=5, is_distress=True)
+
+        self.assertEqual(self.client.calls, ["rpc ingest_user_message"])
+        self.assertEqual(result.user.messages_since_summary, 3)
+        self.assertEqual([message.content for message in result.history], ["раньше"])
+        self.assertTrue(result.should_offer_support)
+        self.assertEqual(get_user_cache().get(1).distress_streak, 3)
+
+    async def test_journal_failure_does_not_fail_ingest(self) -> None:
+        async def offline_writer(rows: list) -> None:
+            raise ConnectionError("offline")
+
+        journal = get_message_journal()
+        await journal.start(offline_writer)
+        message_service.add_message(1, "assistant", "прошлый ответ")
+        self.client.rpcs["ingest_user_message"] = lambda params: [
+            {"result": {"user": user_row(1), "history": []}}
+        ]
+        with self.assertLogs("services.message_service", "WARNING"):
+            result = await ingest_user_message(1, "новое", history_limit=5)
+        self.assertEqual(result.user.id, 1)
+        # The reply stays queued for the journal's own retries.
+        self.assertTrue(journal.has_pending(1))
+        with self.assertLogs(level="ERROR"):
+            await journal.stop()
+
+    def test_payload_shapes(self) -> None:
+        result = {"user": user_row(1), "history": []}
+        for data in ([{"result": result}], result, [result]):
+            with self.subTest(data=data):
+                self.assertEqual(_ingest_payload(FakeResponse(data)), result)
+        for data in ([], None, [{"result": None}], {"history": []}):
+            with self.subTest(data=data), self.assertRaises(RuntimeError):
+                _ingest_payload(FakeResponse(data))
+
+    async def test_falls_back_to_separate_queries_when_rpc_fails(self) -> None:
+        # No ingest_user_message registered: the RPC call raises.
+        def increment(params: dict) -> None:
+            row = self.client.user(params["user_id_param"])
+            row["messages_since_summary"] += 1
+
+        self.client.rpcs["increment_messages_counter"] = increment
+        with self.assertLogs("services.message_service", "WARNING"):
+            result = await ingest_user_message(1, "новое", history_limit=5, is_distress=True)
+
+        self.assertEqual(
+            self.client.calls,
+            [
+                "rpc ingest_user_message",
+                "select users",
+                "select messages",
+                "rpc increment_messages_counter",
+                "update users",
+            ],
+        )
+        self.assertEqual([message.content for message in result.history], ["раньше"])
+        self.assertEqual(result.user.messages_since_summary, 3)
+        self.assertEqual(result.user.distress_streak, 1)
+        self.assertFalse(result.should_offer_support)
+        # The message itself goes through the journal.
+        self.assertTrue(get_message_journal().has_pending(1))
+
+    async def test_falls_back_when_rpc_returns_no_user(self) -> None:
+        self.client.rpcs["ingest_user_message"] = lambda params: []
+        self.client.rpcs["increment_messages_counter"] = lambda params: None
+        with self.assertLogs("services.message_service", "WARNING"):
+            result = await ingest_user_message(1, "новое", history_limit=5)
+        self.assertIn("select users", self.client.calls)
+        self.assertEqual(result.user.id, 1)
+        self.assertNotIn("update users", self.client.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
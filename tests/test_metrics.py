@@ -0,0 +1,82 @@
+import asyncio
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.metrics import Histogram, Metrics
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestHistogram(unittest.TestCase):
+    def test_buckets_and_quantiles(self) -> None:
+        histogram = Histogram((0.1, 1.0, 10.0))
+        for value in (0.05, 0.5, 0.5, 5.0, 50.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.counts, [1, 2, 1, 1])
+        self.assertEqual(histogram.count, 5)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.775)
+        self.assertEqual(histogram.quantile(1.0), 10.0)
+        self.assertIsNone(Histogram().quantile(0.5))
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.metrics = Metrics(slow_seconds=1.0, clock=self.clock)
+
+    def test_span_records_and_counts_errors(self) -> None:
+        with self.metrics.span("db"):
+            self.clock.now += 0.2
+        with self.assertRaises(RuntimeError):
+            with self.metrics.span("db"):
+                raise RuntimeError("boom")
+        histogram = self.metrics.histogram("db")
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.errors, 1)
+        self.assertAlmostEqual(histogram.sum, 0.2)
+
+    def test_trace_logs_slow_breakdown(self) -> None:
+        async def handle() -> None:
+            async with self.metrics.trace("message.text"):
+                async with self.metrics.span("llm.request"):
+                    self.clock.now += 1.5
+                with self.metrics.trace("nested"):
+                    pass
+
+        with self.assertLogs("services.metrics", level="INFO") as logs:
+            asyncio.run(handle())
+        self.assertIn("llm.request 1.50s", logs.output[0])
+        self.assertIn("nested", logs.output[0])
+        self.assertEqual(self.metrics.histogram("message.text").count, 1)
+
+    def test_disabled_records_nothing(self) -> None:
+        metrics = Metrics(enabled=False, clock=self.clock)
+        with metrics.span("db"):
+            pass
+        metrics.observe_since("llm.queue", metrics.now())
+        self.assertEqual(metrics.snapshot()["stages"], {})
+
+    def test_snapshot_includes_sources(self) -> None:
+        self.metrics.add_source("llm_scheduler", lambda: {"in_flight": 2})
+        self.assertEqual(self.metrics.snapshot()["llm_scheduler"], {"in_flight": 2})
+
+    def test_prometheus_text(self) -> None:
+        self.metrics.observe("tg.send", 0.3)
+        text = self.metrics.render_prometheus()
+        self.assertIn('bot_stage_seconds_bucket{stage="tg.send",le="0.5"} 1', text)
+        self.assertIn('bot_stage_seconds_bucket{stage="tg.send",le="0.25"} 0', text)
+        self.assertIn('bot_stage_seconds_count{stage="tg.send"} 1', text)
+        self.assertIn('bot_stage_errors_total{stage="tg.send"} 0', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
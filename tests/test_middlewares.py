@@ -0,0 +1,149 @@
+import asyncio
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from aiogram.methods import SendMessage
+from aiogram.types import Chat, Message, Update, User, Voice
+
+from bot.keyboards import MAIN_MENU_HELP
+from bot.middlewares import RATE_LIMIT_TEXT, RateLimitMiddleware, UserSerialMiddleware
+from services import memory, rate_limiter, user_locks, user_service
+from services.memory import MemoryStore
+from services.rate_limiter import RateLimiter
+from services.user_locks import UserLocks
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _FakeBot:
+    """Records sent texts instead of calling Telegram."""
+
+    def __init__(self) -> None:
+        self.sent: List[str] = []
+
+    async def __call__(self, method: Any, request_timeout: Optional[int] = None) -> Message:
+        assert isinstance(method, SendMessage)
+        self.sent.append(method.text)
+        return _message(method.chat_id, method.text, message_id=1000 + len(self.sent))
+
+
+def _message(user_id: int, text: Optional[str], *, message_id: int = 1, voice: bool = False) -> Message:
+    return Message(
+        message_id=message_id,
+        date=datetime.now(timezone.utc),
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="Тест"),
+        text=text,
+        voice=Voice(file_id="v", file_unique_id="v", duration=3) if voice else None,
+    )
+
+
+def _update(bot: _FakeBot, user_id: int, text: Optional[str], *, voice: bool = False) -> Update:
+    message = _message(user_id, text, voice=voice).as_(bot)
+    return Update(update_id=1, message=message)
+
+
+def _data(update: Update) -> Dict[str, Any]:
+    return {"event_from_user": update.message.from_user}
+
+
+class TestRateLimitMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.saved = (rate_limiter._limiter, memory._store)
+        self.clock = _Clock()
+        rate_limiter._limiter = RateLimiter(interval_seconds=1.0, burst=2, clock=self.clock)
+        memory._store = MemoryStore(path=Path(self.tmp.name) / "memory.json")
+        user_service._pending_activity.clear()
+        self.bot = _FakeBot()
+        self.middleware = RateLimitMiddleware()
+        self.handled: List[str] = []
+
+    async def asyncTearDown(self) -> None:
+        rate_limiter._limiter, memory._store = self.saved
+        user_service._pending_activity.clear()
+        self.tmp.cleanup()
+
+    async def _handler(self, event: Update, data: Dict[str, Any]) -> str:
+        self.handled.append(event.message.text or "voice")
+        return "handled"
+
+    async def _send(self, user_id: int, text: Optional[str], *, voice: bool = False) -> Any:
+        update = _update(self.bot, user_id, text, voice=voice)
+        return await self.middleware(self._handler, update, _data(update))
+
+    async def test_flood_is_dropped_with_one_warning(self) -> None:
+        results = [await self._send(1, f"сообщение {idx}") for idx in range(5)]
+        self.assertEqual(results, ["handled", "handled", None, None, None])
+        self.assertEqual(self.handled, ["сообщение 0", "сообщение 1"])
+        self.assertEqual(self.bot.sent, [RATE_LIMIT_TEXT])
+
+        # After a refill the next flood is warned about again.
+        self.clock.now += 1.0
+        await self._send(1, "снова")
+        await self._send(1, "и снова")
+        self.assertEqual(self.bot.sent, [RATE_LIMIT_TEXT, RATE_LIMIT_TEXT])
+
+    async def test_voice_is_limited_but_commands_and_menu_are_not(self) -> None:
+        await self._send(1, None, voice=True)
+        await self._send(1, None, voice=True)
+        self.assertIsNone(await self._send(1, None, voice=True))
+        self.assertEqual(await self._send(1, "/start"), "handled")
+        self.assertEqual(await self._send(1, MAIN_MENU_HELP), "handled")
+
+    async def test_accepted_messages_mark_user_active(self) -> None:
+        await self._send(1, "привет")
+        self.assertIn(1, user_service._pending_activity)
+        await self._send(2, "/start")
+        self.assertNotIn(2, user_service._pending_activity)
+
+    async def test_other_users_are_not_limited(self) -> None:
+        for _ in range(3):
+            await self._send(1, "много")
+        self.assertEqual(await self._send(2, "привет"), "handled")
+
+
+class TestUserSerialMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.saved = user_locks._locks
+        user_locks._locks = UserLocks()
+        self.bot = _FakeBot()
+        self.middleware = UserSerialMiddleware()
+        self.log: List[str] = []
+
+    async def asyncTearDown(self) -> None:
+        user_locks._locks = self.saved
+
+    async def _handler(self, event: Update, data: Dict[str, Any]) -> None:
+        self.log.append(f"start {event.message.text}")
+        await asyncio.sleep(0.01)
+        self.log.append(f"end {event.message.text}")
+
+    async def _handle(self, user_id: int, text: str) -> None:
+        update = _update(self.bot, user_id, text)
+        await self.middleware(self._handler, update, _data(update))
+
+    async def test_same_user_is_serialized(self) -> None:
+        await asyncio.gather(self._handle(1, "a"), self._handle(1, "b"))
+        self.assertEqual(self.log, ["start a", "end a", "start b", "end b"])
+        self.assertEqual(len(user_locks._locks), 0)
+
+    async def test_different_users_run_concurrently(self) -> None:
+        await asyncio.gather(self._handle(1, "a"), self._handle(2, "b"))
+        self.assertEqual(self.log[:2], ["start a", "start b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
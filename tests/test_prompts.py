@@ -0,0 +1,123 @@
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.prompts import build_therapy_prompt, fit_therapy_prompt
+from services.tokens import estimate_tokens, fit_to_tokens, truncate_to_tokens
+
+
+def _history(count: int, words: int = 20) -> list[dict]:
+    return [
+        {
+            "role": "user" if idx % 2 == 0 else "assistant",
+            "content": " ".join([f"реплика{idx}"] * words),
+        }
+        for idx in range(count)
+    ]
+
+
+def _fit(**overrides):
+    kwargs = dict(
+        context="",
+        summary="",
+        history=[],
+        user_text="Мне тревожно перед экзаменом.",
+        focus="общее",
+        session_goal="",
+        last_outcome="",
+        profile="",
+    )
+    kwargs.update(overrides)
+    return fit_therapy_prompt(**kwargs)
+
+
+class TestTokenEstimate(unittest.TestCase):
+    def test_counts_words_and_punctuation(self) -> None:
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("да, нет"), 3)
+        self.assertGreater(estimate_tokens("переживание"), estimate_tokens("feeling"))
+
+    def test_truncate_respects_limit(self) -> None:
+        text = " ".join(["слово"] * 100)
+        cut = truncate_to_tokens(text, 20)
+        self.assertLessEqual(estimate_tokens(cut), 20)
+        self.assertTrue(cut.endswith("..."))
+        self.assertEqual(truncate_to_tokens("коротко", 20), "коротко")
+
+    def test_fit_reports_tokens_of_result(self) -> None:
+        text = "Сон, тревога и работа: " * 40
+        for max_tokens in (0, 3, 4, 10, 57, estimate_tokens(text), 1000):
+            with self.subTest(max_tokens=max_tokens):
+                fitted, tokens = fit_to_tokens(text, max_tokens)
+                self.assertEqual(tokens, estimate_tokens(fitted))
+                self.assertLessEqual(tokens, max_tokens)
+        self.assertEqual(fit_to_tokens(text, estimate_tokens(text)), (text, estimate_tokens(text)))
+
+
+class TestTherapyPromptBudget(unittest.TestCase):
+    def test_small_prompt_is_unchanged(self) -> None:
+        prompt = _fit(summary="Говорили о сне.", history=_history(2, words=3))
+        self.assertFalse(prompt.trimmed)
+        self.assertEqual(prompt.history_items, 2)
+        self.assertEqual(prompt.tokens, estimate_tokens(prompt.text))
+        self.assertTrue(prompt.text.endswith("Сообщение пользователя: Мне тревожно перед экзаменом.\nОтвет:"))
+
+    def test_fits_budget_and_drops_oldest_history_first(self) -> None:
+        history = _history(10)
+        prompt = _fit(
+            summary="резюме " * 300,
+            profile="О себе: " + "текст " * 800,
+            history=history,
+            budget=400,
+        )
+        self.assertLessEqual(estimate_tokens(prompt.text), 400)
+        self.assertTrue(prompt.trimmed)
+        self.assertGreater(prompt.history_dropped, 0)
+        self.assertIn("реплика9", prompt.text)
+        self.assertIn("реплика8", prompt.text)
+        self.assertNotIn("реплика0 ", prompt.text)
+        self.assertIn("Мне тревожно перед экзаменом.", prompt.text)
+
+    def test_trimmed_prompt_counts_its_own_tokens(self) -> None:
+        prompt = _fit(summary="резюме " * 300, history=_history(6), user_text="слово " * 400, budget=300)
+        self.assertTrue(prompt.trimmed)
+        self.assertEqual(prompt.tokens, estimate_tokens(prompt.text))
+
+    def test_newest_turns_win_over_profile(self) -> None:
+        prompt = _fit(profile="текст " * 800, history=_history(4, words=8), budget=150)
+        self.assertEqual(prompt.history_items, 2)
+        self.assertLessEqual(estimate_tokens(prompt.text), 150)
+
+    def test_build_therapy_prompt_returns_text(self) -> None:
+        text = build_therapy_prompt(
+            context="",
+            summary="",
+            history=[],
+            user_text="Привет",
+            focus="сон",
+            session_goal="",
+            last_outcome="",
+        )
+        self.assertEqual(text, "Тема: сон\nСообщение пользователя: Привет\nОтвет:")
+
+    def test_build_matches_fit_with_and_without_trimming(self) -> None:
+        for summary in ("Говорили о сне.", "резюме " * 300):
+            kwargs = dict(
+                context="Контекст из базы.",
+                summary=summary,
+                user_text="Привет",
+                focus="сон",
+                session_goal="уснуть",
+                last_outcome="",
+                profile="Студент.",
+            )
+            with self.subTest(trimmed=len(summary) > 100):
+                # History passed as an iterator is read only once.
+                text = build_therapy_prompt(history=iter(_history(3)), **kwargs)
+                self.assertEqual(text, fit_therapy_prompt(history=_history(3), **kwargs).text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.rate_limiter import RateLimiter
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(interval_seconds=1.0, burst=3, clock=self.clock)
+
+    def test_burst_then_reject(self) -> None:
+        self.assertEqual([self.limiter.allow(1) for _ in range(4)], [True, True, True, False])
+        self.assertTrue(self.limiter.allow(2))
+
+    def test_refill(self) -> None:
+        for _ in range(3):
+            self.limiter.allow(1)
+        self.clock.now = 0.5
+        self.assertFalse(self.limiter.allow(1))
+        self.clock.now = 1.0
+        self.assertTrue(self.limiter.allow(1))
+        self.assertFalse(self.limiter.allow(1))
+
+    def test_warning_once_per_streak(self) -> None:
+        for _ in range(3):
+            self.limiter.allow(1)
+        self.assertFalse(self.limiter.allow(1))
+        self.assertTrue(self.limiter.take_warning(1))
+        self.assertFalse(self.limiter.allow(1))
+        self.assertFalse(self.limiter.take_warning(1))
+        self.clock.now = 1.0
+        self.assertTrue(self.limiter.allow(1))
+        self.assertFalse(self.limiter.allow(1))
+        self.assertTrue(self.limiter.take_warning(1))
+
+    def test_sweep_drops_refilled_buckets(self) -> None:
+        self.limiter.allow(1)
+        self.clock.now = 2.0
+        self.limiter.allow(2)
+        self.clock.now = 3.0
+        self.limiter.sweep()
+        self.assertEqual(len(self.limiter), 1)
+
+    def test_max_users(self) -> None:
+        limiter = RateLimiter(burst=1, max_users=2, clock=self.clock)
+        for user_id in (1, 2, 3):
+            limiter.allow(user_id)
+        self.assertEqual(len(limiter), 2)
+        # User 1 was evicted, so it starts with a full bucket again.
+        self.assertTrue(limiter.allow(1))
+        self.assertFalse(limiter.allow(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional, Set
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from aiogram.exceptions import TelegramBadRequest
+
+from services import llm, llm_scheduler
+from services.llm_scheduler import LLMScheduler
+from services.messages import STREAM_PLACEHOLDER, send_streaming_message
+from services.tokens import estimate_tokens
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _SentMessage:
+    def __init__(self, chat: "_IncomingMessage", message_id: int) -> None:
+        self.chat = chat
+        self.message_id = message_id
+
+    async def edit_text(self, text: str) -> None:
+        if text in self.chat.rejected_edits:
+            raise TelegramBadRequest(method=None, message="message to edit not found")
+        self.chat.edits.append(text)
+
+
+class _IncomingMessage:
+    """The user's message; records what the bot answers and edits."""
+
+    from_user = None
+
+    def __init__(self) -> None:
+        self.answers: List[str] = []
+        self.edits: List[str] = []
+        self.rejected_edits: Set[str] = set()
+
+    async def answer(self, text: str, **kwargs) -> _SentMessage:
+        self.answers.append(text)
+        return _SentMessage(self, len(self.answers))
+
+
+class _Chunks:
+    """Async chunk iterator that moves the clock before each chunk."""
+
+    def __init__(self, clock: _Clock, steps: List[tuple]) -> None:
+        self.clock = clock
+        self.steps = list(steps)
+        self.closed = False
+
+    def __aiter__(self) -> "_Chunks":
+        return self
+
+    async def __anext__(self) -> str:
+        if not self.steps:
+            raise StopAsyncIteration
+        at, chunk = self.steps.pop(0)
+        self.clock.now = at
+        return chunk
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class TestSendStreamingMessage(unittest.IsolatedAsyncioTestCase):
+    async def test_edits_are_throttled_by_time_and_new_text(self) -> None:
+        clock = _Clock()
+        incoming = _IncomingMessage()
+        chunks = _Chunks(
+            clock,
+            [
+                (100.0, "а" * 10),  # replaces the placeholder at once
+                (100.5, "б" * 30),  # too soon after the last edit
+                (101.3, "в" * 5),  # 35 new characters: edited
+                (102.6, "г" * 10),  # late enough, but only 10 new characters
+            ],
+        )
+        sent, text = await send_streaming_message(incoming, chunks, track=False, clock=clock)
+        full = "а" * 10 + "б" * 30 + "в" * 5 + "г" * 10
+        self.assertEqual(incoming.answers, [STREAM_PLACEHOLDER])
+        self.assertEqual(incoming.edits, ["а" * 10, full[:45], full])
+        self.assertEqual(text, full)
+        self.assertEqual(sent.message_id, 1)
+        self.assertTrue(chunks.closed)
+
+    async def test_failed_final_edit_sends_new_message(self) -> None:
+        clock = _Clock()
+        incoming = _IncomingMessage()
+        incoming.rejected_edits.add("Готово.")
+        chunks = _Chunks(clock, [(100.0, "Готово")])
+        sent, text = await send_streaming_message(
+            incoming, chunks, track=False, clock=clock, finalize=lambda raw: raw + "."
+        )
+        self.assertEqual(incoming.edits, ["Готово"])
+        self.assertEqual(incoming.answers, [STREAM_PLACEHOLDER, "Готово."])
+        self.assertEqual(sent.message_id, 2)
+        self.assertEqual(text, "Готово.")
+
+    async def test_closes_chunks_when_sending_fails(self) -> None:
+        clock = _Clock()
+        chunks = _Chunks(clock, [(100.0, "текст")])
+
+        class _Offline(_IncomingMessage):
+            async def answer(self, text: str, **kwargs) -> _SentMessage:
+                raise ConnectionError("offline")
+
+        with self.assertRaises(ConnectionError):
+            await send_streaming_message(_Offline(), chunks, track=False, clock=clock)
+        self.assertTrue(chunks.closed)
+
+
+def _chunk(content: Optional[str], total_tokens: Optional[int] = None) -> SimpleNamespace:
+    usage = SimpleNamespace(total_tokens=total_tokens) if total_tokens is not None else None
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class _GroqStream:
+    """Yields scripted chunks; a float in the script stalls for that long."""
+
+    def __init__(self, script: list) -> None:
+        self.script = list(script)
+
+    def __aiter__(self) -> "_GroqStream":
+        return self
+
+    async def __anext__(self) -> SimpleNamespace:
+        while self.script:
+            item = self.script.pop(0)
+            if isinstance(item, float):
+                await asyncio.sleep(item)
+                continue
+            return item
+        raise StopAsyncIteration
+
+
+class _FakeGroq:
+    def __init__(self, script: list) -> None:
+        self.script = script
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs) -> _GroqStream:
+        return _GroqStream(self.script)
+
+
+class _RecordingScheduler(LLMScheduler):
+    def __init__(self) -> None:
+        super().__init__(max_concurrency=1, requests_per_minute=0, tokens_per_minute=0)
+        self.settled: List[tuple] = []
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        self.settled.append((estimated_tokens, actual_tokens))
+        super().settle(estimated_tokens, actual_tokens)
+
+
+def _stream(prompt: str):
+    return llm.stream_response(prompt=prompt, system_prompt="Ты помощник.")
+
+
+class TestStreamResponse(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.saved = (llm._client, llm_scheduler._scheduler, llm.REQUEST_TIMEOUT_SECONDS, llm.MAX_RETRIES)
+        self.scheduler = _RecordingScheduler()
+        llm_scheduler._scheduler = self.scheduler
+
+    async def asyncTearDown(self) -> None:
+        llm._client, llm_scheduler._scheduler, llm.REQUEST_TIMEOUT_SECONDS, llm.MAX_RETRIES = self.saved
+
+    async def test_settles_when_consumer_closes_early(self) -> None:
+        llm._client = _FakeGroq([_chunk("Первый "), _chunk("второй"), _chunk(None, total_tokens=50)])
+        stream = _stream("вопрос")
+        first = await stream.__anext__()
+        self.assertEqual(self.scheduler.settled, [])
+        await stream.aclose()
+
+        self.assertEqual(len(self.scheduler.settled), 1)
+        estimated, actual = self.scheduler.settled[0]
+        prompt_tokens = estimated - 512
+        self.assertEqual(actual, prompt_tokens + estimate_tokens(first))
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+    async def test_settles_with_reported_usage(self) -> None:
+        llm._client = _FakeGroq([_chunk("Ответ"), _chunk(None, total_tokens=50)])
+        deltas = [delta async for delta in _stream("вопрос")]
+        self.assertEqual(deltas, ["Ответ"])
+        self.assertEqual([actual for _, actual in self.scheduler.settled], [50])
+
+    async def test_timeout_bounds_each_chunk_not_the_whole_stream(self) -> None:
+        llm.REQUEST_TIMEOUT_SECONDS = 0.05
+        llm._client = _FakeGroq([_chunk("раз "), _chunk("два "), _chunk("три")])
+        deltas = []
+        async for delta in _stream("вопрос"):
+            deltas.append(delta)
+            # The consumer's own pauses do not count against the timeout.
+            await asyncio.sleep(0.08)
+        self.assertEqual(deltas, ["раз ", "два ", "три"])
+
+    async def test_stalled_chunk_keeps_what_was_produced(self) -> None:
+        llm.REQUEST_TIMEOUT_SECONDS = 0.05
+        llm._client = _FakeGroq([_chunk("Начало"), 1.0, _chunk("потеряно")])
+        with self.assertLogs(level="ERROR"):
+            deltas = [delta async for delta in _stream("вопрос")]
+        self.assertEqual(deltas, ["Начало"])
+        self.assertEqual(len(self.scheduler.settled), 1)
+
+    async def test_stall_before_first_chunk_falls_back(self) -> None:
+        llm.REQUEST_TIMEOUT_SECONDS = 0.05
+        llm.MAX_RETRIES = 0
+        llm._client = _FakeGroq([1.0, _chunk("поздно")])
+        with self.assertLogs(level="ERROR"):
+            deltas = [delta async for delta in _stream("вопрос")]
+        self.assertEqual(deltas, [llm.TECHNICAL_ERROR_TEXT])
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
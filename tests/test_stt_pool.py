@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import threading
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services import stt
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "fork start method is POSIX only")
+class TestPoolContext(unittest.TestCase):
+    def setUp(self) -> None:
+        self._saved = os.environ.pop("STT_START_METHOD", None)
+
+    def tearDown(self) -> None:
+        if self._saved is not None:
+            os.environ["STT_START_METHOD"] = self._saved
+
+    def test_forks_without_threads_only(self) -> None:
+        if threading.active_count() == 1:
+            self.assertEqual(stt._pool_context().get_start_method(), "fork")
+        release = threading.Event()
+        helper = threading.Thread(target=release.wait)
+        helper.start()
+        try:
+            with self.assertLogs(level="WARNING"):
+                method = stt._pool_context().get_start_method()
+        finally:
+            release.set()
+            helper.join()
+        self.assertIn(method, {"forkserver", "spawn"})
+
+    def test_explicit_spawn_is_kept(self) -> None:
+        os.environ["STT_START_METHOD"] = "spawn"
+        self.assertEqual(stt._pool_context().get_start_method(), "spawn")
+
+
+# Stand-ins for ffmpeg: one echoes its input, the other never stops writing.
+_ECHO = "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())"
+_ENDLESS = "import sys\nwhile True: sys.stdout.buffer.write(bytes(65536))"
+
+
+async def _chunks(data: bytes, *, stall: bool = False):
+    yield data
+    if stall:
+        # The download never finishes.
+        await asyncio.Event().wait()
+
+
+class TestDecodeToPcm(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self._saved = (stt.FFMPEG_COMMAND, os.environ.pop("STT_MAX_AUDIO_SECONDS", None))
+        os.environ["STT_MAX_AUDIO_SECONDS"] = "1"
+
+    def tearDown(self) -> None:
+        stt.FFMPEG_COMMAND, saved_limit = self._saved
+        os.environ.pop("STT_MAX_AUDIO_SECONDS", None)
+        if saved_limit is not None:
+            os.environ["STT_MAX_AUDIO_SECONDS"] = saved_limit
+
+    async def test_returns_decoded_audio(self) -> None:
+        stt.FFMPEG_COMMAND = (sys.executable, "-c", _ECHO)
+        pcm = await stt._decode_to_pcm(_chunks(b"\x01" * 1000))
+        self.assertEqual(pcm, b"\x01" * 1000)
+
+    async def test_kills_decoder_past_the_limit(self) -> None:
+        stt.FFMPEG_COMMAND = (sys.executable, "-c", _ENDLESS)
+        with self.assertRaises(stt.SttTooLongError):
+            await asyncio.wait_for(stt._decode_to_pcm(_chunks(b"x", stall=True)), timeout=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.summary_queue import SummaryQueue
+
+
+class TestSummaryQueue(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "queue.json"
+        self.done: list[int] = []
+
+    async def asyncTearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def _job(self, user_id: int) -> None:
+        await asyncio.sleep(0)
+        self.done.append(user_id)
+
+    async def test_duplicates_are_collapsed(self) -> None:
+        queue = SummaryQueue(self.path, workers=2)
+        for user_id in (1, 1, 2, 1):
+            queue.enqueue(user_id)
+        await queue.start(self._job)
+        await queue.join()
+        await queue.stop()
+        self.assertEqual(sorted(self.done), [1, 2])
+        self.assertEqual(json.loads(self.path.read_text()), [])
+
+    async def test_user_is_never_summarized_concurrently(self) -> None:
+        running: set[int] = set()
+        overlaps: list[int] = []
+        release = asyncio.Event()
+
+        async def job(user_id: int) -> None:
+            if user_id in running:
+                overlaps.append(user_id)
+            running.add(user_id)
+            await release.wait()
+            running.discard(user_id)
+            self.done.append(user_id)
+
+        queue = SummaryQueue(self.path, workers=3)
+        await queue.start(job)
+        queue.enqueue(7)
+        await asyncio.sleep(0)
+        queue.enqueue(7)
+        await asyncio.sleep(0)
+        release.set()
+        await queue.join()
+        await queue.stop()
+        self.assertEqual(overlaps, [])
+        self.assertEqual(self.done, [7, 7])
+
+    async def test_pending_jobs_survive_restart(self) -> None:
+        started = asyncio.Event()
+
+        async def stuck_job(user_id: int) -> None:
+            started.set()
+            await asyncio.Event().wait()
+
+        queue = SummaryQueue(self.path, workers=1)
+        queue.enqueue(1)
+        queue.enqueue(2)
+        await queue.start(stuck_job)
+        await started.wait()
+        await queue.stop()
+        self.assertEqual(json.loads(self.path.read_text()), [1, 2])
+
+        restarted = SummaryQueue(self.path, workers=1)
+        await restarted.start(self._job)
+        await restarted.join()
+        await restarted.stop()
+        self.assertEqual(sorted(self.done), [1, 2])
+
+    async def test_failed_job_does_not_stop_worker(self) -> None:
+        async def job(user_id: int) -> None:
+            if user_id == 1:
+                raise RuntimeError("boom")
+            self.done.append(user_id)
+
+        queue = SummaryQueue(None, workers=1)
+        await queue.start(job)
+        with self.assertLogs(level="ERROR"):
+            queue.enqueue(1)
+            queue.enqueue(2)
+            await queue.join()
+        await queue.stop()
+        self.assertEqual(self.done, [2])
+        self.assertEqual(queue.pending_count, 0)
+
+    async def test_discarded_job_does_not_run(self) -> None:
+        queue = SummaryQueue(self.path, workers=1)
+        queue.enqueue(1)
+        queue.enqueue(2)
+        queue.discard(1)
+        await queue.start(self._job)
+        await queue.join()
+        await queue.stop()
+        self.assertEqual(self.done, [2])
+        self.assertEqual(json.loads(self.path.read_text()), [])
+
+    async def test_burst_of_changes_is_saved_once(self) -> None:
+        writes: list[list[int]] = []
+        queue = SummaryQueue(self.path, workers=1)
+        queue._write_file = writes.append  # type: ignore[method-assign]
+        for user_id in range(5):
+            queue.enqueue(user_id)
+        await queue.stop()
+        # The burst and the final save from stop() share one write.
+        self.assertEqual(writes, [[0, 1, 2, 3, 4]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.support_pool import FALLBACK_TEXTS, SupportPool
+
+
+class CountingPool(SupportPool):
+    """Generates numbered texts instead of calling the LLM."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.generated = 0
+
+    async def _generate(self, kind: str) -> Optional[str]:
+        await asyncio.sleep(0)
+        self.generated += 1
+        return f"{kind} {self.generated}"
+
+
+class TestSupportPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "support_pool.json"
+
+    async def asyncTearDown(self) -> None:
+        self.tmp.cleanup()
+
+    async def test_user_gets_every_text_before_a_repeat(self) -> None:
+        pool = CountingPool(target_size=2)
+        texts = [f"breath {idx}" for idx in range(4)]
+        for text in texts:
+            pool.add("breath", text)
+        served = [pool.take("breath", user_id=1) for _ in texts]
+        self.assertEqual(sorted(served), texts)
+        # Another user walks the pool independently.
+        self.assertIn(pool.take("breath", user_id=2), texts)
+        await pool.stop()
+
+    async def test_refills_below_target_size(self) -> None:
+        pool = CountingPool(target_size=4)
+        self.assertEqual(pool.take("ground", user_id=1), FALLBACK_TEXTS["ground"])
+        await asyncio.gather(*pool._tasks)
+        self.assertEqual(pool.size("ground"), 4)
+
+        # A full pool is served without asking for more texts.
+        pool.take("ground", user_id=1)
+        self.assertFalse(pool._tasks)
+
+        low = CountingPool(target_size=4)
+        for idx in range(3):
+            low.add("ground", f"ground old {idx}")
+        low.take("ground", user_id=1)
+        self.assertTrue(low._tasks)
+        await asyncio.gather(*low._tasks)
+        self.assertGreaterEqual(low.size("ground"), 4)
+        await pool.stop()
+        await low.stop()
+
+    async def test_reload_restores_saved_pools(self) -> None:
+        pool = CountingPool(self.path, target_size=3)
+        await pool.refill("compassion")
+        saved = json.loads(self.path.read_text(encoding="utf-8"))
+        self.assertEqual(len(saved["compassion"]), 3)
+
+        reloaded = CountingPool(self.path, target_size=3)
+        reloaded.load()
+        self.assertEqual(reloaded.size("compassion"), 3)
+        self.assertEqual(reloaded.size("breath"), 0)
+        self.assertIn(reloaded.take("compassion", user_id=7), saved["compassion"])
+        await reloaded.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from fake_db import FakeClient, install, user_row
+from flows import therapy
+from flows.therapy import SUMMARY_EVERY_N_MESSAGES, summarize_user
+from services import message_service, user_service
+from services.user_cache import get_user_cache
+from services.user_locks import get_user_locks
+
+
+async def _run_inline(query, *args):
+    return query(*args)
+
+
+class TestSummarizeUser(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.saved = (message_service.run_db, user_service.run_db, therapy.generate_summary)
+        message_service.run_db = user_service.run_db = _run_inline
+        therapy.generate_summary = self._generate_summary
+        self.client = FakeClient()
+        self.client.tables["messages"] = [
+            {
+                "id": "m1",
+                "user_id": 1,
+                "role": "user",
+                "content": "не сплю",
+                "created_at": "2024-01-01T10:00:00+00:00",
+            }
+        ]
+        install(self.client)
+        self.prompts: list = []
+        self.during_generation = None
+
+    async def asyncTearDown(self) -> None:
+        message_service.run_db, user_service.run_db, therapy.generate_summary = self.saved
+
+    async def _generate_summary(self, *, prompt: str, system_prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.during_generation is not None:
+            await self.during_generation()
+        return "Плохо спит."
+
+    def _ingest_more(self, count: int) -> None:
+        """What ingest_user_message leaves behind: DB row and cache agree."""
+        row = self.client.user(1)
+        row["messages_since_summary"] += count
+        get_user_cache().update(1, {"messages_since_summary": row["messages_since_summary"]})
+
+    async def test_deleted_user_is_not_recreated(self) -> None:
+        await summarize_user(1)
+        self.assertEqual(self.client.calls, ["select users"])
+        self.assertEqual(self.client.tables["users"], [])
+        self.assertEqual(self.prompts, [])
+
+    async def test_skips_user_below_threshold(self) -> None:
+        self.client.tables["users"] = [user_row(1, messages_since_summary=SUMMARY_EVERY_N_MESSAGES - 1)]
+        await summarize_user(1)
+        self.assertEqual(self.client.calls, ["select users"])
+        self.assertEqual(self.prompts, [])
+
+    async def test_writes_summary_and_resets_counter(self) -> None:
+        self.client.tables["users"] = [user_row(1, messages_since_summary=SUMMARY_EVERY_N_MESSAGES)]
+        await summarize_user(1)
+        row = self.client.user(1)
+        self.assertEqual(row["summary"], "Плохо спит.")
+        self.assertEqual(row["messages_since_summary"], 0)
+        self.assertIsNotNone(row["last_summary_at"])
+        self.assertIn("не сплю", self.prompts[0])
+
+    async def test_messages_during_generation_stay_counted(self) -> None:
+        self.client.tables["users"] = [user_row(1, messages_since_summary=SUMMARY_EVERY_N_MESSAGES)]
+
+        async def ingest_two() -> None:
+            self._ingest_more(2)
+
+        self.during_generation = ingest_two
+        await summarize_user(1)
+        self.assertEqual(self.client.user(1)["messages_since_summary"], 2)
+        self.assertEqual(get_user_cache().get(1).messages_since_summary, 2)
+
+    async def test_write_waits_for_handler_holding_user_lock(self) -> None:
+        self.client.tables["users"] = [user_row(1, messages_since_summary=SUMMARY_EVERY_N_MESSAGES)]
+        async with get_user_locks().hold(1):
+            job = asyncio.create_task(summarize_user(1))
+            # Let the job generate and reach the write.
+            await asyncio.sleep(0.05)
+            self.assertTrue(self.prompts)
+            self.assertNotIn("update users", self.client.calls)
+            self._ingest_more(1)
+        await job
+        self.assertEqual(self.client.user(1)["messages_since_summary"], 1)
+
+    async def test_user_deleted_during_generation(self) -> None:
+        self.client.tables["users"] = [user_row(1, messages_since_summary=SUMMARY_EVERY_N_MESSAGES)]
+
+        async def reset() -> None:
+            await user_service.delete_user_data(1)
+
+        self.during_generation = reset
+        await summarize_user(1)
+        self.assertEqual(self.client.tables["users"], [])
+        self.assertNotIn("update users", self.client.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.transcript_cache import TranscriptCache
+
+
+class TestTranscriptCache(unittest.IsolatedAsyncioTestCase):
+    async def test_memory_lru_evicts_oldest(self) -> None:
+        cache = TranscriptCache(max_entries=2)
+        cache.put("a", 3, "первый")
+        cache.put("b", 3, "второй")
+        self.assertEqual(await cache.get("a", 3), "первый")
+        cache.put("c", 3, "третий")
+        self.assertIsNone(await cache.get("b", 3))
+        self.assertEqual(await cache.get("a", 3), "первый")
+        self.assertEqual(len(cache), 2)
+
+    async def test_duration_is_part_of_key(self) -> None:
+        cache = TranscriptCache()
+        cache.put("a", 3, "текст")
+        self.assertIsNone(await cache.get("a", 4))
+
+    async def test_disk_tier_survives_restart(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "transcripts.sqlite3"
+            cache = TranscriptCache(path, max_entries=1)
+            cache.put("a", 5, "сохранено")
+            cache.put("b", 5, "вытеснено из памяти")
+            self.assertEqual(await cache.get("a", 5), "сохранено")
+            cache.close()
+
+            reopened = TranscriptCache(path)
+            self.assertEqual(await reopened.get("b", 5), "вытеснено из памяти")
+            reopened.close()
+
+    async def test_disk_tier_is_bounded(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "transcripts.sqlite3"
+            cache = TranscriptCache(path, max_entries=1, max_disk_entries=2)
+            for idx in range(4):
+                cache.put(f"id{idx}", 1, f"текст {idx}")
+            cache.close()
+            reopened = TranscriptCache(path)
+            self.assertIsNone(await reopened.get("id0", 1))
+            self.assertEqual(await reopened.get("id3", 1), "текст 3")
+            reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
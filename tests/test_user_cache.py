@@ -0,0 +1,57 @@
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.user_cache import UserCache
+
+
+@dataclass
+class _Row:
+    id: int
+    focus: str = "общее"
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestUserCache(unittest.TestCase):
+    def test_returns_copies(self) -> None:
+        cache = UserCache()
+        cache.put(1, _Row(id=1))
+        snapshot = cache.get(1)
+        snapshot.focus = "тревога"
+        self.assertEqual(cache.get(1).focus, "общее")
+
+    def test_write_through_update(self) -> None:
+        cache = UserCache()
+        cache.put(1, _Row(id=1))
+        cache.update(1, {"focus": "выгорание"})
+        self.assertEqual(cache.get(1).focus, "выгорание")
+
+    def test_ttl_expiry(self) -> None:
+        clock = _Clock()
+        cache = UserCache(ttl_seconds=10, clock=clock)
+        cache.put(1, _Row(id=1))
+        clock.now = 11
+        self.assertIsNone(cache.get(1))
+
+    def test_lru_bound(self) -> None:
+        cache = UserCache(max_entries=2)
+        cache.put(1, _Row(id=1))
+        cache.put(2, _Row(id=2))
+        cache.get(1)
+        cache.put(3, _Row(id=3))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from services.user_locks import UserLocks
+
+
+class TestUserLocks(unittest.IsolatedAsyncioTestCase):
+    async def test_same_user_runs_in_arrival_order(self) -> None:
+        locks = UserLocks()
+        log: list[str] = []
+
+        async def work(name: str, delay: float) -> None:
+            async with locks.hold(1):
+                log.append(f"{name}:start")
+                await asyncio.sleep(delay)
+                log.append(f"{name}:end")
+
+        await asyncio.gather(work("a", 0.02), work("b", 0), work("c", 0))
+        self.assertEqual(log, ["a:start", "a:end", "b:start", "b:end", "c:start", "c:end"])
+
+    async def test_different_users_run_in_parallel(self) -> None:
+        locks = UserLocks()
+        both_inside = asyncio.Event()
+        inside = 0
+
+        async def work(user_id: int) -> None:
+            nonlocal inside
+            async with locks.hold(user_id):
+                inside += 1
+                if inside == 2:
+                    both_inside.set()
+                await asyncio.wait_for(both_inside.wait(), timeout=1)
+
+        await asyncio.gather(work(1), work(2))
+        self.assertTrue(both_inside.is_set())
+
+    async def test_idle_entries_are_evicted(self) -> None:
+        locks = UserLocks()
+        async with locks.hold(1):
+            self.assertTrue(locks.is_busy(1))
+            self.assertEqual(len(locks), 1)
+        self.assertEqual(len(locks), 0)
+        with self.assertRaises(RuntimeError):
+            async with locks.hold(2):
+                raise RuntimeError("handler failed")
+        self.assertEqual(len(locks), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
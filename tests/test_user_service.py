@@ -0,0 +1,116 @@
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "app"))
+
+from fake_db import FakeClient, install, user_row
+from services import user_service
+from services.user_cache import get_user_cache
+from services.user_service import (
+    UserPatch,
+    delete_user_data,
+    flush_activity,
+    get_user,
+    mark_active,
+    update_user_fields,
+)
+
+
+def _touch_users_activity(client: FakeClient):
+    def handler(params: dict) -> None:
+        for user_id, seen_at in zip(params["user_ids_param"], params["seen_at_param"]):
+            row = client.user(user_id)
+            if row is not None:
+                row["last_message_at"] = seen_at
+
+    return handler
+
+
+class TestActivityFlush(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.client = FakeClient()
+        self.client.rpcs["touch_users_activity"] = _touch_users_activity(self.client)
+        self.client.tables["users"] = [user_row(1), user_row(2)]
+        install(self.client)
+        user_service._pending_activity.clear()
+
+    async def test_writes_each_users_own_timestamp(self) -> None:
+        mark_active(1)
+        mark_active(2)
+        seen = {user_id: at.isoformat() for user_id, at in user_service._pending_activity.items()}
+        await flush_activity()
+        self.assertEqual(self.client.calls, ["rpc touch_users_activity"])
+        self.assertEqual(self.client.user(1)["last_message_at"], seen[1])
+        self.assertEqual(self.client.user(2)["last_message_at"], seen[2])
+        self.assertFalse(user_service._pending_activity)
+
+    async def test_reset_during_flush_does_not_recreate_user(self) -> None:
+        mark_active(1)
+        mark_active(2)
+        in_flight = dict(user_service._pending_activity)
+        await delete_user_data(1)
+        # The flush took its batch before /reset dropped the user's entry.
+        user_service._pending_activity.update(in_flight)
+        await flush_activity()
+
+        self.assertIsNone(self.client.user(1))
+        self.assertEqual(len(self.client.tables["users"]), 1)
+        self.assertIsNotNone(self.client.user(2)["last_message_at"])
+
+    async def test_failed_flush_keeps_pending(self) -> None:
+        del self.client.rpcs["touch_users_activity"]
+        mark_active(1)
+        with self.assertRaises(RuntimeError):
+            await flush_activity()
+        self.assertIn(1, user_service._pending_activity)
+
+
+class TestUserPatch(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.client = FakeClient()
+        self.client.tables["users"] = [user_row(1, awaiting_goal=True, awaiting_name=True)]
+        install(self.client)
+        # Warm the cache the way a handler does before patching the user.
+        await get_user(1)
+        self.client.calls.clear()
+
+    async def test_several_fields_are_one_update(self) -> None:
+        async with UserPatch(1) as patch:
+            patch.set("session_goal", "спать лучше")
+            patch.set("focus", "сон")
+            patch.clear_awaiting()
+        self.assertEqual(self.client.calls, ["update users"])
+        row = self.client.user(1)
+        self.assertEqual((row["session_goal"], row["focus"]), ("спать лучше", "сон"))
+        self.assertFalse(row["awaiting_goal"] or row["awaiting_name"])
+
+    async def test_written_fields_reach_the_cache(self) -> None:
+        async with UserPatch(1) as patch:
+            patch.set("focus", "сон")
+            patch.set_awaiting("awaiting_goal", False)
+        cached = get_user_cache().get(1)
+        self.assertEqual(cached.focus, "сон")
+        self.assertFalse(cached.awaiting_goal)
+        self.assertTrue(cached.awaiting_name)
+        # Served from the cache, without another select.
+        self.assertEqual((await get_user(1)).focus, "сон")
+        self.assertEqual(self.client.calls, ["update users"])
+
+    async def test_empty_patch_does_not_touch_db(self) -> None:
+        async with UserPatch(1):
+            pass
+        self.assertIsNone(await update_user_fields(1, {}))
+        self.assertEqual(self.client.calls, [])
+
+    async def test_patch_is_dropped_when_block_raises(self) -> None:
+        with self.assertRaises(ValueError):
+            async with UserPatch(1) as patch:
+                patch.set("focus", "сон")
+                raise ValueError("handler failed")
+        self.assertEqual(self.client.calls, [])
+        self.assertEqual(get_user_cache().get(1).focus, "общее")
+
+
+if __name__ == "__main__":
+    unittest.main()